@@ -1,63 +1,338 @@
 #!/usr/bin/env python3
 # analyze_dag.py
-# Usage: python3 analyze_dag.py autosys_analysis.db <root_job> --window 30
+# Usage: python3 analyze_dag.py autosys_analysis.db <root_job> --baseline_runs 10
+#        python3 analyze_dag.py autosys_analysis.db <root_job> --history [--days 365] [--history_out cp.csv]
+#        python3 analyze_dag.py autosys_analysis.db <root_job> --wallclock [--lookback_days 14]
+#        python3 analyze_dag.py autosys_analysis.db <root_job> --montecarlo --sla_seconds 28800 [--scenarios 10000]
+#
+# --history evaluates the critical path for every business date in the
+# last --days at once: one topological order, a (dates × jobs) duration
+# matrix, and a report of the jobs that are most often on the critical path
+# with their delay vs. a trailing baseline. Business dates follow the EOD
+# rule of slow_trade_detector.xref_jobs: a run belongs to date D if it
+# started after the previous date's cutoff and before D + --eod_cutoff_hours
+# (default EOD_RUN_CUTOFF_HOURS), so an overnight flow stays on one date;
+# weekend starts roll forward to Monday.
+#
+# --wallclock rebuilds the actual timeline of the root's latest run from
+# start/end/eligible timestamps: every run is as-of joined in DuckDB to the
+# latest-finishing run of each parent that ended before it started, the
+# last of those is the parent that gated it, and following gating parents
+# back from the root gives the critical path as it really happened. Each
+# job's share is split into run time and wait time (gating parent's end,
+# or eligible_time, to start) and compared with its average over the
+# lookback window.
+#
+# --montecarlo draws --scenarios duration sets, each job's duration sampled
+# from its own last --mc_runs runs, and propagates them through the DAG in
+# one topological pass over (scenarios × jobs) arrays, --chunk scenarios at
+# a time. It reports the distribution of the root's finish (seconds from
+# the DAG start), the probability of exceeding --sla_seconds and each
+# job's criticality index: the share of scenarios in which it is on the
+# critical path.
 
-import duckdb, networkx as nx, pandas as pd, sys, argparse
-from collections import defaultdict
+import duckdb, pandas as pd, numpy as np, sys, argparse
+
+from dag_graph import (ancestors, critical_path, critical_paths_matrix, empirical_samples,
+                       graph_cache_path, load_graph, topo_order)
+from slow_trade_detector.config import EOD_RUN_CUTOFF_HOURS, ROLLING_WINDOW
+from slow_trade_detector.detector_jobs import detect_job_anomalies, latest_job_anomalies, load_job_runs
 
 parser = argparse.ArgumentParser()
 parser.add_argument('db')
 parser.add_argument('root_job')
 parser.add_argument('--baseline_runs', type=int, default=10)
+parser.add_argument('--slack_top', type=int, default=20,
+                    help='show the N off-path jobs with the least slack')
+parser.add_argument('--history', action='store_true',
+                    help='critical path for every business date instead of the latest run')
+parser.add_argument('--days', type=int, default=365, help='--history: dates to analyse')
+parser.add_argument('--eod_cutoff_hours', type=int, default=EOD_RUN_CUTOFF_HOURS,
+                    help='--history: hours after midnight of a date that still belong to it')
+parser.add_argument('--top', type=int, default=20, help='--history / --montecarlo: jobs to report')
+parser.add_argument('--history_out', help='--history: write per-date critical path rows to CSV')
+parser.add_argument('--wallclock', action='store_true',
+                    help='critical path of the latest run from actual start/end/eligible times')
+parser.add_argument('--lookback_days', type=int, default=14,
+                    help='--wallclock: days of runs to join and average over')
+parser.add_argument('--montecarlo', action='store_true',
+                    help='simulate root finish times from sampled job durations')
+parser.add_argument('--scenarios', type=int, default=10000)
+parser.add_argument('--sla_seconds', type=float,
+                    help='--montecarlo: target root finish, seconds after the DAG starts')
+parser.add_argument('--mc_runs', type=int, default=60,
+                    help='--montecarlo: past runs per job to sample from')
+parser.add_argument('--chunk', type=int, default=1000, help='--montecarlo: scenarios per pass')
+parser.add_argument('--seed', type=int, default=None)
+parser.add_argument('--graph_cache', help='DAG cache file (default <db>.graph.npz; "" disables)')
 args = parser.parse_args()
 
 con = duckdb.connect(args.db)
 
-# dependencies
-deps_df = con.execute("SELECT job,parent FROM job_dependencies").df()
-# job runs - use last baseline_runs for baseline then pick latest run for attribution
-runs_df = con.execute("SELECT * FROM job_runs ORDER BY start_time DESC").df()
+# Dependency graph (edges parent->job) as CSR arrays, cached until the next ingest
+parents = load_graph(con, graph_cache_path(args.db) if args.graph_cache is None else args.graph_cache)
+
+# Only root_job and its ancestors matter for the critical path
+dag_jobs = pd.DataFrame({'job': sorted(ancestors(parents, args.root_job))})
+con.register('dag_jobs', dag_jobs)
+
+if args.history:
+    # One run per (job, business date): the last one started for that EOD
+    # (same cutoff rule as xref_jobs.explain_slow_eods). The baseline is the
+    # average of the job's previous baseline_runs dates.
+    hist_df = con.execute("""
+        WITH runs AS (
+            SELECT r.job, r.start_time, r.duration_seconds,
+                   CAST(r.start_time - to_hours(?::INTEGER - 24) AS DATE) AS eod
+            FROM job_runs r
+            JOIN dag_jobs d ON d.job = r.job
+        ),
+        dated AS (
+            SELECT job, start_time, duration_seconds,
+                   eod + CASE dayofweek(eod) WHEN 6 THEN 2 WHEN 0 THEN 1 ELSE 0 END AS run_date
+            FROM runs
+        )
+        SELECT * FROM (
+            SELECT job, run_date, duration_seconds,
+                   avg(duration_seconds) OVER (
+                       PARTITION BY job ORDER BY run_date
+                       ROWS BETWEEN ? PRECEDING AND 1 PRECEDING) AS baseline_duration
+            FROM (
+                SELECT job, run_date, duration_seconds
+                FROM dated
+                QUALIFY ROW_NUMBER() OVER (
+                    PARTITION BY job, run_date ORDER BY start_time DESC) = 1
+            )
+        )
+        WHERE run_date > (SELECT max(run_date) FROM dated) - ?::INTEGER
+    """, [args.eod_cutoff_hours, args.baseline_runs, args.days]).df()
+
+    if hist_df.empty:
+        print("No run data; ingest runs first.")
+        sys.exit(1)
+
+    try:
+        order = topo_order(set(dag_jobs['job']), parents)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    dur_m = hist_df.pivot(index='run_date', columns='job', values='duration_seconds').reindex(columns=order)
+    base_m = hist_df.pivot(index='run_date', columns='job', values='baseline_duration').reindex(columns=order)
+    # A job that did not run on a date weighs its typical duration over the period
+    dur_m = dur_m.fillna(dur_m.mean()).fillna(0)
+    dates = dur_m.index
+
+    on_path, totals = critical_paths_matrix(parents, order, dur_m.to_numpy(), args.root_job)
+    delay = (dur_m - base_m).fillna(0).to_numpy()
+
+    n_dates = len(dates)
+    on_days = on_path.sum(axis=0)
+    path_delay = np.where(on_path, delay, 0.0).sum(axis=0)
+    chronic = pd.DataFrame({
+        'job': order,
+        'days_on_path': on_days,
+        'share': on_days / n_dates,
+        'avg_delay_on_path': np.divide(path_delay, on_days, out=np.zeros(len(order)), where=on_days > 0),
+        'total_delay_on_path': path_delay,
+    })
+    chronic = chronic[chronic['days_on_path'] > 0].sort_values(
+        ['days_on_path', 'total_delay_on_path'], ascending=False)
+
+    worst = int(totals.argmax())
+    print(f"Critical path to {args.root_job} over {n_dates} business dates "
+          f"({dates[0]:%Y-%m-%d} .. {dates[-1]:%Y-%m-%d})")
+    print(f"Critical path duration_seconds: median {np.median(totals):.1f}, "
+          f"p95 {np.percentile(totals, 95):.1f}, worst {totals[worst]:.1f} on {dates[worst]:%Y-%m-%d}")
+    print(f"\nJobs most often on the critical path (top {args.top}):")
+    for r in chronic.head(args.top).itertuples(index=False):
+        print(f"{r.job:40} {r.days_on_path:5d} days ({r.share:6.1%})  "
+              f"avg delay {r.avg_delay_on_path:8.1f}s  total delay {r.total_delay_on_path:10.1f}s")
+
+    if args.history_out:
+        d_idx, j_idx = np.nonzero(on_path)
+        pd.DataFrame({
+            'run_date': dates[d_idx],
+            'job': np.asarray(order)[j_idx],
+            'duration_seconds': dur_m.to_numpy()[d_idx, j_idx],
+            'baseline_duration': base_m.to_numpy()[d_idx, j_idx],
+            'delay_seconds': delay[d_idx, j_idx],
+            'path_total_seconds': totals[d_idx],
+        }).to_csv(args.history_out, index=False)
+        print(f"\nPer-date critical paths written to {args.history_out}")
+    sys.exit(0)
+
+if args.wallclock:
+    # For every run in the window, the parent run that gated it: per parent
+    # the last run that ended at or before the child's start (ASOF), then
+    # the latest of those across parents.
+    gate_df = con.execute("""
+        WITH runs AS (
+            SELECT r.job, r.start_time, r.end_time, r.eligible_time
+            FROM job_runs r
+            JOIN dag_jobs d ON d.job = r.job
+            WHERE r.end_time IS NOT NULL
+              AND r.start_time >= (SELECT max(start_time) FROM job_runs WHERE job = ?)
+                                  - to_days(?::INTEGER)
+        ),
+        gates AS (
+            SELECT c.job, c.start_time, e.parent,
+                   p.start_time AS parent_start, p.end_time AS parent_end
+            FROM runs c
+            JOIN job_dependencies e ON e.job = c.job
+            ASOF JOIN runs p ON p.job = e.parent AND c.start_time >= p.end_time
+            QUALIFY ROW_NUMBER() OVER (
+                PARTITION BY c.job, c.start_time ORDER BY p.end_time DESC, e.parent) = 1
+        )
+        SELECT r.job, r.start_time, r.end_time, r.eligible_time,
+               g.parent, g.parent_start, g.parent_end
+        FROM runs r
+        LEFT JOIN gates g ON g.job = r.job AND g.start_time = r.start_time
+    """, [args.root_job, args.lookback_days]).df()
+
+    root_runs = gate_df[gate_df['job'] == args.root_job]
+    if root_runs.empty:
+        print(f"No runs of {args.root_job}; ingest runs first.")
+        sys.exit(1)
+
+    gate_df['run_time'] = (gate_df['end_time'] - gate_df['start_time']).dt.total_seconds()
+    # Wait: from the gating parent's end, else from eligible_time, to start
+    ready = gate_df['parent_end'].fillna(gate_df['eligible_time'])
+    gate_df['wait_time'] = (gate_df['start_time'] - ready).dt.total_seconds().fillna(0)
+
+    runs = gate_df.set_index(['job', 'start_time'])
+    key = (args.root_job, root_runs['start_time'].max())
+    chain = []
+    seen = set()
+    while key in runs.index and key not in seen:
+        seen.add(key)
+        chain.append(key)
+        row = runs.loc[key]
+        if pd.isna(row['parent']):
+            break
+        key = (row['parent'], row['parent_start'])
+    chain.reverse()
+
+    path_df = runs.loc[chain].reset_index()
+    # Baseline: each job's average over the other runs in the window
+    others = gate_df[~gate_df.set_index(['job', 'start_time']).index.isin(chain)]
+    base = others.groupby('job')[['run_time', 'wait_time']].mean()
+    path_df = path_df.join(base, on='job', rsuffix='_baseline')
+
+    span = (path_df['end_time'].iloc[-1] - path_df['start_time'].iloc[0]).total_seconds()
+    print(f"Wall-clock critical path to {args.root_job} "
+          f"({path_df['start_time'].iloc[0]} .. {path_df['end_time'].iloc[-1]}, {span:.1f} sec):")
+    print(f"{'job':40} {'gated by':30} {'wait':>9} {'run':>9} {'d_wait':>9} {'d_run':>9}")
+    for r in path_df.itertuples(index=False):
+        d_wait = r.wait_time - r.wait_time_baseline if pd.notna(r.wait_time_baseline) else float('nan')
+        d_run = r.run_time - r.run_time_baseline if pd.notna(r.run_time_baseline) else float('nan')
+        gated = r.parent if pd.notna(r.parent) else '-'
+        print(f"{r.job:40} {gated:30} {r.wait_time:9.1f} {r.run_time:9.1f} {d_wait:9.1f} {d_run:9.1f}")
 
-if runs_df.empty:
+    run_total = path_df['run_time'].sum()
+    wait_total = path_df['wait_time'].iloc[1:].sum()
+    print(f"\nRun time on path:  {run_total:.1f} sec")
+    print(f"Wait time on path: {wait_total:.1f} sec (plus {path_df['wait_time'].iloc[0]:.1f} sec "
+          f"before the first job started)")
+    print("d_wait / d_run: seconds above the job's average over the last "
+          f"{args.lookback_days} days")
+    sys.exit(0)
+
+if args.montecarlo:
+    try:
+        order = topo_order(set(dag_jobs['job']), parents)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    hist_df = con.execute("""
+        SELECT r.job, r.duration_seconds
+        FROM job_runs r
+        JOIN dag_jobs d ON d.job = r.job
+        WHERE r.duration_seconds IS NOT NULL
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY r.job ORDER BY r.start_time DESC) <= ?
+    """, [args.mc_runs]).df()
+
+    if hist_df.empty:
+        print("No run data; ingest runs first.")
+        sys.exit(1)
+
+    # (jobs × runs) history matrix aligned with the topological order
+    codes = pd.Categorical(hist_df['job'], categories=order).codes
+    rank = hist_df.groupby(codes).cumcount().to_numpy()
+    counts = np.bincount(codes, minlength=len(order))
+    history = np.full((len(order), counts.max()), np.nan)
+    history[codes, rank] = hist_df['duration_seconds'].to_numpy()
+
+    rng = np.random.default_rng(args.seed)
+    finish = np.empty(args.scenarios)
+    critical = np.zeros(len(order))
+    for lo in range(0, args.scenarios, args.chunk):
+        n = min(args.chunk, args.scenarios - lo)
+        samples = empirical_samples(history, counts, n, rng)
+        on_path, finish[lo:lo + n] = critical_paths_matrix(parents, order, samples, args.root_job)
+        critical += on_path.sum(axis=0)
+    critical /= args.scenarios
+
+    no_hist = int((counts == 0).sum())
+    print(f"Monte Carlo: {args.scenarios} scenarios over {len(order)} jobs "
+          f"(up to {args.mc_runs} past runs each{f'; {no_hist} jobs without runs count as 0s' if no_hist else ''})")
+    pct = np.percentile(finish, [5, 50, 95, 99])
+    print(f"{args.root_job} finish, seconds after DAG start: "
+          f"p5 {pct[0]:.1f}, p50 {pct[1]:.1f}, p95 {pct[2]:.1f}, p99 {pct[3]:.1f}")
+    if args.sla_seconds is not None:
+        p_miss = (finish > args.sla_seconds).mean()
+        print(f"P(finish > {args.sla_seconds:.0f}s) = {p_miss:.2%}")
+
+    top = np.argsort(-critical, kind='stable')[:args.top]
+    print(f"\nCriticality index (share of scenarios on the critical path, top {args.top}):")
+    for i in top:
+        if critical[i] == 0:
+            break
+        print(f"{order[i]:40} {critical[i]:7.2%}")
+    sys.exit(0)
+
+# Per DAG job, in one pass over job_runs: latest run with a duration (runs
+# still in progress are skipped, as groupby.first() skipped NaN) and the
+# average of the last baseline_runs of those. One row per job comes back.
+stats_df = con.execute("""
+    SELECT job,
+           max(duration_seconds) FILTER (WHERE rn = 1) AS latest_duration,
+           max(start_time)       FILTER (WHERE rn = 1) AS latest_start,
+           max(end_time)         FILTER (WHERE rn = 1) AS latest_end,
+           avg(duration_seconds)                       AS baseline_duration
+    FROM (
+        SELECT r.job, r.duration_seconds, r.start_time, r.end_time,
+               ROW_NUMBER() OVER (PARTITION BY r.job ORDER BY r.start_time DESC) AS rn
+        FROM job_runs r
+        JOIN dag_jobs d ON d.job = r.job
+        WHERE r.duration_seconds IS NOT NULL
+        QUALIFY rn <= ?
+    )
+    GROUP BY job
+""", [args.baseline_runs]).df().set_index('job')
+
+if stats_df.empty:
     print("No run data; ingest runs first.")
     sys.exit(1)
 
-# Build graph (edges parent->job)
-G = nx.DiGraph()
-for _, row in deps_df.iterrows():
-    G.add_edge(row['parent'], row['job'])
+# baseline durations per job: avg of last N runs per job
+baseline = stats_df['baseline_duration'].to_dict()
 
-# Ensure root_job present, else include isolated node
-if args.root_job not in G.nodes:
-    G.add_node(args.root_job)
+# Latest run per job (the run that relates to current SLA evaluation)
+latest = stats_df['latest_duration'].to_dict()
+latest_start = stats_df['latest_start'].to_dict()
+latest_end = stats_df['latest_end'].to_dict()
 
-# compute baseline durations per job: avg of last N runs per job
-baseline = runs_df.groupby('job').head(args.baseline_runs).groupby('job')['duration_seconds'].mean().to_dict()
+# node weights (use latest durations, baseline when a job has no latest run)
+durations = {n: latest.get(n, baseline.get(n, 0) or 0) for n in dag_jobs['job']}
 
-# Latest run per job (the run that relates to current SLA evaluation)
-latest = runs_df.groupby('job').first().reset_index().set_index('job')['duration_seconds'].to_dict()
-latest_start = runs_df.groupby('job').first().reset_index().set_index('job')['start_time'].to_dict()
-latest_end = runs_df.groupby('job').first().reset_index().set_index('job')['end_time'].to_dict()
-
-# assign weights (use latest durations)
-for n in G.nodes:
-    G.nodes[n]['duration'] = latest.get(n, baseline.get(n, 0) or 0)
-
-# compute longest path from any root ancestor to the final root_job.
-# find all ancestors (sources)
-sources = [n for n in G.nodes if G.in_degree(n)==0]
-# try compute longest path to root_job
-def path_weight(path):
-    return sum(G.nodes[n].get('duration',0) for n in path)
-
-best_path=None
-best_weight= -1
-for s in sources:
-    if nx.has_path(G, s, args.root_job):
-        p = nx.dag_longest_path(G.subgraph(nx.descendants(G, s)|{s,args.root_job}), weight='duration')
-        w = path_weight(p)
-        if w>best_weight:
-            best_weight=w; best_path=p
+# longest node-weighted path to root_job: one topological pass over its ancestors
+try:
+    best_path, best_weight, slack = critical_path(parents, durations, args.root_job)
+except ValueError as e:
+    print(e)
+    sys.exit(1)
 
 print("Critical path to", args.root_job, ":", best_path)
 print("Critical path total duration_seconds:", best_weight)
@@ -69,6 +344,28 @@ for n in best_path:
     l = latest.get(n, 0)
     delay_scores[n] = l - b
 
+# Rolling z-score of each DAG job's latest run (same rule as the grid detectors)
+scored = latest_job_anomalies(detect_job_anomalies(
+    load_job_runs(con, 'dag_jobs', runs_per_job=ROLLING_WINDOW)))
+zscore = scored['zscore_duration'].to_dict()
+flagged = set(scored.index[scored['job_anomaly']])
+
 print("\nDelay contribution (latest - baseline):")
 for n, d in sorted(delay_scores.items(), key=lambda x: -x[1]):
-    print(f"{n:40} {d:.1f} sec (latest {latest.get(n,0):.1f}s, baseline {baseline.get(n,0):.1f}s)")
+    z = zscore.get(n, float('nan'))
+    flag = '  ANOMALY' if n in flagged else ''
+    print(f"{n:40} {d:.1f} sec (latest {latest.get(n,0):.1f}s, baseline {baseline.get(n,0):.1f}s, z {z:.1f}){flag}")
+
+off_flagged = sorted(flagged - set(best_path), key=lambda n: slack.get(n, 0))
+if off_flagged:
+    print(f"\nAnomalous latest runs off the critical path ({len(off_flagged)}):")
+    for n in off_flagged[:args.slack_top]:
+        print(f"{n:40} z {zscore[n]:.1f}, {slack.get(n, 0):.1f} sec slack")
+
+# Near-critical jobs: least slack among jobs not on the critical path
+on_path = set(best_path)
+off_path = sorted((s, n) for n, s in slack.items() if n not in on_path)
+if off_path and args.slack_top > 0:
+    print(f"\nLeast slack off the critical path (top {args.slack_top}):")
+    for s, n in off_path[:args.slack_top]:
+        print(f"{n:40} {s:.1f} sec slack")
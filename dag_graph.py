@@ -0,0 +1,548 @@
+# dag_graph.py
+# Graph helpers for the Autosys DAG scripts (edges are parent -> job).
+#
+# The critical path to a root job is the longest node-weighted path ending
+# at it. It is computed with one dynamic-programming pass over the root's
+# ancestors in topological order, plus one reverse pass for slack, so the
+# cost is linear in the size of the ancestor subgraph.
+# critical_paths_matrix runs the forward pass for a whole (dates × jobs)
+# duration matrix, reusing one topological order for every date.
+#
+# The helpers take `parents` as any mapping job -> parent list. JobGraph is
+# the compact form of the whole job_dependencies table: integer job ids,
+# CSR parent/child arrays and the job-name list, a few bytes per edge
+# instead of networkx's dicts. load_graph caches it next to the database
+# and rebuilds it only after a new ingest batch.
+
+import os
+from collections import defaultdict, deque
+
+import numpy as np
+
+
+def build_parents(edges):
+    """Map job -> list of parents from (parent, job) pairs (duplicates dropped)."""
+    parents = defaultdict(list)
+    seen = set()
+    for parent, job in edges:
+        if (parent, job) in seen:
+            continue
+        seen.add((parent, job))
+        parents[job].append(parent)
+    return parents
+
+
+def _gather(ptr, idx, nodes):
+    """Concatenated CSR rows idx[ptr[i]:ptr[i + 1]] for every i in nodes."""
+    starts = ptr[nodes]
+    lens = ptr[nodes + 1] - starts
+    total = int(lens.sum())
+    if total == 0:
+        return idx[:0]
+    offsets = np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(total)
+    return idx[offsets]
+
+
+class JobGraph:
+    """
+    Job dependency graph as integer-indexed CSR arrays.
+
+    Job i is names[i]; its parents are parent_idx[parent_ptr[i]:parent_ptr[i + 1]]
+    (in edge order, duplicates dropped) and its children likewise in
+    child_ptr / child_idx. `get(job)` returns parent names, so a JobGraph
+    can be passed wherever the helpers expect a `parents` mapping.
+    """
+
+    def __init__(self, names, parent_ptr, parent_idx):
+        self.names = list(names)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.parent_ptr = np.asarray(parent_ptr, dtype=np.int64)
+        self.parent_idx = np.asarray(parent_idx, dtype=np.int64)
+        child_of = np.repeat(np.arange(len(self.names)), np.diff(self.parent_ptr))
+        perm = np.argsort(self.parent_idx, kind='stable')
+        self.child_idx = child_of[perm]
+        self.child_ptr = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.parent_idx, minlength=len(self.names)), out=self.child_ptr[1:])
+
+    @classmethod
+    def from_edges(cls, parents, jobs):
+        """Build from parallel sequences of (parent, job) edges."""
+        import pandas as pd
+        edges = pd.DataFrame({'parent': list(parents), 'job': list(jobs)}).drop_duplicates()
+        codes, names = pd.factorize(pd.concat([edges['job'], edges['parent']], ignore_index=True))
+        job_c, parent_c = codes[:len(edges)], codes[len(edges):]
+        order = np.argsort(job_c, kind='stable')
+        ptr = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(job_c, minlength=len(names)), out=ptr[1:])
+        return cls(names, ptr, parent_c[order])
+
+    @classmethod
+    def from_duckdb(cls, con):
+        deps_df = con.execute("SELECT job, parent FROM job_dependencies").df()
+        return cls.from_edges(deps_df['parent'], deps_df['job'])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, job):
+        return job in self.index
+
+    def get(self, job, default=()):
+        i = self.index.get(job)
+        if i is None:
+            return default
+        return [self.names[p] for p in self.parent_idx[self.parent_ptr[i]:self.parent_ptr[i + 1]]]
+
+    def _reach(self, root, ptr, idx):
+        """Sorted ids of root and everything reachable over the CSR (ptr, idx)."""
+        seen = np.zeros(len(self.names), dtype=bool)
+        if root not in self.index:
+            return np.zeros(0, dtype=np.int64)
+        frontier = np.array([self.index[root]])
+        seen[frontier] = True
+        while len(frontier):
+            nxt = _gather(ptr, idx, frontier)
+            nxt = np.unique(nxt[~seen[nxt]])
+            seen[nxt] = True
+            frontier = nxt
+        return np.flatnonzero(seen)
+
+    def ancestor_ids(self, root):
+        """Sorted ids of root and everything upstream of it."""
+        return self._reach(root, self.parent_ptr, self.parent_idx)
+
+    def descendant_ids(self, root):
+        """Sorted ids of root and everything downstream of it."""
+        return self._reach(root, self.child_ptr, self.child_idx)
+
+    def ancestors(self, root):
+        ids = self.ancestor_ids(root)
+        return {self.names[i] for i in ids} if len(ids) else {root}
+
+    def topo_ids(self, ids):
+        """Kahn order of `ids`, one vectorized step per level. ValueError on a cycle."""
+        ids = np.asarray(ids, dtype=np.int64)
+        inside = np.zeros(len(self.names), dtype=bool)
+        inside[ids] = True
+        dst = np.repeat(np.arange(len(self.names)), np.diff(self.parent_ptr))
+        keep = inside[dst] & inside[self.parent_idx]
+        indeg = np.bincount(dst[keep], minlength=len(self.names))
+
+        frontier = ids[indeg[ids] == 0]
+        levels = []
+        while len(frontier):
+            levels.append(frontier)
+            ch = _gather(self.child_ptr, self.child_idx, frontier)
+            ch, hits = np.unique(ch[inside[ch]], return_counts=True)
+            indeg[ch] -= hits
+            frontier = ch[indeg[ch] == 0]
+        order = np.concatenate(levels) if levels else ids[:0]
+
+        if len(order) != len(ids):
+            stuck = sorted(self.names[i] for i in ids[indeg[ids] > 0])
+            raise ValueError(f"Dependency cycle among jobs: {stuck[:10]}")
+        return order
+
+    def topo_order(self, nodes):
+        known = [self.index[n] for n in nodes if n in self.index]
+        order = [self.names[i] for i in self.topo_ids(known)]
+        # Jobs with no edges at all are not in the graph; they have no parents
+        return [n for n in nodes if n not in self.index] + order
+
+    def to_networkx(self):
+        """nx.DiGraph with parent -> job edges (networkx is optional)."""
+        import networkx as nx
+        g = nx.DiGraph()
+        g.add_nodes_from(self.names)
+        dst = np.repeat(np.arange(len(self.names)), np.diff(self.parent_ptr))
+        g.add_edges_from((self.names[p], self.names[j]) for p, j in zip(self.parent_idx, dst))
+        return g
+
+    def save(self, path, key):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, names=np.asarray(self.names, dtype=str), parent_ptr=self.parent_ptr,
+                     parent_idx=self.parent_idx, key=np.int64(key))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, key):
+        """Graph cached at path, or None if missing or saved under another key."""
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                if int(z['key']) != key:
+                    return None
+                return cls(z['names'].tolist(), z['parent_ptr'], z['parent_idx'])
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def graph_cache_path(db):
+    return db + '.graph.npz'
+
+
+def load_graph(con, cache_path=None):
+    """
+    JobGraph of job_dependencies, cached at cache_path and keyed on the
+    latest ingest_batches batch_id, so any ingest invalidates it.
+    """
+    key = None
+    if cache_path:
+        try:
+            key = con.execute("SELECT coalesce(max(batch_id), 0) FROM ingest_batches").fetchone()[0]
+        except Exception:
+            key = None  # no ingest_batches table: cannot tell when to invalidate
+    if key is not None:
+        graph = JobGraph.load(cache_path, key)
+        if graph is not None:
+            return graph
+    graph = JobGraph.from_duckdb(con)
+    if key is not None:
+        try:
+            graph.save(cache_path, key)
+        except OSError:
+            pass
+    return graph
+
+
+def ancestors(parents, root):
+    """All jobs upstream of root, including root itself."""
+    if isinstance(parents, JobGraph):
+        return parents.ancestors(root)
+    seen = {root}
+    q = deque([root])
+    while q:
+        job = q.popleft()
+        for p in parents.get(job, ()):
+            if p not in seen:
+                seen.add(p)
+                q.append(p)
+    return seen
+
+
+def topo_order(nodes, parents):
+    """
+    Kahn topological order of `nodes` (parents before children), only
+    following edges inside `nodes`. Raises ValueError on a cycle.
+    """
+    if isinstance(parents, JobGraph):
+        return parents.topo_order(nodes)
+    indeg = {n: 0 for n in nodes}
+    children = defaultdict(list)
+    for n in nodes:
+        for p in parents.get(n, ()):
+            if p in indeg:
+                indeg[n] += 1
+                children[p].append(n)
+
+    q = deque(n for n, d in indeg.items() if d == 0)
+    order = []
+    while q:
+        n = q.popleft()
+        order.append(n)
+        for c in children[n]:
+            indeg[c] -= 1
+            if indeg[c] == 0:
+                q.append(c)
+
+    if len(order) != len(indeg):
+        stuck = sorted(n for n, d in indeg.items() if d > 0)
+        raise ValueError(f"Dependency cycle among jobs: {stuck[:10]}")
+    return order
+
+
+def critical_path(parents, durations, root):
+    """
+    Longest duration-weighted path ending at `root`.
+
+    Parameters
+    ----------
+    parents : dict
+        job -> list of parent jobs.
+    durations : dict
+        job -> seconds (missing / NaN count as 0).
+    root : str
+
+    Returns
+    -------
+    path : list[str]
+        Jobs on the critical path, upstream first, ending with root.
+    total : float
+        Sum of durations along the path.
+    slack : dict
+        job -> seconds the job can slip before it delays root
+        (0 for jobs on the critical path), for every ancestor of root.
+    """
+    nodes = ancestors(parents, root)
+    order = topo_order(nodes, parents)
+
+    def dur(n):
+        d = durations.get(n)
+        return 0.0 if d is None or d != d else d  # d != d: NaN
+
+    # Forward pass: earliest finish and best predecessor
+    finish = {}
+    best_parent = {}
+    for n in order:
+        start = 0.0
+        bp = None
+        for p in parents.get(n, ()):
+            if p in finish and (bp is None or finish[p] > start):
+                start = finish[p]
+                bp = p
+        finish[n] = start + dur(n)
+        best_parent[n] = bp
+
+    path = []
+    n = root
+    while n is not None:
+        path.append(n)
+        n = best_parent[n]
+    path.reverse()
+    total = finish[root]
+
+    # Reverse pass: longest tail from each job down to root (inclusive)
+    tail = {n: None for n in nodes}
+    tail[root] = dur(root)
+    for n in reversed(order):
+        if tail[n] is None:
+            continue
+        for p in parents.get(n, ()):
+            if p in tail:
+                t = tail[n] + dur(p)
+                if tail[p] is None or t > tail[p]:
+                    tail[p] = t
+
+    slack = {n: total - (finish[n] + tail[n] - dur(n)) for n in nodes}
+    return path, total, slack
+
+
+def critical_paths_matrix(parents, order, durations, root):
+    """
+    Critical path to `root` for many scenarios (e.g. business dates) at once.
+
+    Parameters
+    ----------
+    parents : dict
+        job -> list of parent jobs.
+    order : list[str]
+        Topological order of root's ancestors (see topo_order); it is
+        shared by every row of `durations`.
+    durations : np.ndarray
+        (rows × len(order)) seconds, columns aligned with `order`
+        (NaN count as 0).
+    root : str
+
+    Returns
+    -------
+    on_path : np.ndarray of bool
+        (rows × jobs), True where the job is on that row's critical path.
+    total : np.ndarray
+        Critical path length per row.
+    """
+    # Work jobs-major (jobs × rows) so each job's column is contiguous
+    dur = np.ascontiguousarray(np.nan_to_num(np.asarray(durations, dtype=float)).T)
+    n_jobs, n_rows = dur.shape
+    pos = {n: i for i, n in enumerate(order)}
+    rows = np.arange(n_rows)
+    parent_ptr, parent_idx, _, _ = csr_adjacency(order, parents)
+
+    # Forward pass, one job at a time, all rows at once
+    finish = np.empty_like(dur)
+    best_parent = np.full((n_jobs, n_rows), -1, dtype=np.int64)
+    for i in range(n_jobs):
+        pidx = parent_idx[parent_ptr[i]:parent_ptr[i + 1]].tolist()
+        if not pidx:
+            finish[i] = dur[i]
+            continue
+        # Running max over parents; ties keep the earlier parent, as in critical_path
+        start = finish[i]
+        bp = best_parent[i]
+        start[:] = finish[pidx[0]]
+        bp[:] = pidx[0]
+        for j in pidx[1:]:
+            later = finish[j] > start
+            np.copyto(start, finish[j], where=later)
+            bp[later] = j
+        start += dur[i]
+
+    # Walk best parents back from root, all rows in lockstep
+    on_path = np.zeros((n_rows, n_jobs), dtype=bool)
+    cur = np.full(n_rows, pos[root])
+    live = rows
+    while len(live):
+        on_path[live, cur] = True
+        cur = best_parent[cur, live]
+        keep = cur >= 0
+        live, cur = live[keep], cur[keep]
+    return on_path, finish[pos[root]]
+
+
+def empirical_samples(history, counts, n_samples, rng):
+    """
+    Draw durations from each job's own run history.
+
+    Parameters
+    ----------
+    history : np.ndarray
+        (jobs × max_runs) past durations, left-aligned, NaN padded.
+    counts : np.ndarray
+        Number of valid values per row of `history`.
+    n_samples : int
+    rng : np.random.Generator
+
+    Returns
+    -------
+    np.ndarray
+        (n_samples × jobs); jobs without history get 0.
+    """
+    counts = np.asarray(counts)
+    n_jobs = len(counts)
+    if history.shape[1] == 0:
+        return np.zeros((n_samples, n_jobs))
+    # Flat offsets into history: row start + uniform pick among that row's runs
+    pick = (rng.random((n_samples, n_jobs)) * np.maximum(counts, 1)).astype(np.intp)
+    pick += np.arange(n_jobs) * history.shape[1]
+    out = history.ravel().take(pick)
+    out[:, counts == 0] = 0.0
+    return out
+
+
+def csr_adjacency(order, parents):
+    """
+    Compact index form of the subgraph on `order` (edges outside it dropped).
+
+    Returns
+    -------
+    parent_ptr, parent_idx, child_ptr, child_idx : np.ndarray
+        CSR arrays: the parents of job i (as positions in `order`) are
+        parent_idx[parent_ptr[i]:parent_ptr[i + 1]], children likewise.
+    """
+    if isinstance(parents, JobGraph):
+        # Map graph ids to positions in order (-1 outside) and keep inner edges
+        pos = np.full(len(parents), -1, dtype=np.int64)
+        for k, n in enumerate(order):
+            i = parents.index.get(n)
+            if i is not None:
+                pos[i] = k
+        src = pos[parents.parent_idx]
+        dst = pos[np.repeat(np.arange(len(parents)), np.diff(parents.parent_ptr))]
+        keep = (src >= 0) & (dst >= 0)
+        src, dst = src[keep], dst[keep]
+    else:
+        pos = {n: i for i, n in enumerate(order)}
+        src, dst = [], []
+        for i, n in enumerate(order):
+            for p in parents.get(n, ()):
+                j = pos.get(p)
+                if j is not None:
+                    src.append(j)
+                    dst.append(i)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+
+    def csr(rows, cols):
+        perm = np.argsort(rows, kind='stable')
+        ptr = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(order)), out=ptr[1:])
+        return ptr, cols[perm]
+
+    parent_ptr, parent_idx = csr(dst, src)
+    child_ptr, child_idx = csr(src, dst)
+    return parent_ptr, parent_idx, child_ptr, child_idx
+
+
+def sla_slack(graph, durations, sla_jobs=None):
+    """
+    Earliest finish of every job and its least slack towards any downstream
+    SLA job, in one forward and one reverse topological pass over the whole
+    graph (linear in jobs + edges).
+
+    Each SLA job must finish by its own earliest finish (its critical
+    path). The reverse pass carries the latest finish that keeps every SLA
+    job downstream on time, latest[j] = min(latest[c] - dur[c]) over the
+    children c, together with the SLA job that binds it.
+
+    Parameters
+    ----------
+    graph : JobGraph
+    durations : dict
+        job -> seconds (missing / NaN count as 0).
+    sla_jobs : iterable of str, optional
+        Jobs with an SLA; default every job without children.
+
+    Returns
+    -------
+    dur, finish : np.ndarray
+        Duration and earliest finish (seconds from the start of the graph)
+        per graph id.
+    is_sla : np.ndarray of bool
+    slack : np.ndarray
+        Seconds the job can slip before some downstream SLA job (itself
+        included) finishes later than its critical path; NaN when no SLA
+        job is downstream.
+    sla_id : np.ndarray
+        Graph id of the SLA job with that least slack (-1 when none).
+    """
+    n = len(graph)
+    order = graph.topo_ids(np.arange(n))
+    dur = np.zeros(n)
+    for job, d in durations.items():
+        i = graph.index.get(job)
+        if i is not None and d is not None and d == d:
+            dur[i] = d
+
+    pptr, pidx = graph.parent_ptr, graph.parent_idx
+    finish = np.zeros(n)
+    for i in order.tolist():
+        ps = pidx[pptr[i]:pptr[i + 1]]
+        finish[i] = dur[i] + (finish[ps].max() if len(ps) else 0.0)
+
+    is_sla = np.zeros(n, dtype=bool)
+    if sla_jobs is None:
+        is_sla[np.diff(graph.child_ptr) == 0] = True
+    else:
+        is_sla[[graph.index[j] for j in sla_jobs if j in graph.index]] = True
+
+    cptr, cidx = graph.child_ptr, graph.child_idx
+    latest = np.where(is_sla, finish, np.inf)
+    sla_id = np.where(is_sla, np.arange(n), -1)
+    for j in order[::-1].tolist():
+        cs = cidx[cptr[j]:cptr[j + 1]]
+        if not len(cs):
+            continue
+        cand = latest[cs] - dur[cs]
+        k = int(cand.argmin())
+        if cand[k] < latest[j]:
+            latest[j] = cand[k]
+            sla_id[j] = sla_id[cs[k]]
+    slack = np.where(np.isfinite(latest), latest - finish, np.nan)
+    return dur, finish, is_sla, slack, sla_id
+
+
+def downstream_slack(graph, job, dur, finish, is_sla):
+    """
+    Slack of `job` towards each SLA job downstream of it (itself included),
+    from the arrays of sla_slack. Only the job's descendants are visited.
+
+    Returns
+    -------
+    sla_ids : np.ndarray
+        Graph ids of the downstream SLA jobs (empty for an unknown job).
+    slack : np.ndarray
+        Seconds `job` can slip before that SLA job finishes later than its
+        critical path.
+    """
+    desc = graph.descendant_ids(job)
+    if not len(desc):
+        return desc, np.zeros(0)
+    src = graph.index[job]
+    # Longest path from the end of `job` to the end of each descendant
+    tail = np.full(len(graph), -np.inf)
+    tail[src] = 0.0
+    pptr, pidx = graph.parent_ptr, graph.parent_idx
+    for c in graph.topo_ids(desc).tolist():
+        if c != src:
+            tail[c] = dur[c] + tail[pidx[pptr[c]:pptr[c + 1]]].max()
+    sla_ids = desc[is_sla[desc]]
+    return sla_ids, finish[sla_ids] - (finish[src] + tail[sla_ids])
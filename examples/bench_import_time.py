@@ -0,0 +1,90 @@
+# bench_import_time.py
+"""
+Import-time benchmark for the slow_trade_detector modules.
+
+Each module is imported in a fresh interpreter, timed, and checked for
+heavy optional dependencies that must only load when actually used
+(matplotlib, sklearn, pyodbc, jinja2).
+
+Run:
+    python examples/bench_import_time.py [--repeat 5] [--budget 2.0]
+
+Exits non-zero if a module drags in a lazy dependency at import time or
+its best import time exceeds --budget seconds.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = [
+    "slow_trade_detector.config",
+    "slow_trade_detector.detector_batch",
+    "slow_trade_detector.detector_instrument",
+    "slow_trade_detector.detector_jobs",
+    "slow_trade_detector.detector_pipeline",
+    "slow_trade_detector.detector_sql",
+    "slow_trade_detector.loader",
+    "slow_trade_detector.loader_sybase",
+    "slow_trade_detector.plots",
+    "slow_trade_detector.plots_batch",
+    "slow_trade_detector.preprocess",
+    "slow_trade_detector.regression",
+    "slow_trade_detector.report_html",
+    "slow_trade_detector.result_cache",
+    "slow_trade_detector.rolling",
+    "slow_trade_detector.slow_score",
+    "slow_trade_detector.xref_jobs",
+]
+
+LAZY_DEPS = ["matplotlib", "sklearn", "pyodbc", "jinja2", "duckdb", "numba", "polars"]
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+loaded = [m for m in {lazy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "loaded": loaded}}))
+"""
+
+
+def time_import(module: str) -> dict:
+    """Import `module` in a clean interpreter; return seconds + lazy deps loaded."""
+    code = _PROBE.format(module=module, lazy=LAZY_DEPS)
+    out = subprocess.check_output([sys.executable, "-c", code], text=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=2.0,
+                        help="max seconds allowed for any single module import")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':45} {'best (s)':>9}  lazy deps loaded")
+    for module in MODULES:
+        runs = [time_import(module) for _ in range(args.repeat)]
+        best = min(r["seconds"] for r in runs)
+        loaded = runs[0]["loaded"]
+        print(f"{module:45} {best:9.3f}  {', '.join(loaded) or '-'}")
+
+        if loaded:
+            failures.append(f"{module} imports {', '.join(loaded)} at import time")
+        if best > args.budget:
+            failures.append(f"{module} took {best:.2f}s (> {args.budget}s)")
+
+    if failures:
+        print("\nFAILED:")
+        for f in failures:
+            print(" -", f)
+        sys.exit(1)
+
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# check_export_runs.py
+"""
+Check export_runs.py against a stub `autorep` on PATH.
+
+The stub serves --history daily runs per job (newest first, as many as
+-r asks for), logs every call, and also writes a run-like line to stderr
+on every call, which must not end up in the parsed output. Jobs:
+
+  JNEW      no ingested history: --runs runs exported in one call
+  JOLD      history in job_runs up to --new_runs runs ago: asked for
+            --recent_runs, then widened until the runs reach back to the
+            ingested one; only the newer runs are kept
+  JRETRY    fails on its first call, exported on the retry
+  JFAIL     always exits 1 with a message on stderr: retried --retries
+            times, reported with that message, exit status 1
+
+Run:
+    python examples/check_export_runs.py [--history 40] [--new_runs 12]
+
+Exits non-zero on the first mismatch.
+"""
+
+import argparse
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+
+import duckdb
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUNS, RECENT_RUNS, RETRIES = 8, 5, 2
+
+STUB = """#!/bin/sh
+# stub: autorep -j JOB -r N -d
+echo "$2 $4" >> "{log}"
+echo "Status: FAILURE   Start Time: 1999-01-01 00:00:00   End Time: 1999-01-01 01:00:00" >&2
+if [ "$2" = "JFAIL" ]; then
+    echo "CAUAJM_E_50033 Job Name does not exist: $2" >&2
+    exit 1
+fi
+if [ "$2" = "JRETRY" ] && [ ! -e "{work}/retried" ]; then
+    touch "{work}/retried"
+    echo "CAUAJM_E_10030 Communication timeout" >&2
+    exit 2
+fi
+head -n "$4" "{dates}" | while read d; do
+    echo "Job Name: $2"
+    echo "Status: SUCCESS   Start Time: $d 18:00:00   End Time: $d 19:10:00   Eligible Time: $d 17:59:00"
+done
+"""
+
+
+def calls_by_job(log):
+    """job -> list of -r values, in call order."""
+    calls = {}
+    with open(log) as f:
+        for line in f:
+            job, runs = line.split()
+            calls.setdefault(job, []).append(int(runs))
+    return calls
+
+
+def widening(since_rank, runs, recent_runs):
+    """-r values export_runs.py should request for a job whose last ingested run is since_rank-th newest."""
+    asked, n = [], recent_runs
+    while True:
+        asked.append(n)
+        if n >= since_rank:
+            return asked
+        n = max(runs, n * 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", type=int, default=40, help="runs the stub has per job")
+    parser.add_argument("--new_runs", type=int, default=12, help="JOLD runs newer than job_runs")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="export_runs_")
+    log, dates = os.path.join(work, "calls.log"), os.path.join(work, "dates.txt")
+    days = pd.date_range(end="2025-03-31", periods=args.history, freq="D")[::-1]
+    with open(dates, "w") as f:
+        f.write("\n".join(d.strftime("%Y-%m-%d") for d in days) + "\n")
+    stub = os.path.join(work, "autorep")
+    with open(stub, "w") as f:
+        f.write(STUB.format(log=log, work=work, dates=dates))
+    os.chmod(stub, os.stat(stub).st_mode | stat.S_IEXEC)
+    jobs = os.path.join(work, "jobs.txt")
+    with open(jobs, "w") as f:
+        f.write("JNEW\nJOLD\nJRETRY\nJFAIL\n")
+
+    # JOLD already has runs up to the (new_runs + 1)-th newest one
+    db = os.path.join(work, "runs.db")
+    con = duckdb.connect(db)
+    con.execute("CREATE TABLE job_runs (job TEXT, start_time TIMESTAMP)")
+    con.execute("INSERT INTO job_runs VALUES ('JOLD', ?)",
+                [days[args.new_runs] + pd.Timedelta(hours=18)])
+    con.close()
+
+    out = os.path.join(work, "runs.csv")
+    try:
+        proc = subprocess.run(
+            [sys.executable, os.path.join(ROOT, "export_runs.py"), jobs, "--db", db,
+             "--runs", str(RUNS), "--recent_runs", str(RECENT_RUNS),
+             "--retries", str(RETRIES), "--backoff", "0.01", "--out", out],
+            capture_output=True, text=True, cwd=work,
+            env={**os.environ, "PATH": work + os.pathsep + os.environ["PATH"]},
+        )
+        df = pd.read_csv(out, parse_dates=["start_time"])
+        calls = calls_by_job(log)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    counts = df["job"].value_counts().to_dict()
+    checks = [
+        ("JNEW", counts.get("JNEW", 0), RUNS, calls.get("JNEW"), [RUNS]),
+        ("JOLD", counts.get("JOLD", 0), args.new_runs, calls.get("JOLD"),
+         widening(args.new_runs + 1, RUNS, RECENT_RUNS)),
+        ("JRETRY", counts.get("JRETRY", 0), RUNS, calls.get("JRETRY"), [RUNS, RUNS]),
+        ("JFAIL", counts.get("JFAIL", 0), 0, calls.get("JFAIL"), [RUNS] * (RETRIES + 1)),
+    ]
+    failures = []
+    for job, rows, want_rows, asked, want_asked in checks:
+        errs = []
+        if rows != want_rows:
+            errs.append(f"{job}: {rows} runs exported, expected {want_rows}")
+        if asked != want_asked:
+            errs.append(f"{job}: autorep -r {asked}, expected {want_asked}")
+        print(f"{job:8} runs {rows:4}  autorep -r {str(asked):20} {'OK' if not errs else 'MISMATCH'}")
+        failures += errs
+
+    if (df["start_time"].dt.year == 1999).any():
+        failures.append("autorep stderr was parsed as a run")
+    if proc.returncode != 1:
+        failures.append(f"exit status {proc.returncode}, expected 1")
+    if "Job Name does not exist: JFAIL" not in proc.stderr:
+        failures.append("JFAIL's autorep stderr message was not reported")
+    if "Export failed for 1 jobs: JFAIL" not in proc.stderr:
+        failures.append("JFAIL was not reported as failed")
+    print(f"exit {proc.returncode}")
+
+    if failures:
+        print("\nFAILED:")
+        for f in failures:
+            print(" -", f)
+        print("\nexport_runs.py stderr:\n" + proc.stderr)
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
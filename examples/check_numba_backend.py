@@ -0,0 +1,81 @@
+# check_numba_backend.py
+"""
+Check that the numba kernels match the NumPy implementation.
+
+Runs the batch and instrument detectors on the synthetic data of
+check_sql_backend.py once with config.USE_NUMBA off and once on, for
+every center / spread combination, and compares all output columns.
+A warm-up call first compiles the kernels (or loads them from the
+on-disk cache), so the timings are steady-state.
+
+Run:
+    python examples/check_numba_backend.py [--days 120] [--secids 300]
+
+Exits non-zero on the first mismatch, or when numba is not installed.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from check_sql_backend import compare, make_batch, make_instrument
+from slow_trade_detector import config, rolling
+from slow_trade_detector.detector_batch import detect_batch_anomalies
+from slow_trade_detector.detector_instrument import detect_instrument_anomalies
+
+
+def run(fn, df, center, spread, use_numba):
+    config.USE_NUMBA = use_numba
+    t0 = time.perf_counter()
+    out = fn(df, center=center, spread=spread)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--secids", type=int, default=300)
+    args = parser.parse_args()
+
+    config.USE_NUMBA = True
+    if rolling._numba_kernels() is None:
+        print("numba is not installed")
+        sys.exit(1)
+
+    rng = np.random.default_rng(0)
+    batch = make_batch(args.days, rng)
+    inst = make_instrument(args.days, args.secids, rng)
+
+    t0 = time.perf_counter()
+    for spread in ("std", "mad"):
+        run(detect_batch_anomalies, batch.head(50), "dow", spread, True)
+        run(detect_instrument_anomalies, inst.head(50), "dow", spread, True)
+    print(f"warm-up (compile or cache load) {time.perf_counter() - t0:.3f}s\n")
+
+    failures = []
+    for center in ("rolling", "dow"):
+        for spread in ("std", "mad"):
+            for name, df, fn in (
+                ("batch", batch, detect_batch_anomalies),
+                ("instrument", inst, detect_instrument_anomalies),
+            ):
+                expected, t_numpy = run(fn, df, center, spread, False)
+                got, t_numba = run(fn, df, center, spread, True)
+                err = compare(f"{name} center={center} spread={spread}", expected, got)
+                print(f"{name:10} {center:7} {spread:3}  rows {len(got):7}  "
+                      f"numpy {t_numpy:6.3f}s  numba {t_numba:6.3f}s  {'OK' if err is None else 'MISMATCH'}")
+                if err:
+                    failures.append(err)
+
+    if failures:
+        print("\nFAILED:")
+        for f in failures:
+            print(" -", f)
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# check_parse_deps.py
+"""
+Check the parse_deps.py crawler against a stub `autorep` on PATH.
+
+The stub serves a binary-tree DAG (job Jn depends on J(2n+1) and
+J(2n+2), up to --jobs jobs), sleeps a little per call like the real CLI,
+logs every call, and fails (exit 1, message on stderr) for --fail_job.
+Each definition also carries box_success: and description: attributes
+with s(...)-style job references, which must not be read as parents.
+Runs parse_deps.py in crawl mode three times:
+
+  cold          empty cache: every job fetched, the failed job and its
+                subtree are missing and reported, exit status 1
+  warm          only the failed job is fetched again (failures are not
+                cached)
+  recovered     the stub stops failing: the full DAG, exit status 0
+
+Run:
+    python examples/check_parse_deps.py [--jobs 200] [--fail_job J5]
+
+Exits non-zero on the first mismatch.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STUB = """#!/bin/sh
+# stub: autorep -j JOB -q
+echo "$2" >> "{log}"
+sleep 0.05
+if [ "$2" = "$(cat "{fail}" 2>/dev/null)" ]; then
+    echo "CAUAJM_E_50033 Job Name does not exist: $2" >&2
+    exit 1
+fi
+n=${{2#J}}
+echo "insert_job: $2   job_type: CMD"
+echo "box_success: s(BOX$n) & f(J999)"
+echo 'description: "rerun after d(J998) is done"'
+a=$((2 * n + 1)); b=$((2 * n + 2))
+if [ $b -lt {jobs} ]; then echo "condition: s(J$a) & f(J$b)"; fi
+"""
+
+
+def expected_graph(jobs, skip=None):
+    """Binary-tree DAG upstream of J0, without skip and its ancestors."""
+    graph, level = {}, [0]
+    while level:
+        nxt = []
+        for n in level:
+            if f"J{n}" == skip:
+                continue
+            graph[f"J{n}"] = [f"J{2 * n + 1}", f"J{2 * n + 2}"] if 2 * n + 2 < jobs else []
+            nxt += [2 * n + 1, 2 * n + 2] if 2 * n + 2 < jobs else []
+        level = nxt
+    return graph
+
+
+def crawl(work, log):
+    """Run parse_deps.py; returns (graph, exit status, autorep calls, seconds)."""
+    open(log, "w").close()
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "parse_deps.py"), work, "J0",
+         "--cache_dir", os.path.join(work, "cache")],
+        capture_output=True, text=True, cwd=work,
+        env={**os.environ, "PATH": work + os.pathsep + os.environ["PATH"]},
+    )
+    elapsed = time.perf_counter() - t0
+    with open(log) as f:
+        calls = f.read().split()
+    return json.loads(proc.stdout), proc.returncode, calls, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--fail_job", default="J5")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="parse_deps_")
+    log, fail = os.path.join(work, "calls.log"), os.path.join(work, "fail")
+    stub = os.path.join(work, "autorep")
+    with open(stub, "w") as f:
+        f.write(STUB.format(log=log, fail=fail, jobs=args.jobs))
+    os.chmod(stub, os.stat(stub).st_mode | stat.S_IEXEC)
+    with open(fail, "w") as f:
+        f.write(args.fail_job)
+
+    partial = expected_graph(args.jobs, skip=args.fail_job)
+    full = expected_graph(args.jobs)
+    failures = []
+    try:
+        for name, want, want_status, want_calls in (
+            ("cold", partial, 1, len(partial) + 1),
+            ("warm", partial, 1, 1),
+            ("recovered", full, 0, len(full) - len(partial)),
+        ):
+            if name == "recovered":
+                os.remove(fail)
+            graph, status, calls, elapsed = crawl(work, log)
+            errs = []
+            if graph != want:
+                errs.append(f"{name}: graph has {len(graph)} jobs, expected {len(want)}")
+            if status != want_status:
+                errs.append(f"{name}: exit status {status}, expected {want_status}")
+            if len(calls) != want_calls:
+                errs.append(f"{name}: {len(calls)} autorep calls, expected {want_calls}")
+            if len(calls) != len(set(calls)):
+                errs.append(f"{name}: some jobs were looked up more than once")
+            print(f"{name:10} jobs {len(graph):5}  autorep calls {len(calls):5}  "
+                  f"exit {status}  {elapsed:6.2f}s  {'OK' if not errs else 'MISMATCH'}")
+            failures += errs
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    if failures:
+        print("\nFAILED:")
+        for f in failures:
+            print(" -", f)
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# check_polars_backend.py
+"""
+Check that the Polars backend matches the pandas detectors.
+
+Runs run_batch_stage / run_instrument_stage on the synthetic data of
+check_sql_backend.py once with pandas input and once with polars
+LazyFrames (default center / spread), compares the results and the
+flagged pairs, and renders the HTML report from the converted polars
+results. Then compares the detectors directly for every center /
+spread combination.
+
+Run:
+    python examples/check_polars_backend.py [--days 120] [--secids 300]
+
+Exits non-zero on the first mismatch.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import polars as pl
+
+from check_sql_backend import compare, make_batch, make_instrument
+from slow_trade_detector.detector_batch import detect_batch_anomalies
+from slow_trade_detector.detector_instrument import detect_instrument_anomalies
+from slow_trade_detector.detector_pipeline import (
+    run_batch_stage,
+    run_instrument_stage,
+    to_pandas,
+)
+from slow_trade_detector.detector_polars import (
+    detect_batch_anomalies_pl,
+    detect_instrument_anomalies_pl,
+    from_pandas,
+)
+from slow_trade_detector.report_html import render_html_report
+
+
+def check_pipeline(batch, inst):
+    failures = []
+    expected, expected_pairs = run_batch_stage(batch)
+    lazy, pairs = run_batch_stage(from_pandas(batch))
+    if not isinstance(lazy, pl.LazyFrame):
+        failures.append(f"batch stage returned {type(lazy).__name__} for a LazyFrame")
+    batch_result = to_pandas(lazy)
+    err = compare("pipeline batch", expected, batch_result)
+    if err:
+        failures.append(err)
+    if pairs != expected_pairs:
+        failures.append(f"flagged pairs differ: {len(expected_pairs)} vs {len(pairs)}")
+
+    expected_inst = run_instrument_stage(inst)
+    inst_result = to_pandas(run_instrument_stage(from_pandas(inst, lazy=False)))
+    err = compare("pipeline instrument", expected_inst, inst_result)
+    if err:
+        failures.append(err)
+
+    html = render_html_report(batch_result, inst_result[inst_result["slow_trade"]])
+    print(f"pipeline: {len(pairs)} flagged pairs, report {len(html)} chars  "
+          f"{'OK' if not failures else 'MISMATCH'}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--secids", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    batch = make_batch(args.days, rng)
+    inst = make_instrument(args.days, args.secids, rng)
+    # Rows without a secId form their own rolling group
+    inst.loc[inst.index[rng.choice(len(inst), 40, replace=False)], "secId"] = None
+
+    failures = check_pipeline(batch, inst)
+    for center in ("rolling", "dow"):
+        for spread in ("std", "mad"):
+            for name, df, pandas_fn, polars_fn in (
+                ("batch", batch, detect_batch_anomalies, detect_batch_anomalies_pl),
+                ("instrument", inst, detect_instrument_anomalies, detect_instrument_anomalies_pl),
+            ):
+                lazy = from_pandas(df)
+                t0 = time.perf_counter()
+                expected = pandas_fn(df, center=center, spread=spread)
+                t1 = time.perf_counter()
+                got = polars_fn(lazy, center=center, spread=spread).collect()
+                t2 = time.perf_counter()
+                err = compare(f"{name} center={center} spread={spread}", expected, to_pandas(got))
+                print(f"{name:10} {center:7} {spread:3}  rows {len(got):7}  "
+                      f"pandas {t1 - t0:6.3f}s  polars {t2 - t1:6.3f}s  {'OK' if err is None else 'MISMATCH'}")
+                if err:
+                    failures.append(err)
+
+    if failures:
+        print("\nFAILED:")
+        for f in failures:
+            print(" -", f)
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# check_result_cache.py
+"""
+Check the detector result cache against uncached runs.
+
+Runs both pipeline stages on the synthetic data of check_sql_backend.py
+through a fresh ResultCache for a sequence of typical re-runs, and
+compares every result (and the flagged pairs) with an uncached run:
+
+  cold          empty cache
+  warm          identical input
+  row changed   one instrument / batch value edited ten days back
+  day appended  one more EOD date
+  shuffled      same rows, different input order
+  threshold     same rows, ZSCORE_THRESHOLD lowered (flags are
+                re-applied to cached z-scores, so everything hits)
+  numpy         same rows, USE_NUMBA off (not part of the key, so
+                everything hits)
+
+Run:
+    python examples/check_result_cache.py [--days 120] [--secids 300] [--center dow]
+
+Exits non-zero on the first mismatch.
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from check_sql_backend import compare, make_batch, make_instrument
+from slow_trade_detector import config, detector_batch, detector_instrument
+from slow_trade_detector.detector_batch import detect_batch_anomalies
+from slow_trade_detector.detector_instrument import detect_instrument_anomalies
+from slow_trade_detector.detector_pipeline import run_batch_stage, run_instrument_stage
+from slow_trade_detector.result_cache import ResultCache
+
+
+def scenarios(batch, inst):
+    yield "cold", batch, inst
+    yield "warm", batch, inst
+
+    day = sorted(inst["eodDate"].unique())[-10]
+    inst = inst.copy()
+    inst.loc[inst.index[inst["eodDate"] == day][0], "cpu_time"] = 999.0
+    batch = batch.copy()
+    batch.loc[batch.index[batch["eodDate"] == day][0], "cpu_time_seconds"] = 5000.0
+    yield "row changed", batch, inst
+
+    last = inst["eodDate"].max()
+    new_day = last + pd.Timedelta(days=1)
+    inst = pd.concat([inst, inst[inst["eodDate"] == last].assign(eodDate=new_day)], ignore_index=True)
+    batch = pd.concat([batch, batch[batch["eodDate"] == last].assign(eodDate=new_day)], ignore_index=True)
+    yield "day appended", batch, inst
+
+    batch, inst = batch.sample(frac=1, random_state=9), inst.sample(frac=1, random_state=9)
+    yield "shuffled", batch, inst
+    yield "threshold", batch, inst
+    yield "numpy", batch, inst
+
+
+def set_threshold(value):
+    """ZSCORE_THRESHOLD where the detectors (and the cache's flags) read it."""
+    detector_batch.ZSCORE_THRESHOLD = value
+    detector_instrument.ZSCORE_THRESHOLD = value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--secids", type=int, default=300)
+    parser.add_argument("--center", choices=("rolling", "dow"), default=config.ZSCORE_CENTER)
+    args = parser.parse_args()
+
+    # The uncached stages call the detectors with their defaults
+    config.ZSCORE_CENTER = args.center
+    detect_batch_anomalies.__defaults__ = (args.center, config.ZSCORE_SPREAD)
+    detect_instrument_anomalies.__defaults__ = (args.center, config.ZSCORE_SPREAD)
+
+    rng = np.random.default_rng(0)
+    batch = make_batch(args.days, rng)
+    inst = make_instrument(args.days, args.secids, rng)
+
+    cache_dir = tempfile.mkdtemp(prefix="result_cache_")
+    cache = ResultCache(cache_dir)
+    failures = []
+    try:
+        for name, b, i in scenarios(batch, inst):
+            if name == "threshold":
+                set_threshold(detector_batch.ZSCORE_THRESHOLD - 1.0)
+            if name == "numpy":
+                config.USE_NUMBA = False
+            t0 = time.perf_counter()
+            expected, expected_pairs = run_batch_stage(b)
+            expected_inst = run_instrument_stage(i)
+            t1 = time.perf_counter()
+            hits, misses = cache.hits, cache.misses
+            got, pairs = run_batch_stage(b, cache=cache)
+            got_inst = run_instrument_stage(i, cache=cache)
+            t2 = time.perf_counter()
+
+            errs = [compare(f"{name} batch", expected, got),
+                    compare(f"{name} instrument", expected_inst, got_inst)]
+            if pairs != expected_pairs:
+                errs.append(f"{name}: flagged pairs differ")
+            if name in ("warm", "threshold", "numpy") and cache.misses != misses:
+                errs.append(f"{name}: {cache.misses - misses} cache misses, expected none")
+            errs = [e for e in errs if e]
+            print(f"{name:13} uncached {t1 - t0:6.3f}s  cached {t2 - t1:6.3f}s  "
+                  f"hits {cache.hits - hits:5}  misses {cache.misses - misses:5}  "
+                  f"{'OK' if not errs else 'MISMATCH'}")
+            failures += errs
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if failures:
+        print("\nFAILED:")
+        for f in failures:
+            print(" -", f)
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# check_sql_backend.py
+"""
+Check that the DuckDB backend matches the pandas detectors.
+
+Builds synthetic batch and instrument data with the awkward cases the
+two implementations must agree on (duplicate dates, NaNs, cnt == 0,
+missing phases and dates, rows out of order, single-row cross-sections),
+runs both backends for every center / spread combination and compares
+all output columns. The DuckDB backend reads the data both as a
+registered DataFrame and as a table (input order from rowid).
+
+Run:
+    python examples/check_sql_backend.py [--days 120] [--secids 300]
+
+Exits non-zero on the first mismatch.
+"""
+
+import argparse
+import sys
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from slow_trade_detector.detector_batch import detect_batch_anomalies
+from slow_trade_detector.detector_instrument import detect_instrument_anomalies
+from slow_trade_detector.detector_sql import (
+    detect_batch_anomalies_sql,
+    detect_instrument_anomalies_sql,
+)
+
+
+def make_batch(days, rng):
+    dates = pd.date_range("2024-01-01", periods=days, freq="D")
+    rows = [(d, ph, rng.integers(80, 140), rng.normal(200, 40) * (5 if rng.random() < 0.03 else 1),
+             rng.integers(0, 60) if rng.random() < 0.95 else 0)
+            for d in dates for ph in ["B", "A", "C"]]
+    df = pd.DataFrame(rows, columns=["eodDate", "phase", "total_grid_calls", "cpu_time_seconds", "cnt"])
+    df.loc[rng.random(len(df)) < 0.02, "cpu_time_seconds"] = np.nan
+    # A duplicate (date, phase) row, missing-phase rows (kept as one group,
+    # placed first), missing dates (sorted last) and shuffled input order
+    df = pd.concat([df, df.iloc[[10]], df.iloc[[4, 40, 41]].assign(phase=None),
+                    df.iloc[[7, 8]].assign(eodDate=pd.NaT)], ignore_index=True)
+    return df.sample(frac=1, random_state=1).reset_index(drop=True)
+
+
+def make_instrument(days, secids, rng):
+    dates = pd.date_range("2024-01-01", periods=days, freq="D")
+    n = days * secids
+    df = pd.DataFrame({
+        "eodDate": np.repeat(dates, secids),
+        "phase": rng.choice(["A", "B"], n),
+        "secId": np.tile([f"S{i:04d}" for i in range(secids)], days),
+        "num_calls": rng.integers(1, 20, n).astype(float),
+        "cpu_time": rng.gamma(4, 3, n) * np.where(rng.random(n) < 0.01, 6, 1),
+    })
+    df.loc[rng.random(n) < 0.01, "cpu_time"] = np.nan
+    # Same secId twice on a date in different phases, a lone (date, phase),
+    # and rows with a missing phase or date (dropped by every backend)
+    extra = df.iloc[:secids // 2].assign(phase="Z")
+    df = pd.concat([df, extra, df.iloc[[5]].assign(phase="ONLY"),
+                    df.iloc[[6, 7]].assign(phase=None), df.iloc[[8]].assign(eodDate=pd.NaT)],
+                   ignore_index=True)
+    return df.sample(frac=1, random_state=2).reset_index(drop=True)
+
+
+def _spread_col(col):
+    """Rolling spread column a z-score column is divided by (std; MAD when present)."""
+    base = "cpu" if col == "zscore_cpu" else col[:-len("_z")]
+    return [f"roll_mad_{base}", f"roll_std_{base}"] if col == "zscore_cpu" else \
+        [f"{base}_roll_mad", f"{base}_roll_std"]
+
+
+def compare(name, expected, got):
+    """
+    First differing column, or None. z-scores are not compared where the
+    spread is numerically zero (a window of equal values): numpy's std
+    can leave ~1e-15 there and DuckDB exact 0, turning z = 0 into NaN.
+    The anomaly flags agree either way and are always compared.
+    """
+    if list(expected.columns) != list(got.columns):
+        return f"{name}: columns differ\n  pandas {list(expected.columns)}\n  sql    {list(got.columns)}"
+    if len(expected) != len(got):
+        return f"{name}: {len(expected)} vs {len(got)} rows"
+    for col in expected.columns:
+        a, b = expected[col], got[col]
+        if pd.api.types.is_datetime64_any_dtype(a):
+            x, y = pd.to_datetime(a).to_numpy(), pd.to_datetime(b).to_numpy()
+            same = ((x == y) | (np.isnat(x) & np.isnat(y))).all()
+        elif a.dtype == bool or col.endswith("anomaly") or col == "slow_trade":
+            same = (a.astype(bool).to_numpy() == b.astype(bool).to_numpy()).all()
+        elif a.dtype == object and not pd.api.types.is_numeric_dtype(pd.to_numeric(a, errors="coerce")):
+            same = (a.astype(str).to_numpy() == b.astype(str).to_numpy()).all()
+        else:
+            x = pd.to_numeric(a, errors="coerce").to_numpy(dtype=float)
+            y = pd.to_numeric(b, errors="coerce").to_numpy(dtype=float)
+            if col.endswith("_z") or col == "zscore_cpu":
+                spread = next(c for c in _spread_col(col) if c in expected.columns)
+                keep = ~(np.abs(expected[spread].to_numpy(dtype=float)) < 1e-9)
+                x, y = x[keep], y[keep]
+            same = np.allclose(x, y, rtol=1e-9, atol=1e-9, equal_nan=True)
+        if not same:
+            return f"{name}: column {col} differs"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--secids", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    batch = make_batch(args.days, rng)
+    inst = make_instrument(args.days, args.secids, rng)
+    con = duckdb.connect()
+    con.execute("CREATE TABLE batch_src AS SELECT * FROM batch")
+    con.execute("CREATE TABLE inst_src AS SELECT * FROM inst")
+
+    failures = []
+    for center in ("rolling", "dow"):
+        for spread in ("std", "mad"):
+            for name, df, table, pandas_fn, sql_fn in (
+                ("batch", batch, "batch_src", detect_batch_anomalies, detect_batch_anomalies_sql),
+                ("instrument", inst, "inst_src", detect_instrument_anomalies,
+                 detect_instrument_anomalies_sql),
+            ):
+                t0 = time.perf_counter()
+                expected = pandas_fn(df, center=center, spread=spread)
+                t1 = time.perf_counter()
+                got = sql_fn(con, df, center=center, spread=spread)
+                t2 = time.perf_counter()
+                err = compare(f"{name} center={center} spread={spread}", expected, got)
+                err = err or compare(f"{name} center={center} spread={spread} (table)", expected,
+                                     sql_fn(con, table, center=center, spread=spread))
+                flags = "batch_anomaly" if name == "batch" else "slow_trade"
+                print(f"{name:10} {center:7} {spread:3}  rows {len(got):7}  flagged {int(got[flags].sum()):5}  "
+                      f"pandas {t1 - t0:6.3f}s  duckdb {t2 - t1:6.3f}s  {'OK' if err is None else 'MISMATCH'}")
+                if err:
+                    failures.append(err)
+
+    if failures:
+        print("\nFAILED:")
+        for f in failures:
+            print(" -", f)
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
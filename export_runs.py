@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# export_runs.py
+# Usage: python3 export_runs.py <deps_all.txt|deps.json> [--runs 30] [--db autosys_analysis.db]
+#            [--out runs.parquet] [--concurrency 16] [--retries 3] [--raw_dir runs_export]
+#
+# Python replacement for export_runs.sh: `autorep -j JOB -r N -d` for every
+# job in the tree, run concurrently (bounded by --concurrency), retried with
+# exponential backoff on failure or --timeout, and parsed in memory with
+# parse_runs.parse_lines -- no per-job text files unless --raw_dir is given.
+# The result is one Parquet (or .csv) table ready for ingest_to_duckdb.py.
+#
+# With --db the export is incremental: jobs that already have runs in
+# job_runs ask autorep for only --recent_runs runs, and only runs that
+# started after the job's latest ingested start_time are kept. When even the
+# oldest of those is newer, the job is asked again for --runs runs, then
+# twice as many each time, until the runs reach back to the latest ingested
+# one or autorep returns no more.
+
+import sys, os, json, time, random, argparse, asyncio
+
+import pandas as pd
+
+from parse_runs import COLUMNS, parse_lines, write_table
+
+parser = argparse.ArgumentParser()
+parser.add_argument('jobs', help='deps_all.txt (one job per line) or deps.json from parse_deps.py')
+parser.add_argument('--runs', type=int, default=30, help='runs to export per job')
+parser.add_argument('--db', help='DuckDB with job_runs; export only runs newer than ingested ones')
+parser.add_argument('--recent_runs', type=int, default=5,
+                    help='--db: runs to request for jobs that already have history')
+parser.add_argument('--out', default='runs.parquet')
+parser.add_argument('--concurrency', type=int, default=16,
+                    help='max autorep processes running at once')
+parser.add_argument('--retries', type=int, default=3, help='retries per job after the first attempt')
+parser.add_argument('--backoff', type=float, default=1.0,
+                    help='seconds before the first retry, doubled on each retry')
+parser.add_argument('--timeout', type=float, default=300, help='seconds per autorep call')
+parser.add_argument('--raw_dir', help='also keep raw autorep output as <raw_dir>/<job>_runs.txt')
+
+
+def load_jobs(path):
+    """Job names from deps.json (jobs and their parents) or a one-per-line list."""
+    if path.endswith('.json'):
+        with open(path) as f:
+            deps = json.load(f)
+        jobs = set(deps)
+        for parents in deps.values():
+            jobs.update(parents)
+        return sorted(jobs)
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def last_ingested(db, jobs):
+    """job -> latest start_time already in job_runs (jobs without runs omitted)."""
+    import duckdb
+    con = duckdb.connect(db, read_only=True)
+    con.register('export_jobs', pd.DataFrame({'job': jobs}))
+    df = con.execute("""
+        SELECT r.job, max(r.start_time) AS last_start
+        FROM job_runs r
+        JOIN export_jobs j ON j.job = r.job
+        GROUP BY r.job
+    """).df()
+    con.close()
+    return dict(zip(df['job'], df['last_start']))
+
+
+async def autorep_runs(job, runs, sem, opts):
+    """
+    `autorep -j JOB -r N -d` with retries; returns its output, or None once
+    every attempt failed (non-zero exit, timeout or autorep missing).
+    """
+    for attempt in range(opts.retries + 1):
+        if attempt:
+            delay = opts.backoff * 2 ** (attempt - 1)
+            await asyncio.sleep(delay * (0.5 + random.random()))
+        async with sem:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    "autorep", "-j", job, "-r", str(runs), "-d",
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            except OSError as e:
+                print(f"[!] {job}: {e}", file=sys.stderr)
+                return None
+            try:
+                out, err = await asyncio.wait_for(proc.communicate(), opts.timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                print(f"[!] {job}: autorep timed out (attempt {attempt + 1})", file=sys.stderr)
+                continue
+        if proc.returncode == 0:
+            return out.decode(errors="replace")
+        # stderr is kept out of the parsed output and only reported here
+        msg = err.decode(errors="replace").strip() or out.decode(errors="replace").strip()
+        print(f"[!] {job}: autorep exit {proc.returncode} (attempt {attempt + 1}): {msg[:200]}",
+              file=sys.stderr)
+    return None
+
+
+async def export_job(job, since, sem, opts):
+    """Export and parse one job; returns (rows, ok)."""
+    runs = opts.recent_runs if since is not None else opts.runs
+    seen = -1
+    while True:
+        text = await autorep_runs(job, runs, sem, opts)
+        if text is None:
+            return [], False
+        rows = parse_lines(text.splitlines(), job)
+        # Incremental: ask for more until the oldest run returned is not
+        # newer than since, or autorep has no older runs to give
+        if since is None or not rows or len(rows) <= seen or min(r[1] for r in rows) <= since:
+            break
+        seen = len(rows)
+        runs = max(opts.runs, runs * 2)
+    if opts.raw_dir:
+        with open(os.path.join(opts.raw_dir, f"{job}_runs.txt"), 'w') as f:
+            f.write(text)
+    if since is not None:
+        rows = [r for r in rows if r[1] > since]
+    return rows, True
+
+
+async def export_all(jobs, last, opts):
+    sem = asyncio.Semaphore(max(1, opts.concurrency))
+    results = await asyncio.gather(*(export_job(j, last.get(j), sem, opts) for j in jobs))
+    rows, failed = [], []
+    for job, (job_rows, ok) in zip(jobs, results):
+        rows.extend(job_rows)
+        if not ok:
+            failed.append(job)
+    return rows, failed
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    jobs = load_jobs(args.jobs)
+    last = last_ingested(args.db, jobs) if args.db else {}
+    if args.raw_dir:
+        os.makedirs(args.raw_dir, exist_ok=True)
+
+    t0 = time.time()
+    rows, failed = asyncio.run(export_all(jobs, last, args))
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    write_table(df, args.out)
+
+    print(f"[+] {len(df)} new runs from {len(jobs) - len(failed)}/{len(jobs)} jobs "
+          f"written to {args.out} in {time.time() - t0:.1f}s", file=sys.stderr)
+    if failed:
+        print(f"[!] Export failed for {len(failed)} jobs: {' '.join(failed[:20])}"
+              f"{' ...' if len(failed) > 20 else ''}", file=sys.stderr)
+        sys.exit(1)
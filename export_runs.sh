@@ -1,6 +1,8 @@
 #!/bin/bash
 # Usage: ./export_runs.sh deps_all.txt 30
 # Export last N runs with -d details for every job in tree.
+# Thin wrapper around export_runs.py (concurrent, with retries); the raw
+# autorep output is still kept as $OUTDIR/<job>_runs.txt.
 
 JOBLIST="$1"
 RUNS="${2:-30}"
@@ -10,10 +12,8 @@ mkdir -p "$OUTDIR"
 
 echo "[+] Export directory: $OUTDIR"
 
-while read JOB; do
-    echo "[+] Exporting $RUNS runs for $JOB ..."
-    autorep -j "$JOB" -r "$RUNS" -d > "$OUTDIR/${JOB}_runs.txt" 2>&1
-done < "$JOBLIST"
+python3 "$(dirname "$0")/export_runs.py" "$JOBLIST" --runs "$RUNS" \
+    --raw_dir "$OUTDIR" --out "$OUTDIR/runs.parquet" || exit $?
 
 echo "[+] Runs export complete."
 echo "[+] Output in: $OUTDIR"
@@ -1,69 +1,351 @@
 #!/usr/bin/env python3
 # ingest_to_duckdb.py
-# Usage: python3 ingest_to_duckdb.py <db_path> <deps.json> <runs.csv> [logs_dir]
-
-import sys, json, duckdb, pandas as pd, os
-
-db = sys.argv[1]
-deps_file = sys.argv[2]
-runs_file = sys.argv[3]
-logs_dir = sys.argv[4] if len(sys.argv) > 4 else None
-
-con = duckdb.connect(db)
-
-# create tables
-con.execute("""
-CREATE TABLE IF NOT EXISTS job_dependencies (
-  job TEXT,
-  parent TEXT
-);
-""")
-con.execute("""
-CREATE TABLE IF NOT EXISTS job_runs (
-  job TEXT,
-  start_time TIMESTAMP,
-  end_time TIMESTAMP,
-  duration_seconds DOUBLE,
-  status TEXT
-);
-""")
-con.execute("""
-CREATE TABLE IF NOT EXISTS job_logs (
-  job TEXT,
-  run_date TIMESTAMP,
-  log TEXT
-);
-""")
-
-# load deps
-with open(deps_file) as f:
-    deps = json.load(f)
-rows = []
-for job, parents in deps.items():
-    for p in parents:
-        rows.append((job, p))
-df_deps = pd.DataFrame(rows, columns=['job','parent'])
-if not df_deps.empty:
-    con.register('df_deps', df_deps)
-    con.execute("INSERT INTO job_dependencies SELECT * FROM df_deps")
-
-# load runs.csv
-df_runs = pd.read_csv(runs_file, parse_dates=['start_time','end_time'])
-con.register('df_runs', df_runs)
-con.execute("INSERT INTO job_runs SELECT * FROM df_runs")
-
-# load logs (optional)
-if logs_dir and os.path.isdir(logs_dir):
-    log_rows=[]
-    for fname in os.listdir(logs_dir):
+# Usage: python3 ingest_to_duckdb.py <db_path> <deps.json|deps.csv|deps.parquet> <runs.csv|runs.parquet> [logs_dir]
+#
+# job_runs keeps eligible_time (when the job's conditions were met) next to
+# start/end so queueing can be told apart from run time; databases created
+# before that column existed are migrated in place.
+#
+# Re-running on the same inputs is a no-op: job_dependencies is keyed on
+# (job, parent) and job_runs on (job, start_time). Runs are upserted so a
+# re-exported run with a corrected end time/status replaces the old row.
+# Deps/run files are read by DuckDB's native CSV/Parquet readers, and each
+# invocation is one transaction recorded in ingest_batches.
+#
+# Logs (<job>_logs.txt from autosyslog) are streamed line by line and split
+# into runs at header lines carrying a timestamp. They land in
+# job_log_lines (job, run_date, line_no, line), stored sorted so DuckDB's
+# columnar compression collapses the repeated job/run_date values, and
+# known error signatures (ORA-nnnnn, timeouts, exceptions, ...) are
+# indexed in job_log_errors. Re-ingesting a run replaces its lines.
+# See search_logs.py for queries.
+
+import sys, re, json, duckdb, pandas as pd, os
+
+from parse_runs import parse_ts, TS_PATTERN
+
+RUN_COLUMNS = ['job', 'start_time', 'end_time', 'duration_seconds', 'status', 'eligible_time']
+
+SCHEMA = {
+    'job_dependencies': """
+        CREATE TABLE IF NOT EXISTS job_dependencies (
+          job TEXT NOT NULL,
+          parent TEXT NOT NULL,
+          PRIMARY KEY (job, parent)
+        )""",
+    'job_runs': """
+        CREATE TABLE IF NOT EXISTS job_runs (
+          job TEXT NOT NULL,
+          start_time TIMESTAMP NOT NULL,
+          end_time TIMESTAMP,
+          duration_seconds DOUBLE,
+          status TEXT,
+          eligible_time TIMESTAMP,
+          PRIMARY KEY (job, start_time)
+        )""",
+    'job_log_lines': """
+        CREATE TABLE IF NOT EXISTS job_log_lines (
+          job TEXT NOT NULL,
+          run_date TIMESTAMP,
+          line_no INTEGER NOT NULL,
+          line TEXT
+        )""",
+    'job_log_errors': """
+        CREATE TABLE IF NOT EXISTS job_log_errors (
+          job TEXT NOT NULL,
+          run_date TIMESTAMP,
+          line_no INTEGER NOT NULL,
+          category TEXT NOT NULL,
+          signature TEXT
+        )""",
+    # Derived by job_impact.py, one row per job as of ingest batch batch_id:
+    # average duration, earliest finish from the start of the graph, and the
+    # least slack towards any downstream SLA job (sla_job: the one binding it)
+    'job_impact': """
+        CREATE TABLE IF NOT EXISTS job_impact (
+          job TEXT PRIMARY KEY,
+          duration_seconds DOUBLE,
+          finish_seconds DOUBLE,
+          is_sla BOOLEAN,
+          slack_seconds DOUBLE,
+          sla_job TEXT,
+          batch_id INTEGER
+        )""",
+    # Settings the current job_impact was built with (one row); a rebuild
+    # on a new ingest batch reuses them. sla_jobs NULL: jobs without children
+    'job_impact_build': """
+        CREATE TABLE IF NOT EXISTS job_impact_build (
+          batch_id INTEGER,
+          built_at TIMESTAMP,
+          baseline_runs INTEGER,
+          sla_jobs TEXT[]
+        )""",
+    'ingest_batches': """
+        CREATE TABLE IF NOT EXISTS ingest_batches (
+          batch_id INTEGER PRIMARY KEY,
+          ingested_at TIMESTAMP,
+          deps_source TEXT,
+          runs_source TEXT,
+          deps_rows BIGINT,
+          runs_rows BIGINT
+        )""",
+}
+
+# Error categories indexed into job_log_errors: (category, pattern).
+# signature is the matched text, e.g. 'ORA-00060' for category 'ORA'.
+ERROR_SIGNATURES = [
+    ('ORA', r'ORA-\d{5}'),
+    ('timeout', r'(?i:tim(?:ed|e)[ _-]?out)'),
+    ('deadlock', r'(?i:deadlock)'),
+    ('out_of_memory', r'(?i:out ?of ?memory)|OutOfMemoryError'),
+    ('exception', r'\b[A-Z]\w*(?:Exception|Error)\b'),
+    ('killed', r'(?i:\bkilled\b|signal \d+)'),
+    ('exit_code', r'(?i:exit (?:code|status)[:= ]+[1-9]\d*)'),
+]
+_ERROR_RES = [(cat, re.compile(pat)) for cat, pat in ERROR_SIGNATURES]
+# One pass over every line; only lines it hits are tried per category
+_ANY_ERROR_RE = re.compile('|'.join(pat for _, pat in ERROR_SIGNATURES))
+
+# A log line that starts a new run: a banner (===, ---, ***, ###) or a
+# "run date / started at / job started" line, followed by a timestamp.
+RUN_HEADER_RE = re.compile(
+    r"^\s*(?:[=*#-]{3,}|.*\b(?:run date|started at|job started)\b).*?" + TS_PATTERN, re.IGNORECASE)
+
+LOG_CHUNK_ROWS = 100000
+
+# Columns added after a table was first shipped: table -> [(column, type)]
+_ADDED_COLUMNS = {
+    'job_runs': [('eligible_time', 'TIMESTAMP')],
+}
+
+# Tables created by earlier versions without keys: (key columns, keep-latest order)
+_KEYED = {
+    'job_dependencies': (['job', 'parent'], 'job'),
+    'job_runs': (['job', 'start_time'], 'end_time DESC NULLS LAST'),
+}
+
+
+def _has_primary_key(con, table):
+    return con.execute("""
+        SELECT count(*) FROM duckdb_constraints()
+        WHERE table_name = ? AND constraint_type = 'PRIMARY KEY'
+    """, [table]).fetchone()[0] > 0
+
+
+def ensure_schema(con):
+    """
+    Create tables; rebuild legacy un-keyed tables deduplicated on their key
+    and add columns introduced since the table was created.
+    """
+    for table, ddl in SCHEMA.items():
+        exists = con.execute(
+            "SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [table]
+        ).fetchone()[0]
+        if exists and table in _KEYED and not _has_primary_key(con, table):
+            keys, order = _KEYED[table]
+            key_list = ', '.join(keys)
+            con.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+            con.execute(ddl)
+            con.execute(f"""
+                INSERT INTO {table} BY NAME
+                SELECT * FROM {table}_legacy
+                WHERE {' AND '.join(k + ' IS NOT NULL' for k in keys)}
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY {key_list} ORDER BY {order}) = 1
+            """)
+            con.execute(f"DROP TABLE {table}_legacy")
+        else:
+            con.execute(ddl)
+        for column, type_ in _ADDED_COLUMNS.get(table, ()):
+            con.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {type_}")
+
+
+def _reader(path):
+    """DuckDB table function reading a CSV or Parquet file."""
+    if path.endswith('.parquet'):
+        return "read_parquet(?)"
+    return "read_csv(?, header = true, auto_detect = true)"
+
+
+def _columns(con, path):
+    return [r[0] for r in con.execute(f"DESCRIBE SELECT * FROM {_reader(path)}", [path]).fetchall()]
+
+
+def ingest_deps(con, deps_file):
+    """Insert new (job, parent) edges; returns the number of new rows."""
+    if deps_file.endswith('.json'):
+        with open(deps_file) as f:
+            deps = json.load(f)
+        df_deps = pd.DataFrame([(job, p) for job, parents in deps.items() for p in parents],
+                               columns=['job', 'parent'])
+        if df_deps.empty:
+            return 0
+        con.register('df_deps', df_deps)
+        source, params = "df_deps", []
+    else:
+        source, params = _reader(deps_file), [deps_file]
+
+    return con.execute(f"""
+        INSERT INTO job_dependencies
+        SELECT DISTINCT job, parent FROM {source}
+        WHERE job IS NOT NULL AND parent IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """, params).fetchone()[0]
+
+
+def ingest_runs(con, runs_file):
+    """Upsert runs on (job, start_time); returns rows inserted or changed."""
+    available = set(_columns(con, runs_file))
+    select = ', '.join(c if c in available else f"NULL AS {c}" for c in RUN_COLUMNS)
+    updates = ', '.join(f"{c} = excluded.{c}" for c in RUN_COLUMNS[2:])
+    changed = ' OR '.join(f"job_runs.{c} IS DISTINCT FROM excluded.{c}" for c in RUN_COLUMNS[2:])
+
+    return con.execute(f"""
+        INSERT INTO job_runs ({', '.join(RUN_COLUMNS)})
+        SELECT * FROM (
+            SELECT {select} FROM {_reader(runs_file)}
+            WHERE job IS NOT NULL AND start_time IS NOT NULL
+            QUALIFY ROW_NUMBER() OVER (
+                PARTITION BY job, start_time ORDER BY end_time DESC NULLS LAST) = 1
+        )
+        ON CONFLICT (job, start_time) DO UPDATE SET {updates} WHERE {changed}
+    """, [runs_file]).fetchone()[0]
+
+
+def record_batch(con, deps_source, runs_source, deps_rows, runs_rows):
+    """Append an ingest_batches row; returns its batch_id."""
+    batch_id = con.execute("SELECT coalesce(max(batch_id), 0) + 1 FROM ingest_batches").fetchone()[0]
+    con.execute("INSERT INTO ingest_batches VALUES (?, now()::TIMESTAMP, ?, ?, ?, ?)",
+                [batch_id, deps_source, runs_source, deps_rows, runs_rows])
+    return batch_id
+
+
+def iter_log_lines(path, header_re=RUN_HEADER_RE):
+    """
+    Stream (run_date, line_no, line) from one log file. line_no restarts
+    at every run header; lines before the first header get run_date None.
+    """
+    run_date = None
+    line_no = 0
+    with open(path, errors='replace') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            m = header_re.search(line)
+            if m:
+                ts = parse_ts(m.group(1))
+                if ts is not None:
+                    run_date = ts
+                    line_no = 0
+            line_no += 1
+            yield run_date, line_no, line
+
+
+def classify_line(line):
+    """(category, signature) for every error signature found in line."""
+    if not _ANY_ERROR_RE.search(line):
+        return []
+    hits = []
+    for cat, rx in _ERROR_RES:
+        m = rx.search(line)
+        if m:
+            hits.append((cat, m.group(0)))
+    return hits
+
+
+def ingest_logs(con, logs_dir):
+    """Stream every <job>_logs.txt into job_log_lines / job_log_errors; returns line count."""
+    con.execute("""
+        CREATE TEMP TABLE log_stage (job TEXT, run_date TIMESTAMP, line_no INTEGER, line TEXT)
+    """)
+    con.execute("""
+        CREATE TEMP TABLE error_stage (job TEXT, run_date TIMESTAMP, line_no INTEGER,
+                                       category TEXT, signature TEXT)
+    """)
+
+    total = 0
+    buf = []
+    errors = []
+
+    def flush():
+        chunk = pd.DataFrame(buf, columns=['job', 'run_date', 'line_no', 'line'])
+        con.register('log_chunk', chunk)
+        con.execute("INSERT INTO log_stage SELECT * FROM log_chunk")
+        con.unregister('log_chunk')
+        buf.clear()
+
+    for fname in sorted(os.listdir(logs_dir)):
         if not fname.endswith('.txt'): continue
         jobname = fname.replace('_logs.txt','')
-        with open(os.path.join(logs_dir,fname)) as f:
-            log_rows.append((jobname, None, f.read()))
-    if log_rows:
-        df_logs=pd.DataFrame(log_rows, columns=['job','run_date','log'])
-        con.register('df_logs', df_logs)
-        con.execute("INSERT INTO job_logs SELECT * FROM df_logs")
-
-print("Ingestion complete into", db)
-con.close()
+        for run_date, line_no, line in iter_log_lines(os.path.join(logs_dir, fname)):
+            buf.append((jobname, run_date, line_no, line))
+            for category, signature in classify_line(line):
+                errors.append((jobname, run_date, line_no, category, signature))
+            if len(buf) >= LOG_CHUNK_ROWS:
+                total += len(buf)
+                flush()
+    if buf:
+        total += len(buf)
+        flush()
+    if errors:
+        df_errors = pd.DataFrame(errors, columns=['job', 'run_date', 'line_no', 'category', 'signature'])
+        con.register('df_errors', df_errors)
+        con.execute("INSERT INTO error_stage SELECT * FROM df_errors")
+        con.unregister('df_errors')
+
+    # Replace whole runs that are being re-ingested
+    con.execute("CREATE TEMP TABLE log_runs AS SELECT DISTINCT job, run_date FROM log_stage")
+    for table in ('job_log_lines', 'job_log_errors'):
+        con.execute(f"""
+            DELETE FROM {table} USING log_runs s
+            WHERE {table}.job = s.job AND {table}.run_date IS NOT DISTINCT FROM s.run_date
+        """)
+
+    con.execute("""
+        INSERT INTO job_log_lines
+        SELECT job, run_date, line_no, line FROM log_stage ORDER BY job, run_date, line_no
+    """)
+    con.execute("""
+        INSERT INTO job_log_errors
+        SELECT * FROM error_stage ORDER BY job, run_date, line_no
+    """)
+    for table in ('log_stage', 'error_stage', 'log_runs'):
+        con.execute(f"DROP TABLE {table}")
+    return total
+
+
+def main(argv):
+    if len(argv) < 4:
+        print("Usage: python3 ingest_to_duckdb.py <db_path> <deps.json|csv|parquet> <runs.csv|parquet> [logs_dir]")
+        sys.exit(2)
+
+    db = argv[1]
+    deps_file = argv[2]
+    runs_file = argv[3]
+    logs_dir = argv[4] if len(argv) > 4 else None
+
+    con = duckdb.connect(db)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        ensure_schema(con)
+        deps_rows = ingest_deps(con, deps_file)
+        runs_rows = ingest_runs(con, runs_file)
+
+        # load logs (optional)
+        log_lines = 0
+        if logs_dir and os.path.isdir(logs_dir):
+            log_lines = ingest_logs(con, logs_dir)
+
+        batch_id = record_batch(con, os.path.abspath(deps_file), os.path.abspath(runs_file),
+                                deps_rows, runs_rows)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+    print(f"Ingestion complete into {db} (batch {batch_id}: "
+          f"{deps_rows} new dependencies, {runs_rows} runs inserted/updated, "
+          f"{log_lines} log lines)")
+    con.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# job_impact.py
+# Usage: python3 job_impact.py autosys_analysis.db <job> --delay 40m
+#        python3 job_impact.py autosys_analysis.db --build [--sla_jobs sla_jobs.txt] [--baseline_runs 10]
+#
+# "What does a 40-minute delay in job X break?" across every flow, not one
+# root_job. --build precomputes job_impact, one row per job: its average
+# duration over the last --baseline_runs runs, its earliest finish, and its
+# least slack towards any SLA job downstream (by default every job without
+# children) with the SLA job that binds it. Every SLA job is due at its own
+# critical-path finish. It takes one forward and one reverse topological
+# pass over the whole graph (dag_graph.sla_slack), so both time and table
+# size grow with jobs + edges, not with (job, SLA job) pairs.
+#
+# A lookup walks only the job's descendants (dag_graph.downstream_slack)
+# to get its slack towards each downstream SLA job. It opens the database
+# read-only; only a build writes. The table records the ingest batch it was
+# built from; a lookup on a stale or missing table rebuilds it first, with
+# the SLA jobs and --baseline_runs of the last --build (kept in
+# job_impact_build) unless given again. If the database cannot be opened
+# for writing, a stale table is used as is.
+
+import duckdb, pandas as pd, numpy as np, sys, re, argparse
+
+from dag_graph import downstream_slack, graph_cache_path, load_graph, sla_slack
+from ingest_to_duckdb import SCHEMA, ensure_schema
+
+_DELAY_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$", re.IGNORECASE)
+_UNIT_SECONDS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_delay(text):
+    """'40m' / '1.5h' / '90' (seconds) -> seconds."""
+    m = _DELAY_RE.match(text)
+    if not m:
+        raise ValueError(f"Bad delay {text!r}; use e.g. 90, 40m, 1.5h")
+    return float(m.group(1)) * _UNIT_SECONDS[m.group(2).lower()]
+
+
+def current_batch(con):
+    return con.execute("SELECT coalesce(max(batch_id), 0) FROM ingest_batches").fetchone()[0]
+
+
+def build_impact(con, sla_jobs=None, baseline_runs=10, cache_path=None):
+    """Recompute job_impact from job_dependencies / job_runs; returns row count."""
+    ensure_schema(con)
+    graph = load_graph(con, cache_path)
+    durations = dict(con.execute("""
+        SELECT job, avg(duration_seconds) FROM (
+            SELECT job, duration_seconds FROM job_runs
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY job ORDER BY start_time DESC) <= ?
+        ) GROUP BY job
+    """, [baseline_runs]).fetchall())
+
+    dur, finish, is_sla, slack, sla_id = sla_slack(graph, durations, sla_jobs)
+    names = pd.Series(graph.names)
+    impact = pd.DataFrame({
+        'job': names,
+        'duration_seconds': dur,
+        'finish_seconds': finish,
+        'is_sla': is_sla,
+        'slack_seconds': slack,
+        'sla_job': names.reindex(sla_id).to_numpy(),
+    })
+    batch_id = current_batch(con)
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.register('impact_df', impact)
+        # Derived table: recreated, so a layout from an older version goes too
+        con.execute("DROP TABLE IF EXISTS job_impact")
+        con.execute(SCHEMA['job_impact'])
+        con.execute("""
+            INSERT INTO job_impact
+            SELECT job, duration_seconds, finish_seconds, is_sla, slack_seconds, sla_job, ?
+            FROM impact_df
+        """, [batch_id])
+        con.execute("DELETE FROM job_impact_build")
+        con.execute("INSERT INTO job_impact_build VALUES (?, now(), ?, ?)",
+                    [batch_id, baseline_runs, list(sla_jobs) if sla_jobs is not None else None])
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return len(impact)
+
+
+def impact_of(con, job, delay_seconds=0.0, cache_path=None):
+    """
+    SLA jobs downstream of `job`, least slack first, with how late each
+    would be after `delay_seconds` (late_by <= 0: absorbed by slack).
+    Reads job_impact and the graph only; raises ValueError on a cycle.
+    """
+    graph = load_graph(con, cache_path)
+    if job not in graph:
+        return pd.DataFrame(columns=['sla_job', 'slack_seconds', 'late_by_seconds'])
+    desc = pd.DataFrame({'job': [graph.names[i] for i in graph.descendant_ids(job)]})
+    con.register('impact_jobs', desc)
+    rows = con.execute("""
+        SELECT i.job, i.duration_seconds, i.finish_seconds, i.is_sla
+        FROM job_impact i
+        JOIN impact_jobs d ON d.job = i.job
+    """).df()
+    ids = rows['job'].map(graph.index).to_numpy()
+    dur, finish = np.zeros(len(graph)), np.zeros(len(graph))
+    is_sla = np.zeros(len(graph), dtype=bool)
+    dur[ids] = rows['duration_seconds'].fillna(0).to_numpy()
+    finish[ids] = rows['finish_seconds'].fillna(0).to_numpy()
+    is_sla[ids] = rows['is_sla'].fillna(False).to_numpy(dtype=bool)
+
+    sla_ids, slack = downstream_slack(graph, job, dur, finish, is_sla)
+    df = pd.DataFrame({
+        'sla_job': [graph.names[i] for i in sla_ids],
+        'slack_seconds': slack,
+        'late_by_seconds': delay_seconds - slack,
+    })
+    return df.sort_values(['slack_seconds', 'sla_job'], ignore_index=True)
+
+
+def build_settings(con):
+    """(sla_jobs, baseline_runs) of the last build, or (None, None) if never built."""
+    if not _has_table(con, 'job_impact_build'):
+        return None, None
+    row = con.execute("SELECT sla_jobs, baseline_runs FROM job_impact_build").fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+
+def _has_table(con, name):
+    return con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [name]
+    ).fetchone()[0] > 0
+
+
+def impact_is_stale(con):
+    if not _has_table(con, 'job_impact') or not _has_table(con, 'ingest_batches'):
+        return True
+    built = con.execute("SELECT max(batch_id), count(*) FROM job_impact").fetchone()
+    return built[1] == 0 or built[0] != current_batch(con)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('db')
+    parser.add_argument('job', nargs='?')
+    parser.add_argument('--delay', default='0', help='delay of job, e.g. 90, 40m, 1.5h')
+    parser.add_argument('--build', action='store_true', help='rebuild job_impact')
+    parser.add_argument('--sla_jobs', help='file with one SLA job per line (default: jobs without children)')
+    parser.add_argument('--baseline_runs', type=int,
+                        help='runs averaged per job (default: as last built, else 10)')
+    parser.add_argument('--all', action='store_true', help='also list SLA jobs the delay does not hit')
+    args = parser.parse_args()
+
+    if not args.build and not args.job:
+        parser.error('give a job to look up, or --build')
+
+    # Only a build writes (and creates the schema); lookups read
+    con = duckdb.connect(args.db, read_only=not args.build)
+    rebuild = args.build or impact_is_stale(con)
+    settings = (None, None) if args.build else build_settings(con)
+    if rebuild and not args.build:
+        con.close()
+        try:
+            con = duckdb.connect(args.db)
+        except duckdb.Error as e:
+            con = duckdb.connect(args.db, read_only=True)
+            if not _has_table(con, 'job_impact'):
+                print(f"job_impact is missing and cannot be built: {e}")
+                sys.exit(1)
+            print(f"[!] job_impact is stale and cannot be rebuilt ({e}); using it as is",
+                  file=sys.stderr)
+            rebuild = False
+
+    try:
+        if rebuild:
+            # An automatic rebuild keeps the settings of the last build
+            sla_jobs, baseline_runs = settings
+            if args.sla_jobs:
+                with open(args.sla_jobs) as f:
+                    sla_jobs = [line.strip() for line in f if line.strip()]
+            if args.baseline_runs is not None:
+                baseline_runs = args.baseline_runs
+            n = build_impact(con, sla_jobs, baseline_runs or 10, graph_cache_path(args.db))
+            print(f"job_impact rebuilt: {n} jobs", file=sys.stderr)
+        if not args.job:
+            sys.exit(0)
+
+        delay = parse_delay(args.delay)
+        df = impact_of(con, args.job, delay, graph_cache_path(args.db))
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    if df.empty:
+        print(f"{args.job}: no downstream SLA jobs (or unknown job).")
+        sys.exit(0)
+    hit = df[df['late_by_seconds'] > 0]
+    print(f"{args.job} late by {delay:.0f}s reaches {len(df)} SLA jobs; {len(hit)} would finish late:")
+    for r in (df if args.all else hit).itertuples(index=False):
+        print(f"{r.sla_job:40} slack {r.slack_seconds:10.1f}s  late by {max(r.late_by_seconds, 0):10.1f}s")
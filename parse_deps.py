@@ -1,46 +1,244 @@
 #!/usr/bin/env python3
 # parse_deps.py
-# Usage: python3 parse_deps.py <export_dir> <root_job> > deps.json
+# Usage: python3 parse_deps.py <export_dir> <root_job> [--concurrency 16]
+#            [--cache_dir .autorep_cache] [--cache_ttl 86400] > deps.json
+#        python3 parse_deps.py --jil all_jobs.jil [root_job] [--db autosys.db] > deps.json
+#
+# Crawl mode walks the dependency DAG upstream of root_job level by level.
+# Job definitions come from <export_dir>/<job>_def.txt when present,
+# otherwise from `autorep -j JOB -q`, run concurrently (bounded by
+# --concurrency) and cached on disk per job for --cache_ttl seconds.
+# A lookup that fails (autorep missing or exiting non-zero) is not cached;
+# the job is left out of the output, listed on stderr, and the exit status
+# is 1.
+#
+# JIL mode parses one full dump (`autorep -J ALL -q > all_jobs.jil`) in a
+# single streaming pass into an adjacency index of every job, then prints
+# root_job's ancestor DAG (or the whole index without root_job). --db
+# replaces the job_dependencies table with the full index for reuse.
 
-import re, sys, json, os
-from collections import defaultdict, deque
+import re, sys, json, os, time, argparse, asyncio
 
-export_dir = sys.argv[1]
-root_job = sys.argv[2]
+from dag_graph import ancestors
+
+parser = argparse.ArgumentParser()
+parser.add_argument('args', nargs='*', metavar='export_dir root_job | root_job',
+                    help='crawl mode: <export_dir> <root_job>; --jil mode: [root_job]')
+parser.add_argument('--jil', help='full JIL dump to index instead of crawling')
+parser.add_argument('--db', help='--jil mode: write the index into this DuckDB job_dependencies')
+parser.add_argument('--concurrency', type=int, default=16,
+                    help='max autorep processes running at once')
+parser.add_argument('--cache_dir', default='.autorep_cache',
+                    help='per-job definition cache ("" disables caching)')
+parser.add_argument('--cache_ttl', type=float, default=86400,
+                    help='seconds before a cached definition is refetched')
+
+
+# Upstream jobs in a condition: s(jobX), f(jobX), d(jobX), ... and their
+# long forms; a look-back such as s(jobX, 03.00) yields just jobX.
+# notrunning()/n() is not a predecessor and is skipped.
+_PARENT_RE = re.compile(
+    r"\b(?:s|f|d|t|e|success|failure|done|terminated|exitcode)\(\s*([^,)\s]+)")
+_INSERT_RE = re.compile(r"^\s*insert_job:\s*(\S+)")
+_COND_RE = re.compile(r"^\s*condition:\s*(.*)")
 
-# helper to read a job's def file (or run autorep directly if not found)
-def read_def(job):
-    path_guess = os.path.join(export_dir, f"{job}_def.txt")
-    if os.path.exists(path_guess):
-        return open(path_guess).read()
-    # fallback: autorep -j job -q (requires CLI access)
-    try:
-        import subprocess
-        out = subprocess.check_output(["autorep", "-j", job, "-q"], stderr=subprocess.STDOUT, text=True)
-        return out
-    except Exception as e:
-        return ""
 
 def extract_parents_from_text(text):
-    parents = re.findall(r"s\(([^)]+)\)", text)  # s(jobX)
-    parents += re.findall(r"f\(([^)]+)\)", text) # f(jobX) may be used for finished/other conds
-    parents = [p.strip() for p in parents if p.strip()]
+    parents = []
+    for p in _PARENT_RE.findall(text):
+        if p not in parents:
+            parents.append(p)
+    return parents
+
+
+def extract_parents_from_def(text):
+    """
+    Parents named in the condition: lines of one job definition.
+
+    Other attributes (box_success:, box_failure:, description:, ...) can
+    hold the same s(jobX) syntax but are not dependencies of the job.
+    """
+    parents = []
+    for line in text.splitlines():
+        m = _COND_RE.match(line)
+        if m:
+            for p in extract_parents_from_text(m.group(1)):
+                if p not in parents:
+                    parents.append(p)
+    return parents
+
+
+def parse_jil_dump(path):
+    """
+    Stream a full JIL dump once and return {job: [parents]} for every
+    insert_job block (jobs without a condition map to []).
+    """
+    index = {}
+    job = None
+    with open(path, errors='replace') as f:
+        for line in f:
+            m = _INSERT_RE.match(line)
+            if m:
+                job = m.group(1)
+                index.setdefault(job, [])
+                continue
+            if job is None:
+                continue
+            m = _COND_RE.match(line)
+            if m:
+                for p in extract_parents_from_text(m.group(1)):
+                    if p not in index[job]:
+                        index[job].append(p)
+    return index
+
+
+def subgraph_for(index, root_job):
+    """root_job's ancestor DAG from the full index, upstream-first BFS order."""
+    keep = ancestors(index, root_job)
+    graph = {}
+    level = [root_job]
+    while level:
+        nxt = []
+        for job in level:
+            if job in graph:
+                continue
+            graph[job] = list(index.get(job, []))
+            nxt.extend(p for p in graph[job] if p in keep and p not in graph)
+        level = nxt
+    return graph
+
+
+def save_index(db, index, source):
+    """Replace job_dependencies with the full index and record the batch."""
+    import duckdb, pandas as pd
+    from ingest_to_duckdb import ensure_schema, record_batch
+    edges = pd.DataFrame([(j, p) for j, ps in index.items() for p in ps],
+                         columns=['job', 'parent'])
+    con = duckdb.connect(db)
+    con.execute("BEGIN TRANSACTION")
+    ensure_schema(con)
+    con.register('edges', edges)
+    con.execute("DELETE FROM job_dependencies")
+    con.execute("INSERT INTO job_dependencies SELECT DISTINCT job, parent FROM edges")
+    record_batch(con, os.path.abspath(source), None, len(edges), 0)
+    con.execute("COMMIT")
+    con.close()
+
+
+# ── definition cache: one JSON file per job ───────────────────────────────
+def _cache_path(cache_dir, job):
+    return os.path.join(cache_dir, job.replace(os.sep, '_') + '.json')
+
+def cache_get(cache_dir, job, ttl):
+    if not cache_dir:
+        return None
+    try:
+        with open(_cache_path(cache_dir, job)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get('fetched_at', 0) > ttl:
+        return None
+    return entry.get('parents')
+
+def cache_put(cache_dir, job, parents):
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = _cache_path(cache_dir, job) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'job': job, 'fetched_at': time.time(), 'parents': parents}, f)
+    os.replace(tmp, _cache_path(cache_dir, job))
+
+
+# ── definition lookup ─────────────────────────────────────────────────────
+async def autorep_def(job, sem):
+    """
+    Run `autorep -j JOB -q` (requires CLI access); returns its output, or
+    None when autorep is missing or exits non-zero.
+    """
+    async with sem:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "autorep", "-j", job, "-q",
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        except OSError as e:
+            print(f"[!] {job}: {e}", file=sys.stderr)
+            return None
+        out, err = await proc.communicate()
+    if proc.returncode != 0:
+        msg = err.decode(errors="replace").strip() or out.decode(errors="replace").strip()
+        print(f"[!] {job}: autorep exit {proc.returncode}: {msg[:200]}", file=sys.stderr)
+        return None
+    return out.decode(errors="replace")
+
+async def lookup_parents(job, opts, sem):
+    """Parents of job, or None when its definition could not be fetched."""
+    # exported def file wins; it is already local and needs no cache
+    path_guess = os.path.join(opts.export_dir, f"{job}_def.txt")
+    if os.path.exists(path_guess):
+        with open(path_guess) as f:
+            return extract_parents_from_def(f.read())
+
+    parents = cache_get(opts.cache_dir, job, opts.cache_ttl)
+    if parents is not None:
+        return parents
+
+    text = await autorep_def(job, sem)
+    if text is None:
+        return None
+    parents = extract_parents_from_def(text)
+    cache_put(opts.cache_dir, job, parents)
     return parents
 
-# BFS to collect DAG around root_job
-graph = defaultdict(list)
-seen = set()
-q = deque([root_job])
-while q:
-    job = q.popleft()
-    if job in seen:
-        continue
-    seen.add(job)
-    text = read_def(job)
-    parents = extract_parents_from_text(text)
-    graph[job] = parents
-    for p in parents:
-        if p not in seen:
-            q.append(p)
-
-print(json.dumps(graph, indent=2))
+
+async def crawl(root_job, opts):
+    """
+    Level-by-level walk upstream of root_job; returns ({job: [parents]},
+    failed) where failed lists the jobs whose definition could not be
+    fetched. Those are left out of the graph rather than shown as roots.
+    """
+    sem = asyncio.Semaphore(max(1, opts.concurrency))
+    graph = {}
+    failed = []
+    level = [root_job]
+    while level:
+        results = await asyncio.gather(*(lookup_parents(j, opts, sem) for j in level))
+        nxt = []
+        queued = set()
+        for job, parents in zip(level, results):
+            if parents is None:
+                failed.append(job)
+            else:
+                graph[job] = parents
+        for parents in results:
+            for p in parents or ():
+                if p not in graph and p not in queued and p not in failed:
+                    queued.add(p)
+                    nxt.append(p)
+        level = nxt
+    return graph, failed
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    if args.jil:
+        if len(args.args) > 1:
+            parser.error('--jil takes at most one positional argument: root_job')
+        index = parse_jil_dump(args.jil)
+        if args.db:
+            save_index(args.db, index, args.jil)
+        graph = subgraph_for(index, args.args[0]) if args.args else index
+    else:
+        if len(args.args) != 2:
+            parser.error('crawl mode needs <export_dir> <root_job>')
+        args.export_dir, root_job = args.args
+        graph, failed = asyncio.run(crawl(root_job, args))
+        if failed:
+            print(f"[!] Definition lookup failed for {len(failed)} jobs: {' '.join(failed[:20])}"
+                  f"{' ...' if len(failed) > 20 else ''}", file=sys.stderr)
+
+    print(json.dumps(graph, indent=2))
+    if not args.jil and failed:
+        sys.exit(1)
@@ -1,59 +1,166 @@
 #!/usr/bin/env python3
 # parse_runs.py
 # Usage: python3 parse_runs.py <export_dir> <job> > runs.csv
+#        python3 parse_runs.py <runs_export_dir> [--out runs.parquet] [--workers N]
+#
+# Single-job mode reads <export_dir>/<job>_detailed.txt and prints CSV.
+# Directory mode parses every <job>_runs.txt / <job>_detailed.txt in the
+# directory in a process pool and writes one Parquet table (or CSV when
+# --out ends in .csv) ready for ingest_to_duckdb.py.
+#
+# Each file is read once, line by line. Fields are picked up from either
+#   "Start Time: ...  End Time: ...  Exit Status: SU  Eligible Time: ..."
+# or event lines
+#   "Event: RUNNING    Event Time: 2025-11-20 12:34:56"
+# and a run is closed whenever a field that is already filled shows up
+# again, so field order within a run does not matter.
 
-import sys, re, os, pandas as pd
+import sys, re, os, argparse
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
-export_dir = sys.argv[1]
-job = sys.argv[2]
-fpath = os.path.join(export_dir, f"{job}_detailed.txt")
-text = open(fpath).read()
-
-# autorep -d output is multiline per run. We'll find blocks with RUNID or "Event" lines.
-runs = []
-current = {}
-for line in text.splitlines():
-    line = line.strip()
-    if not line:
-        continue
-    # Try patterns: "Event: STARTED    Event Time: 2025-11-20 12:34:56"
-    m_evt = re.search(r"Event:\s*(\w+).*Event Time:\s*([0-9-]+ [0-9:]+)", line)
-    if m_evt:
-        evt = m_evt.group(1)
-        tm = m_evt.group(2)
-        # store by run occurrence grouping based on presence of RUNID or multiline - crude but practical
-        runs.append((evt, tm))
-# Fallback: attempt to parse lines with "Start Time" / "End Time" etc.
-# More robust parsing:
-pattern = re.compile(r"Start Time:\s*([0-9- :]+).*End Time:\s*([0-9- :]+).*Exit Status:\s*(\w+)", re.IGNORECASE)
-# If pattern fails, try simpler scanning
-if not pattern.search(text):
-    # parse using common fields
-    start_times = re.findall(r"Start Time:\s*([0-9- :]+)", text)
-    end_times = re.findall(r"End Time:\s*([0-9- :]+)", text)
-    statuses  = re.findall(r"Exit Status:\s*(\w+)", text)
-    for i in range(min(len(start_times), len(end_times))):
-        st = start_times[i]; et = end_times[i]
+import pandas as pd
+
+COLUMNS = ['job', 'start_time', 'end_time', 'duration_seconds', 'status', 'eligible_time']
+
+TS_PATTERN = r"(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}|\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})"
+_FIELD_RES = [
+    ('start_time', re.compile(r"Start Time:\s*" + TS_PATTERN, re.IGNORECASE)),
+    ('end_time', re.compile(r"End Time:\s*" + TS_PATTERN, re.IGNORECASE)),
+    ('eligible_time', re.compile(r"Eligible Time:\s*" + TS_PATTERN, re.IGNORECASE)),
+    ('status', re.compile(r"(?:Exit )?Status:\s*(\w+)", re.IGNORECASE)),
+]
+_EVENT_RE = re.compile(r"Event:\s*(\w+).*Event Time:\s*" + TS_PATTERN, re.IGNORECASE)
+
+# Event name -> field it sets (end events also set status)
+_EVENT_FIELDS = {
+    'STARTING': 'eligible_time',
+    'RUNNING': 'start_time',
+    'SUCCESS': 'end_time',
+    'FAILURE': 'end_time',
+    'TERMINATED': 'end_time',
+}
+_TS_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%m/%d/%Y %H:%M:%S")
+
+
+def parse_ts(text):
+    for fmt in _TS_FORMATS:
         try:
-            sdt = datetime.strptime(st.strip(), "%Y-%m-%d %H:%M:%S")
-            edt = datetime.strptime(et.strip(), "%Y-%m-%d %H:%M:%S")
-            runs.append(("RUN", sdt.isoformat(), edt.isoformat()))
-        except:
+            return datetime.strptime(text, fmt)
+        except ValueError:
             pass
-# Build dataframe
-rows = []
-for r in runs:
-    if len(r) == 3:
-        _, s, e = r
-        rows.append({"job": job, "start_time": s, "end_time": e})
-# If no structured runs found, warn and exit.
-if not rows:
-    print(f"# No runs parsed from {fpath}. Please verify autorep -d output format.", file=sys.stderr)
-    sys.exit(1)
-
-df = pd.DataFrame(rows)
-df['start_time'] = pd.to_datetime(df['start_time'])
-df['end_time']   = pd.to_datetime(df['end_time'])
-df['duration_seconds'] = (df['end_time'] - df['start_time']).dt.total_seconds()
-df.to_csv(sys.stdout, index=False)
+    return None
+
+
+def parse_lines(lines, job):
+    """Single-pass state machine over autorep -d lines; returns row tuples (COLUMNS order)."""
+    rows = []
+    cur = {}
+
+    def flush():
+        s, e = cur.get('start_time'), cur.get('end_time')
+        if s is not None and e is not None:
+            rows.append((job, s, e, (e - s).total_seconds(),
+                         cur.get('status'), cur.get('eligible_time')))
+        cur.clear()
+
+    def put(field, value):
+        if field in cur:
+            flush()
+        cur[field] = value
+
+    for line in lines:
+        if ':' not in line:
+            continue
+        m = _EVENT_RE.search(line)
+        if m:
+            evt = m.group(1).upper()
+            field = _EVENT_FIELDS.get(evt)
+            tm = parse_ts(m.group(2))
+            if field and tm is not None:
+                put(field, tm)
+                if field == 'end_time':
+                    cur['status'] = evt
+            continue
+        for field, rx in _FIELD_RES:
+            m = rx.search(line)
+            if not m:
+                continue
+            value = m.group(1) if field == 'status' else parse_ts(m.group(1))
+            if value is not None:
+                put(field, value)
+    flush()
+    return rows
+
+
+def parse_file(path, job):
+    with open(path, errors='replace') as f:
+        return parse_lines(f, job)
+
+
+def _job_from_filename(fname):
+    for suffix in ('_detailed.txt', '_runs.txt'):
+        if fname.endswith(suffix):
+            return fname[:-len(suffix)]
+    return None
+
+
+def _parse_one(item):
+    path, job = item
+    return parse_file(path, job)
+
+
+def parse_dir(export_dir, workers=None):
+    """Parse every run export in export_dir in parallel; returns a DataFrame."""
+    items = []
+    for fname in sorted(os.listdir(export_dir)):
+        job = _job_from_filename(fname)
+        if job:
+            items.append((os.path.join(export_dir, fname), job))
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for file_rows in ex.map(_parse_one, items, chunksize=16):
+            rows.extend(file_rows)
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def write_table(df, out):
+    if out.endswith('.csv'):
+        df.to_csv(out, index=False)
+        return
+    import pyarrow as pa, pyarrow.parquet as pq
+    schema = pa.schema([
+        ('job', pa.string()),
+        ('start_time', pa.timestamp('us')),
+        ('end_time', pa.timestamp('us')),
+        ('duration_seconds', pa.float64()),
+        ('status', pa.string()),
+        ('eligible_time', pa.timestamp('us')),
+    ])
+    pq.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False), out)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('export_dir')
+    parser.add_argument('job', nargs='?')
+    parser.add_argument('--out', help='directory mode output (default <export_dir>/runs.parquet)')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.job is None:
+        df = parse_dir(args.export_dir, args.workers)
+        out = args.out or os.path.join(args.export_dir, 'runs.parquet')
+        write_table(df, out)
+        print(f"{len(df)} runs from {df['job'].nunique()} jobs written to {out}", file=sys.stderr)
+        sys.exit(0)
+
+    fpath = os.path.join(args.export_dir, f"{args.job}_detailed.txt")
+    rows = parse_file(fpath, args.job)
+    # If no structured runs found, warn and exit.
+    if not rows:
+        print(f"# No runs parsed from {fpath}. Please verify autorep -d output format.", file=sys.stderr)
+        sys.exit(1)
+
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(sys.stdout, index=False)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# search_logs.py
+# Usage: python3 search_logs.py autosys_analysis.db <pattern> [--since 2025-11-20] [--hours 24] [--lines]
+#
+# Which jobs logged <pattern> recently? A pattern naming an error category
+# (ORA, timeout, deadlock, ...) or an ORA- code is answered from the
+# job_log_errors index; anything else falls back to a case-insensitive
+# substring scan of job_log_lines restricted to the requested run dates.
+
+import duckdb, argparse, re
+from datetime import datetime, timedelta
+
+from ingest_to_duckdb import ERROR_SIGNATURES
+
+parser = argparse.ArgumentParser()
+parser.add_argument('db')
+parser.add_argument('pattern', help="category (ORA, timeout, ...), ORA code (ORA-00060) or text")
+parser.add_argument('--since', help='earliest run_date (default: now - --hours)')
+parser.add_argument('--hours', type=float, default=24)
+parser.add_argument('--lines', action='store_true', help='print matching lines, not just a per-job summary')
+args = parser.parse_args()
+
+since = datetime.fromisoformat(args.since) if args.since else datetime.now() - timedelta(hours=args.hours)
+categories = {c.lower(): c for c, _ in ERROR_SIGNATURES}
+pat = args.pattern.rstrip('-')
+
+con = duckdb.connect(args.db, read_only=True)
+
+if pat.lower() in categories:
+    where, params = "e.category = ?", [categories[pat.lower()]]
+elif re.fullmatch(r'ORA-?\d*', pat, re.I):
+    code = re.sub(r'(?i)^ORA-?', '', pat)
+    where, params = "e.category = 'ORA' AND e.signature LIKE ?", ['ORA-' + code + '%']
+else:
+    where, params = None, None
+
+if where is not None:
+    if args.lines:
+        sql = f"""
+            SELECT e.job, e.run_date, e.line_no, l.line
+            FROM job_log_errors e
+            JOIN job_log_lines l
+              ON l.job = e.job AND l.run_date = e.run_date AND l.line_no = e.line_no
+            WHERE {where} AND e.run_date >= ?
+            ORDER BY e.run_date DESC, e.job, e.line_no"""
+    else:
+        sql = f"""
+            SELECT e.job, max(e.run_date) AS last_run, count(*) AS hits,
+                   string_agg(DISTINCT e.signature, ', ') AS signatures
+            FROM job_log_errors e
+            WHERE {where} AND e.run_date >= ?
+            GROUP BY e.job ORDER BY hits DESC"""
+    df = con.execute(sql, params + [since]).df()
+else:
+    if args.lines:
+        sql = """
+            SELECT job, run_date, line_no, line FROM job_log_lines
+            WHERE run_date >= ? AND line ILIKE ?
+            ORDER BY run_date DESC, job, line_no"""
+    else:
+        sql = """
+            SELECT job, max(run_date) AS last_run, count(*) AS hits FROM job_log_lines
+            WHERE run_date >= ? AND line ILIKE ?
+            GROUP BY job ORDER BY hits DESC"""
+    df = con.execute(sql, [since, f"%{args.pattern}%"]).df()
+
+if df.empty:
+    print(f"No jobs logged '{args.pattern}' since {since:%Y-%m-%d %H:%M}.")
+else:
+    print(df.to_string(index=False))
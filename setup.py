@@ -8,9 +8,13 @@ setup(
         "pandas>=1.3",
         "numpy",
         "matplotlib",
-        "scikit-learn",
         "jinja2",
-        "pyodbc",
     ],
+    extras_require={
+        "sybase": ["pyodbc"],
+        "autosys": ["duckdb", "pyarrow"],
+        "numba": ["numba"],
+        "polars": ["polars>=1.21", "pyarrow"],
+    },
     python_requires=">=3.7",
 )
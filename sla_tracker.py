@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# sla_tracker.py
+# Usage: python3 sla_tracker.py autosys_analysis.db <root_job> --sla "2025-11-21 06:00" --events events.log [--interval 5]
+#        python3 sla_tracker.py autosys_analysis.db <root_job> --sla "2025-11-21 06:00" [--interval 5]
+#          (poll mode: completed runs only, see below)
+#
+# Live projected finish for <root_job> during the batch window.
+#
+# The DAG is loaded once into CSR arrays (positions in topological order)
+# with each job's expected duration = average of its last --baseline_runs
+# runs. Each job's projected finish is
+#   finished: actual end
+#   running:  max(start + expected, latest event or clock tick)
+#   waiting:  max(projected finish of its parents, --start, clock) + expected
+# An event only changes one job, so only its descendants are re-propagated,
+# in topological order, stopping wherever a projected finish is unchanged.
+# While waiting for new events (--interval > 0) the clock still advances:
+# every unfinished job is re-projected on each tick, so running jobs that
+# overrun their expected duration push their descendants out, and a job that
+# has not started yet is never projected to start in the past.
+#
+# Events come from --events (tailed like `tail -f`, one event per line:
+#   "<YYYY-MM-DD HH:MM:SS> <job> <STARTING|RUNNING|SUCCESS|FAILURE|TERMINATED>")
+# or, without --events, from polling job_runs every --interval seconds as a
+# stand-in for autorep. Each poll opens its own short read-only connection so
+# ingest_to_duckdb can write between polls. job_runs only holds completed
+# runs, so in poll mode a job's RUNNING event arrives together with its end:
+# running jobs are projected as waiting ones and overruns are not seen until
+# the job finishes. Use --events for live in-progress tracking.
+
+import duckdb, pandas as pd, numpy as np, sys, re, time, heapq, argparse
+from datetime import datetime
+
+from dag_graph import ancestors, csr_adjacency, graph_cache_path, load_graph, topo_order
+from parse_runs import parse_ts, TS_PATTERN
+
+EVENT_LINE_RE = re.compile(r"^\s*" + TS_PATTERN + r"\s+(\S+)\s+(\w+)")
+END_EVENTS = ('SUCCESS', 'FAILURE', 'TERMINATED')
+
+
+class Tracker:
+    """Projected finish times (epoch seconds) for every ancestor of root."""
+
+    def __init__(self, order, parents, expected, batch_start):
+        self.order = order
+        self.pos = {n: i for i, n in enumerate(order)}
+        self.parent_ptr, self.parent_idx, self.child_ptr, self.child_idx = \
+            csr_adjacency(order, parents)
+        self.expected = np.asarray(expected, dtype=float)
+        self.batch_start = batch_start
+        n = len(order)
+        self.start = np.full(n, np.nan)
+        self.end = np.full(n, np.nan)
+        self.finish = np.empty(n)
+        self.now = batch_start
+        for i in range(n):
+            self.finish[i] = self._project(i)
+
+    def _project(self, i):
+        if not np.isnan(self.end[i]):
+            return self.end[i]
+        if not np.isnan(self.start[i]):
+            return max(self.start[i] + self.expected[i], self.now)
+        ps = self.parent_idx[self.parent_ptr[i]:self.parent_ptr[i + 1]]
+        ready = max(self.finish[ps].max(), self.batch_start) if len(ps) else self.batch_start
+        return max(ready, self.now) + self.expected[i]
+
+    def update(self, job, event, ts):
+        """Apply one event; returns the number of jobs whose projection changed."""
+        i = self.pos.get(job)
+        if i is None:
+            return 0
+        self.now = max(self.now, ts)
+        if event == 'RUNNING':
+            self.start[i] = ts
+            self.end[i] = np.nan
+        elif event in END_EVENTS:
+            if np.isnan(self.start[i]):
+                self.start[i] = ts - self.expected[i]
+            self.end[i] = ts
+        else:
+            return 0
+
+        # Re-propagate descendants in topological order (positions are topo ranks)
+        changed = 0
+        heap = [i]
+        queued = {i}
+        while heap:
+            j = heapq.heappop(heap)
+            new = self._project(j)
+            if new == self.finish[j]:
+                continue
+            changed += 1
+            self.finish[j] = new
+            for c in self.child_idx[self.child_ptr[j]:self.child_ptr[j + 1]].tolist():
+                if c not in queued:
+                    queued.add(c)
+                    heapq.heappush(heap, c)
+        return changed
+
+    def advance(self, now):
+        """Move the clock to `now` and re-project every unfinished job; returns the count changed."""
+        if now <= self.now:
+            return 0
+        self.now = now
+        changed = 0
+        for i in np.flatnonzero(np.isnan(self.end)).tolist():
+            new = self._project(i)
+            if new != self.finish[i]:
+                self.finish[i] = new
+                changed += 1
+        return changed
+
+
+def fmt(epoch):
+    return datetime.fromtimestamp(epoch).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def tail_events(path, interval):
+    """
+    Yield (job, event, epoch) from an event file, waiting for new lines;
+    yields (None, 'TICK', now) after each wait.
+    """
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if not line:
+                if interval <= 0:
+                    return
+                time.sleep(interval)
+                yield None, 'TICK', time.time()
+                continue
+            m = EVENT_LINE_RE.match(line)
+            if not m:
+                continue
+            ts = parse_ts(m.group(1))
+            if ts is not None:
+                yield m.group(2), m.group(3).upper(), ts.timestamp()
+
+
+def poll_events(db, jobs, since, interval):
+    """
+    Yield RUNNING / end events for runs in job_runs that appeared since
+    `since`, then (None, 'TICK', now) after each wait between polls.
+    """
+    tracked = pd.DataFrame({'job': jobs})
+    seen = pd.Timestamp(since)
+    while True:
+        con = duckdb.connect(db, read_only=True)
+        try:
+            con.register('tracked_jobs', tracked)
+            df = con.execute("""
+                SELECT r.job, r.start_time, r.end_time, r.status
+                FROM job_runs r
+                JOIN tracked_jobs t ON t.job = r.job
+                WHERE r.start_time > ? OR r.end_time > ?
+            """, [seen, seen]).df()
+        finally:
+            con.close()
+        # Naive times are local, as batch_start / --sla / tail_events
+        batch = []
+        for r in df.itertuples(index=False):
+            if r.start_time > seen:
+                batch.append((r.start_time.to_pydatetime().timestamp(), r.job, 'RUNNING'))
+            if pd.notna(r.end_time) and r.end_time > seen:
+                status = str(r.status).upper() if pd.notna(r.status) else 'SUCCESS'
+                batch.append((r.end_time.to_pydatetime().timestamp(), r.job,
+                              status if status in END_EVENTS else 'SUCCESS'))
+        for ts, job, event in sorted(batch, key=lambda e: e[0]):
+            yield job, event, ts
+        if not df.empty:
+            seen = max(seen, df['start_time'].max(), df['end_time'].max() if df['end_time'].notna().any() else seen)
+        if interval <= 0:
+            return
+        time.sleep(interval)
+        yield None, 'TICK', time.time()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('db')
+    parser.add_argument('root_job')
+    parser.add_argument('--sla', help='target finish for root_job, e.g. "2025-11-21 06:00"')
+    parser.add_argument('--start', help='batch window start (default: now)')
+    parser.add_argument('--events', help='event file to tail (default: poll job_runs, which '
+                        'only sees runs once they complete, so overruns are not tracked)')
+    parser.add_argument('--interval', type=float, default=5,
+                        help='seconds between polls; 0 = stop at end of input')
+    parser.add_argument('--baseline_runs', type=int, default=10)
+    parser.add_argument('--graph_cache', help='DAG cache file (default <db>.graph.npz; "" disables)')
+    args = parser.parse_args()
+
+    con = duckdb.connect(args.db, read_only=True)
+    parents = load_graph(con, graph_cache_path(args.db) if args.graph_cache is None else args.graph_cache)
+    try:
+        order = topo_order(ancestors(parents, args.root_job), parents)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    con.register('dag_jobs', pd.DataFrame({'job': order}))
+    expected = con.execute("""
+        SELECT job, avg(duration_seconds) AS expected
+        FROM (
+            SELECT r.job, r.duration_seconds
+            FROM job_runs r
+            JOIN dag_jobs d ON d.job = r.job
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY r.job ORDER BY r.start_time DESC) <= ?
+        )
+        GROUP BY job
+    """, [args.baseline_runs]).df().set_index('job')['expected']
+    expected = expected.reindex(order).fillna(0).to_numpy()
+    con.close()
+
+    batch_start = datetime.fromisoformat(args.start) if args.start else datetime.now()
+    sla = datetime.fromisoformat(args.sla).timestamp() if args.sla else None
+    tracker = Tracker(order, parents, expected, batch_start.timestamp())
+    root = tracker.pos[args.root_job]
+
+    def report(prefix):
+        f = tracker.finish[root]
+        margin = f"  ({(sla - f) / 60:+.1f} min vs SLA)" if sla is not None else ''
+        print(f"{prefix} -> {args.root_job} projected {fmt(f)}{margin}", flush=True)
+
+    print(f"Tracking {len(order)} jobs upstream of {args.root_job} from {batch_start:%Y-%m-%d %H:%M:%S}")
+    report("initial")
+
+    if args.events:
+        events = tail_events(args.events, args.interval)
+    else:
+        events = poll_events(args.db, order, batch_start, args.interval)
+
+    try:
+        for job, event, ts in events:
+            t0 = time.perf_counter()
+            if event == 'TICK':
+                changed = tracker.advance(ts)
+                if changed:
+                    report(f"{fmt(ts)} clock [{changed} jobs re-projected]")
+                continue
+            changed = tracker.update(job, event, ts)
+            if changed:
+                report(f"{fmt(ts)} {job} {event} [{changed} jobs, "
+                       f"{(time.perf_counter() - t0) * 1000:.1f} ms]")
+    except KeyboardInterrupt:
+        pass
@@ -12,3 +12,50 @@ MIN_HISTORY_DAYS = 3
 
 # Minimum history specifically for batch-level rolling stats
 MIN_BATCH_HISTORY = 3
+
+# Minimum runs of an Autosys job in its rolling window, the scored run
+# included, before its duration is scored
+MIN_JOB_HISTORY = 3
+
+# A job run belongs to an EOD date if it started within this many hours
+# after midnight of that date (covers overnight batches)
+EOD_RUN_CUTOFF_HOURS = 30
+
+# Centre used for z-scores:
+#   "rolling" - rolling median over the last ROLLING_WINDOW rows
+#   "dow"     - rolling median of the last DOW_BASELINE_WEEKS same weekdays
+#               (falls back to "rolling" until enough weekday history exists)
+ZSCORE_CENTER = "rolling"
+
+# Denominator used for z-scores:
+#   "std" - rolling standard deviation
+#   "mad" - MAD_SCALE × rolling median absolute deviation (robust to the
+#           spikes being detected; computed in the same pass as the median)
+ZSCORE_SPREAD = "std"
+
+# Scales MAD to be a consistent estimator of the std for normal data
+MAD_SCALE = 1.4826
+
+# Same-weekday baseline: number of previous same weekdays in the window
+DOW_BASELINE_WEEKS = 4
+
+# Minimum previous same weekdays before the weekday baseline is used
+MIN_DOW_HISTORY = 2
+
+# Use the numba-compiled rolling / quantile kernels when numba is
+# installed (falls back to the NumPy implementation otherwise)
+USE_NUMBA = True
+
+# Size limit of an on-disk detector result cache (result_cache.py);
+# least recently used packs are evicted beyond it
+RESULT_CACHE_MAX_BYTES = 1024 ** 3
+
+# Plots switch to large-data mode (rasterized / hexbin normals, ranked
+# annotations) once a slice has at least this many points
+PLOT_LARGE_THRESHOLD = 20000
+
+# Maximum number of anomaly labels drawn in large-data mode (top-K by score)
+PLOT_MAX_ANNOTATIONS = 25
+
+# Grid size for hexbin density of normal points in large-data mode
+PLOT_HEXBIN_GRIDSIZE = 60
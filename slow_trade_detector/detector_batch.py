@@ -13,27 +13,59 @@ Output DataFrame contains:
     z-scores, rolling stats, batch_anomaly flag
 """
 
+import numpy as np
 import pandas as pd
 from .config import (
     ROLLING_WINDOW,
     ZSCORE_THRESHOLD,
     MIN_BATCH_HISTORY,
+    ZSCORE_CENTER,
+    ZSCORE_SPREAD,
+    MAD_SCALE,
 )
+from .preprocess import add_rolling_dow_baseline
+from .rolling import rolling_stats
 
+BATCH_METRICS = ["cpu_time_seconds", "cpu_per_secId", "total_grid_calls"]
 
-def detect_batch_anomalies(df: pd.DataFrame) -> pd.DataFrame:
+
+def detect_batch_anomalies(
+    df: pd.DataFrame,
+    center: str = ZSCORE_CENTER,
+    spread: str = ZSCORE_SPREAD,
+) -> pd.DataFrame:
     """
     Detect anomalies at batch (EOD × phase) level.
 
     Rules:
-      - Compute rolling median / std for CPU, CPU per secId, and total calls.
+      - Compute rolling median / std (and MAD) for CPU, CPU per secId,
+        and total calls in one sliding-window pass per metric.
       - Compute z-scores.
       - If any z > threshold => batch_anomaly = True.
 
+    Parameters
+    ----------
+    df : pd.DataFrame
+    center : {"rolling", "dow"}
+        z-score centre. "dow" uses the rolling same-weekday median per
+        phase ({col}_dow_med), falling back to the rolling median where
+        there is not enough weekday history yet.
+    spread : {"std", "mad"}
+        z-score denominator. "mad" uses MAD_SCALE × rolling median
+        absolute deviation ({col}_roll_mad), which the spikes being
+        detected cannot inflate the way they inflate the std.
+
     Returns
     -------
     pd.DataFrame
+        Rows grouped by phase (in order of appearance), sorted by date.
+        Rows with a missing phase are kept as one group placed first,
+        rather than dropped as the former per-phase groupby did.
     """
+    if center not in ("rolling", "dow"):
+        raise ValueError(f"center must be 'rolling' or 'dow', got {center!r}")
+    if spread not in ("std", "mad"):
+        raise ValueError(f"spread must be 'std' or 'mad', got {spread!r}")
 
     df = df.copy()
 
@@ -45,36 +77,43 @@ def detect_batch_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     df["cpu_per_secId"] = df["cpu_time_seconds"] / df["cnt"].replace(0, pd.NA)
     df["cpu_per_call"] = df["cpu_time_seconds"] / df["total_grid_calls"].replace(0, pd.NA)
 
-    # Internal helper: compute rolling stats safely
-    def detect_for_phase(g: pd.DataFrame) -> pd.DataFrame:
-        g = g.sort_values("date")
-
-        for col in ["cpu_time_seconds", "cpu_per_secId", "total_grid_calls"]:
-            roll_med = g[col].rolling(
-                ROLLING_WINDOW, min_periods=MIN_BATCH_HISTORY
-            ).median()
-            roll_std = g[col].rolling(
-                ROLLING_WINDOW, min_periods=MIN_BATCH_HISTORY
-            ).std()
-
-            g[f"{col}_roll_med"] = roll_med
-            g[f"{col}_roll_std"] = roll_std
-            g[f"{col}_z"] = (g[col] - roll_med) / roll_std
-
-        # Final anomaly rule
-        g["batch_anomaly"] = (
-            (g["cpu_time_seconds_z"] > ZSCORE_THRESHOLD)
-            | (g["cpu_per_secId_z"] > ZSCORE_THRESHOLD)
-            | (g["total_grid_calls_z"] > ZSCORE_THRESHOLD)
-        ).fillna(False)
-
-        return g
-
-    # Apply per phase
-    out = df.groupby("phase", group_keys=False, sort=False).apply(
-        detect_for_phase
-    )
-    
-    out = out.reset_index(drop=True)
-    
-    return out
+    # Same-weekday baselines for all metrics, vectorized over all phases
+    if center == "dow":
+        df = add_rolling_dow_baseline(
+            df, ["phase"], {col: f"{col}_dow_med" for col in BATCH_METRICS}
+        )
+
+    # Sort once by (phase in order of appearance, date); each phase is then
+    # a contiguous block for the shared sliding-window kernel. A missing
+    # phase factorizes to -1, so those rows form one block sorted first.
+    codes, _ = pd.factorize(df["phase"])
+    order = np.lexsort((df["date"].to_numpy(), codes))
+    df = df.iloc[order].reset_index(drop=True)
+    codes = codes[order]
+
+    stats = ("median", "std", "mad") if spread == "mad" else ("median", "std")
+
+    zcols = []
+    for col in BATCH_METRICS:
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+        roll = rolling_stats(values, codes, ROLLING_WINDOW, MIN_BATCH_HISTORY, stats=stats)
+
+        centre = roll["median"]
+        if center == "dow":
+            dow_med = df[f"{col}_dow_med"].to_numpy(dtype=float)
+            centre = np.where(np.isnan(dow_med), centre, dow_med)
+
+        scale = MAD_SCALE * roll["mad"] if spread == "mad" else roll["std"]
+
+        df[f"{col}_roll_med"] = roll["median"]
+        df[f"{col}_roll_std"] = roll["std"]
+        if spread == "mad":
+            df[f"{col}_roll_mad"] = roll["mad"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            df[f"{col}_z"] = (values - centre) / scale
+        zcols.append(f"{col}_z")
+
+    # Final anomaly rule: any metric above threshold (NaN z never flags)
+    df["batch_anomaly"] = (df[zcols].to_numpy() > ZSCORE_THRESHOLD).any(axis=1)
+
+    return df
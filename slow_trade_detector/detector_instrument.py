@@ -11,25 +11,25 @@ Output DataFrame contains:
     slow_trade
 """
 
+import numpy as np
 import pandas as pd
-import warnings
 from .config import (
     ROLLING_WINDOW,
     ZSCORE_THRESHOLD,
     MIN_HISTORY_DAYS,
+    ZSCORE_CENTER,
+    ZSCORE_SPREAD,
+    MAD_SCALE,
 )
-
-# Suppress the pandas FutureWarning about groupby.apply operating on grouping
-# columns. This is expected behavior for our use case (we want to preserve and
-# modify grouping columns), and will be handled in a future refactor.
-warnings.filterwarnings(
-    "ignore",
-    category=FutureWarning,
-    message=".*groupby.*grouping columns.*",
-)
+from .preprocess import add_rolling_dow_baseline_instrument
+from .rolling import group_offsets, group_quantiles, rolling_stats
 
 
-def detect_instrument_anomalies(df: pd.DataFrame) -> pd.DataFrame:
+def detect_instrument_anomalies(
+    df: pd.DataFrame,
+    center: str = ZSCORE_CENTER,
+    spread: str = ZSCORE_SPREAD,
+) -> pd.DataFrame:
     """
     Detect anomalous instruments (slow trades).
 
@@ -37,10 +37,25 @@ def detect_instrument_anomalies(df: pd.DataFrame) -> pd.DataFrame:
       1) Cross-sectional (same date, same phase)
       2) Time-series per secId
 
+    Parameters
+    ----------
+    df : pd.DataFrame
+    center : {"rolling", "dow"}
+        z-score centre. "dow" uses the rolling same-weekday median per
+        secId (dow_cpu_roll_med), falling back to the rolling median
+        where there is not enough weekday history yet.
+    spread : {"std", "mad"}
+        z-score denominator. "mad" uses MAD_SCALE × rolling median
+        absolute deviation (roll_mad_cpu) instead of the rolling std.
+
     Returns
     -------
     pd.DataFrame
     """
+    if center not in ("rolling", "dow"):
+        raise ValueError(f"center must be 'rolling' or 'dow', got {center!r}")
+    if spread not in ("std", "mad"):
+        raise ValueError(f"spread must be 'std' or 'mad', got {spread!r}")
 
     df = df.copy()
 
@@ -52,26 +67,29 @@ def detect_instrument_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     # 1. Cross-sectional anomaly per (date, phase)
     # ───────────────────────────────────────────────────────────────
 
-    def cross_check(group):
-        if len(group) < 2:
-            group["cross_anomaly"] = False
-            return group
-
-        calls_p25 = group["num_calls"].quantile(0.25)
-        cpu_p90 = group["cpu_time"].quantile(0.90)
-
-        group["cross_anomaly"] = (
-            (group["num_calls"] < calls_p25)
-            & (group["cpu_time"] > cpu_p90)
-        )
-
-        group["cross_anomaly"] = group["cross_anomaly"].fillna(False)
-        return group
-
-    df = (
-        df.groupby(["date", "phase"], group_keys=False, sort=False)
-        .apply(cross_check)
+    # Per-group quantiles over the rows sorted into contiguous (date, phase)
+    # blocks; flags are scattered back to the original row order. Rows with
+    # a missing key belong to no group and are dropped, as groupby does.
+    group_id = df.groupby(["date", "phase"], sort=False).ngroup()
+    df = df[group_id.notna().to_numpy()]
+    codes = group_id.dropna().to_numpy(dtype=np.int64)
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+
+    calls = pd.to_numeric(df["num_calls"], errors="coerce").to_numpy(dtype=float)[order]
+    cpu = pd.to_numeric(df["cpu_time"], errors="coerce").to_numpy(dtype=float)[order]
+    rows_per_group = np.diff(group_offsets(codes))
+    calls_p25 = np.repeat(group_quantiles(calls, codes, (0.25,))[:, 0], rows_per_group)
+    cpu_p90 = np.repeat(group_quantiles(cpu, codes, (0.90,))[:, 0], rows_per_group)
+
+    # Single-row groups are never cross-sectional outliers; NaN compares False
+    cross = np.empty(len(df), dtype=bool)
+    cross[order] = (
+        (np.repeat(rows_per_group, rows_per_group) >= 2)
+        & (calls < calls_p25)
+        & (cpu > cpu_p90)
     )
+    df["cross_anomaly"] = cross
 
     # ───────────────────────────────────────────────────────────────
     # 2. Time-series anomaly per secId
@@ -80,18 +98,30 @@ def detect_instrument_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     # Sort by secId and date globally to compute rolling statistics correctly
     df = df.sort_values(["secId", "date"]).reset_index(drop=True)
 
-    # Compute rolling median and std per secId using groupby().transform()
-    # This approach naturally preserves all columns in df.
-    df["roll_med_cpu"] = df.groupby("secId", sort=False)["cpu_time"].transform(
-        lambda x: x.rolling(ROLLING_WINDOW, min_periods=MIN_HISTORY_DAYS).median()
-    )
-    df["roll_std_cpu"] = df.groupby("secId", sort=False)["cpu_time"].transform(
-        lambda x: x.rolling(ROLLING_WINDOW, min_periods=MIN_HISTORY_DAYS).std()
-    )
-
-    # Compute z-score and flag time-series anomalies
-    df["zscore_cpu"] = (df["cpu_time"] - df["roll_med_cpu"]) / df["roll_std_cpu"]
-    df["ts_anomaly"] = (df["zscore_cpu"] > ZSCORE_THRESHOLD).fillna(False)
+    # Rolling median / std (and MAD) per secId from one sliding-window
+    # pass over the sorted cpu_time column.
+    codes = pd.factorize(df["secId"])[0]
+    cpu = pd.to_numeric(df["cpu_time"], errors="coerce").to_numpy(dtype=float)
+    stats = ("median", "std", "mad") if spread == "mad" else ("median", "std")
+    roll = rolling_stats(cpu, codes, ROLLING_WINDOW, MIN_HISTORY_DAYS, stats=stats)
+
+    df["roll_med_cpu"] = roll["median"]
+    df["roll_std_cpu"] = roll["std"]
+    if spread == "mad":
+        df["roll_mad_cpu"] = roll["mad"]
+
+    centre = roll["median"]
+    if center == "dow":
+        df = add_rolling_dow_baseline_instrument(df, value_col="cpu_time")
+        dow_med = df["dow_cpu_roll_med"].to_numpy(dtype=float)
+        centre = np.where(np.isnan(dow_med), centre, dow_med)
+
+    scale = MAD_SCALE * roll["mad"] if spread == "mad" else roll["std"]
+
+    # Compute z-score and flag time-series anomalies (NaN z never flags)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["zscore_cpu"] = (cpu - centre) / scale
+    df["ts_anomaly"] = df["zscore_cpu"].to_numpy() > ZSCORE_THRESHOLD
 
     # ───────────────────────────────────────────────────────────────
     # 3. Final slow trade
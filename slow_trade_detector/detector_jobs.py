@@ -0,0 +1,108 @@
+# detector_jobs.py
+"""
+Job-run anomaly detection over the Autosys `job_runs` table.
+
+Applies the batch detector's rule to `duration_seconds`: rolling median
+and std (or MAD) over each job's last ROLLING_WINDOW runs, z-score of
+the run against them, anomaly when z > ZSCORE_THRESHOLD. All jobs are
+scored in one grouped pass of the shared sliding-window kernel.
+
+Input (pyarrow Table or DataFrame) must contain:
+    job, start_time, duration_seconds
+
+Output DataFrame contains:
+    roll_med_duration, roll_std_duration, zscore_duration, job_anomaly
+"""
+
+import numpy as np
+import pandas as pd
+from .config import (
+    ROLLING_WINDOW,
+    ZSCORE_THRESHOLD,
+    MIN_JOB_HISTORY,
+    ZSCORE_SPREAD,
+    MAD_SCALE,
+)
+from .rolling import rolling_stats
+
+JOB_RUN_COLUMNS = ["job", "start_time", "end_time", "duration_seconds", "status"]
+
+
+def load_job_runs(con, jobs_table: str = None, runs_per_job: int = None):
+    """
+    Fetch job_runs sorted by (job, start_time) as a pyarrow Table.
+
+    Parameters
+    ----------
+    con : duckdb.DuckDBPyConnection
+    jobs_table : str, optional
+        Name of a table / registered view with a `job` column; only those
+        jobs are fetched.
+    runs_per_job : int, optional
+        Keep only each job's most recent runs (ROLLING_WINDOW is enough
+        to score the latest run).
+
+    Runs without a duration (still in progress) are skipped, so they
+    neither take a window slot nor become the "latest" run of a job.
+    """
+    join = f"JOIN {jobs_table} j ON j.job = r.job" if jobs_table else ""
+    latest = ("QUALIFY ROW_NUMBER() OVER (PARTITION BY r.job ORDER BY r.start_time DESC) <= ?"
+              if runs_per_job else "")
+    res = con.execute(f"""
+        SELECT {', '.join('r.' + c for c in JOB_RUN_COLUMNS)}
+        FROM job_runs r {join}
+        WHERE r.duration_seconds IS NOT NULL
+        {latest}
+        ORDER BY r.job, r.start_time
+    """, [runs_per_job] if runs_per_job else [])
+    # to_arrow_table() replaced fetch_arrow_table() in DuckDB 1.4
+    return res.to_arrow_table() if hasattr(res, "to_arrow_table") else res.fetch_arrow_table()
+
+
+def detect_job_anomalies(runs, spread: str = ZSCORE_SPREAD) -> pd.DataFrame:
+    """
+    Score every run of every job against its own recent history.
+
+    Parameters
+    ----------
+    runs : pyarrow.Table or pd.DataFrame
+        As returned by load_job_runs (any order is accepted).
+    spread : {"std", "mad"}
+        z-score denominator, as in detect_batch_anomalies.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per run, sorted by (job, start_time).
+    """
+    if spread not in ("std", "mad"):
+        raise ValueError(f"spread must be 'std' or 'mad', got {spread!r}")
+
+    df = runs.copy() if isinstance(runs, pd.DataFrame) else runs.to_pandas()
+
+    codes, _ = pd.factorize(df["job"], sort=True)
+    order = np.lexsort((df["start_time"].to_numpy(), codes))
+    df = df.iloc[order].reset_index(drop=True)
+    codes = codes[order]
+
+    stats = ("median", "std", "mad") if spread == "mad" else ("median", "std")
+    values = pd.to_numeric(df["duration_seconds"], errors="coerce").to_numpy(dtype=float)
+    roll = rolling_stats(values, codes, ROLLING_WINDOW, MIN_JOB_HISTORY, stats=stats)
+
+    scale = MAD_SCALE * roll["mad"] if spread == "mad" else roll["std"]
+    df["roll_med_duration"] = roll["median"]
+    df["roll_std_duration"] = roll["std"]
+    if spread == "mad":
+        df["roll_mad_duration"] = roll["mad"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["zscore_duration"] = (values - roll["median"]) / scale
+
+    # Only slowdowns flag; NaN z never flags
+    df["job_anomaly"] = df["zscore_duration"].to_numpy() > ZSCORE_THRESHOLD
+
+    return df
+
+
+def latest_job_anomalies(scored: pd.DataFrame) -> pd.DataFrame:
+    """Last scored run per job (indexed by job), from detect_job_anomalies output."""
+    return scored.groupby("job", sort=False).tail(1).set_index("job")
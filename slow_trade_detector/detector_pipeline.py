@@ -8,6 +8,16 @@ Pipeline orchestrator connecting:
 This keeps the flow:
    batch → identify suspicious (eodDate, phase)
    instrument → analyze only those slices
+
+Both stages also accept polars DataFrames / LazyFrames, which run on the
+Polars backend (detector_polars) and come back as polars frames; pass
+results through to_pandas() before the report and plots. polars is only
+imported when a polars frame is passed in.
+
+With `cache` (a ResultCache or a directory), pandas input is detected per
+(eodDate, phase) partition through result_cache: partitions whose rows
+and rolling-window history are unchanged are served from disk. The cache
+holds pickles, so its directory must not be writable by other users.
 """
 
 import pandas as pd
@@ -17,10 +27,37 @@ from .detector_batch import detect_batch_anomalies
 from .detector_instrument import detect_instrument_anomalies
 
 
+def _is_polars(frame) -> bool:
+    return type(frame).__module__.split(".")[0] == "polars"
+
+
+def _flagged_pair(eod, phase) -> Dict:
+    return {
+        "eodDate": str(eod.date()) if hasattr(eod, "date") else str(eod),
+        "phase": phase,
+    }
+
+
+def _as_cache(cache):
+    from .result_cache import ResultCache
+    return cache if isinstance(cache, ResultCache) else ResultCache(cache)
+
+
+def to_pandas(frame) -> pd.DataFrame:
+    """
+    Stage output as a pandas DataFrame (polars frames are converted,
+    LazyFrames collected; pandas input is returned unchanged).
+    """
+    if _is_polars(frame):
+        from .detector_polars import to_pandas as polars_to_pandas
+        return polars_to_pandas(frame)
+    return frame
+
+
 # ───────────────────────────────────────────────────────────────
 # Batch Stage
 # ───────────────────────────────────────────────────────────────
-def run_batch_stage(batch_df: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict]]:
+def run_batch_stage(batch_df: pd.DataFrame, cache=None) -> Tuple[pd.DataFrame, List[Dict]]:
     """
     Run batch-level detection and return:
       - batch_result: full DataFrame with metrics
@@ -28,45 +65,91 @@ def run_batch_stage(batch_df: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict]]:
 
     Parameters
     ----------
-    batch_df : pd.DataFrame
+    batch_df : pd.DataFrame, pl.DataFrame or pl.LazyFrame
+        A LazyFrame is collected once to find the flagged pairs; the
+        result is handed back as a LazyFrame over the collected data.
+    cache : ResultCache or str, optional
+        Serve unchanged (eodDate, phase) partitions from this cache
+        (pandas input only).
 
     Returns
     -------
-    batch_result : pd.DataFrame
+    batch_result : same kind as batch_df
     flagged_pairs : list[dict]
     """
-    batch_result = detect_batch_anomalies(batch_df)
+    if _is_polars(batch_df):
+        if cache is not None:
+            raise ValueError("cache is only supported for pandas input")
+        return _run_batch_stage_polars(batch_df)
+
+    if cache is not None:
+        from .result_cache import cached_detect
+        batch_result = cached_detect(
+            batch_df, detect_batch_anomalies, "batch", "phase", _as_cache(cache)
+        )
+    else:
+        batch_result = detect_batch_anomalies(batch_df)
 
     flagged = batch_result[batch_result["batch_anomaly"] == True]
 
     flagged_pairs = [
-        {
-            "eodDate": str(row["eodDate"].date()) if hasattr(row["eodDate"], "date") else str(row["eodDate"]),
-            "phase": row["phase"],
-        }
+        _flagged_pair(row["eodDate"], row["phase"])
         for _, row in flagged.iterrows()
     ]
 
     return batch_result, flagged_pairs
 
 
+def _run_batch_stage_polars(batch_df):
+    import polars as pl
+    from .detector_polars import detect_batch_anomalies_pl
+
+    batch_result = detect_batch_anomalies_pl(batch_df)
+    lazy = isinstance(batch_result, pl.LazyFrame)
+    if lazy:
+        batch_result = batch_result.collect()
+
+    flagged = batch_result.filter(pl.col("batch_anomaly")).select("eodDate", "phase")
+    flagged_pairs = [_flagged_pair(eod, phase) for eod, phase in flagged.iter_rows()]
+
+    return (batch_result.lazy() if lazy else batch_result), flagged_pairs
+
+
 # ───────────────────────────────────────────────────────────────
 # Instrument Stage
 # ───────────────────────────────────────────────────────────────
-def run_instrument_stage(inst_df: pd.DataFrame) -> pd.DataFrame:
+def run_instrument_stage(inst_df: pd.DataFrame, cache=None) -> pd.DataFrame:
     """
     Run instrument-level slow trade detection.
 
     Parameters
     ----------
-    inst_df : pd.DataFrame
+    inst_df : pd.DataFrame, pl.DataFrame or pl.LazyFrame
         Must be instrument-level subset for one (eodDate, phase)
+    cache : ResultCache or str, optional
+        Serve unchanged (eodDate, phase) partitions from this cache
+        (pandas input only).
 
     Returns
     -------
-    pd.DataFrame or None
+    same kind as inst_df, or None
+        None for missing / empty input (a LazyFrame is not collected to
+        check, and its result stays lazy).
     """
+    if _is_polars(inst_df):
+        if cache is not None:
+            raise ValueError("cache is only supported for pandas input")
+        from .detector_polars import detect_instrument_anomalies_pl
+        if hasattr(inst_df, "is_empty") and inst_df.is_empty():
+            return None
+        return detect_instrument_anomalies_pl(inst_df)
+
     if inst_df is None or inst_df.empty:
         return None
 
+    if cache is not None:
+        from .result_cache import cached_detect
+        return cached_detect(
+            inst_df, detect_instrument_anomalies, "instrument", "secId", _as_cache(cache)
+        )
     return detect_instrument_anomalies(inst_df)
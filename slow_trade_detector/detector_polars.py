@@ -0,0 +1,277 @@
+# detector_polars.py
+"""
+Polars backend for the batch and instrument detectors.
+
+Same rules and output columns as detect_batch_anomalies /
+detect_instrument_anomalies, built as lazy Polars expressions so the
+whole detection is one query plan executed multi-threaded:
+
+  rolling median / std  rolling_median / rolling_std(ROLLING_WINDOW,
+                        min_samples).over(key), nulls skipped
+  rolling MAD           list median of |x.shift(k) - window median|, k < window
+  weekday baseline      x.shift(1).rolling_median(DOW_BASELINE_WEEKS)
+                        .over([key, weekday])
+  cross-sectional check quantile(num_calls, 0.25) / (cpu_time, 0.90)
+                        .over([date, phase])
+
+NaN inputs are treated as missing (nulls), as pandas skips them. Ties on
+date are broken by input row order, matching the stable sorts of the
+pandas implementation.
+
+Inputs may be a polars LazyFrame / DataFrame or a pandas DataFrame; the
+result has the same kind (a LazyFrame stays lazy until collected). Use
+to_pandas() to hand results to the report and plots.
+"""
+
+import pandas as pd
+import polars as pl
+
+from .config import (
+    ROLLING_WINDOW,
+    ZSCORE_THRESHOLD,
+    MIN_HISTORY_DAYS,
+    MIN_BATCH_HISTORY,
+    ZSCORE_CENTER,
+    ZSCORE_SPREAD,
+    MAD_SCALE,
+    DOW_BASELINE_WEEKS,
+    MIN_DOW_HISTORY,
+)
+from .detector_batch import BATCH_METRICS
+
+
+def from_pandas(df: pd.DataFrame, lazy: bool = True):
+    """pandas DataFrame -> polars LazyFrame (or DataFrame with lazy=False)."""
+    frame = pl.from_pandas(df)
+    return frame.lazy() if lazy else frame
+
+
+def to_pandas(frame) -> pd.DataFrame:
+    """Polars LazyFrame / DataFrame -> pandas DataFrame (collects a LazyFrame)."""
+    if isinstance(frame, pl.LazyFrame):
+        frame = frame.collect()
+    if isinstance(frame, pl.DataFrame):
+        return frame.to_pandas()
+    return frame
+
+
+def _lazy(frame):
+    """(LazyFrame, finish) where finish() turns the result back into the input's kind."""
+    if isinstance(frame, pl.LazyFrame):
+        return frame, lambda lf: lf
+    if isinstance(frame, pl.DataFrame):
+        return frame.lazy(), lambda lf: lf.collect()
+    if isinstance(frame, pd.DataFrame):
+        return from_pandas(frame), to_pandas
+    raise TypeError(f"expected a polars or pandas DataFrame, got {type(frame).__name__}")
+
+
+def _as_datetime(col, dtype):
+    if dtype == pl.String:
+        return pl.col(col).str.to_datetime()
+    return pl.col(col).cast(pl.Datetime("ns"))
+
+
+def _num(col):
+    """Column as Float64 with NaN turned into null."""
+    return pl.col(col).cast(pl.Float64).fill_nan(None)
+
+
+def _flag(z):
+    """z > threshold; null / NaN never flags (polars orders NaN above all numbers)."""
+    return ((z > ZSCORE_THRESHOLD) & z.is_not_nan()).fill_null(False)
+
+
+def _rolling_exprs(value, key, min_periods, out):
+    """Masked rolling median / std of `value` within `key`, named per `out`."""
+    return [
+        value.rolling_median(ROLLING_WINDOW, min_samples=min_periods).over(key).alias(out["median"]),
+        value.rolling_std(ROLLING_WINDOW, min_samples=min_periods).over(key).alias(out["std"]),
+    ]
+
+
+def _mad_expr(value, key, out):
+    """
+    Rolling MAD around the already computed window median. The frame is
+    sorted by `key`, so shift(k) only needs masking at group starts;
+    eq_missing keeps the rows with a missing key together as one group.
+    """
+    med = pl.col(out["median"])
+    dev = [
+        pl.when(pl.col(key).shift(k).eq_missing(pl.col(key))).then((value.shift(k) - med).abs())
+        for k in range(ROLLING_WINDOW)
+    ]
+    return pl.concat_list(dev).list.median().alias(out["mad"])
+
+
+def _dow_expr(value, key):
+    return (
+        value.shift(1)
+        .rolling_median(DOW_BASELINE_WEEKS, min_samples=MIN_DOW_HISTORY)
+        .over([key, "_weekday"])
+    )
+
+
+def _zscore(value, centre, scale):
+    return (value - centre) / scale
+
+
+def detect_batch_anomalies_pl(
+    frame,
+    center: str = ZSCORE_CENTER,
+    spread: str = ZSCORE_SPREAD,
+):
+    """
+    detect_batch_anomalies as a lazy Polars query.
+
+    Parameters
+    ----------
+    frame : pl.LazyFrame, pl.DataFrame or pd.DataFrame
+        eodDate, phase, total_grid_calls, cpu_time_seconds, cnt.
+    center, spread : str
+        As in detect_batch_anomalies.
+
+    Returns
+    -------
+    Same kind as `frame`
+        Same rows, order and columns as detect_batch_anomalies.
+    """
+    if center not in ("rolling", "dow"):
+        raise ValueError(f"center must be 'rolling' or 'dow', got {center!r}")
+    if spread not in ("std", "mad"):
+        raise ValueError(f"spread must be 'std' or 'mad', got {spread!r}")
+
+    lf, finish = _lazy(frame)
+    schema = lf.collect_schema()
+    base_cols = [c for c in schema.names()
+                 if c not in ("date", "day_of_week", "cpu_per_secId", "cpu_per_call")]
+
+    lf = (
+        lf.with_row_index("_rowid")
+        .with_columns(date=_as_datetime("eodDate", schema["eodDate"]))
+        .with_columns(
+            day_of_week=pl.col("date").dt.strftime("%A"),
+            _weekday=pl.col("date").dt.weekday(),
+            cpu_per_secId=pl.col("cpu_time_seconds")
+            / pl.when(pl.col("cnt") != 0).then(pl.col("cnt")),
+            cpu_per_call=pl.col("cpu_time_seconds")
+            / pl.when(pl.col("total_grid_calls") != 0).then(pl.col("total_grid_calls")),
+            # Phases in order of appearance (missing phase first, as factorize -1)
+            _phase_rank=pl.when(pl.col("phase").is_null())
+            .then(-1)
+            .otherwise(pl.col("_rowid").min().over("phase").cast(pl.Int64)),
+        )
+        .sort(["_phase_rank", "date", "_rowid"], nulls_last=True)
+        .with_columns([_num(col).alias(f"_v_{col}") for col in BATCH_METRICS])
+    )
+
+    window_exprs, mad_exprs, final_cols, zcols = [], [], [], []
+    if center == "dow":
+        window_exprs += [_dow_expr(pl.col(f"_v_{col}"), "phase").alias(f"{col}_dow_med")
+                         for col in BATCH_METRICS]
+        final_cols += [f"{col}_dow_med" for col in BATCH_METRICS]
+
+    for col in BATCH_METRICS:
+        out = {"median": f"{col}_roll_med", "std": f"{col}_roll_std", "mad": f"{col}_roll_mad"}
+        value = pl.col(f"_v_{col}")
+        window_exprs += _rolling_exprs(value, "phase", MIN_BATCH_HISTORY, out)
+        final_cols += [out["median"], out["std"]]
+        if spread == "mad":
+            mad_exprs.append(_mad_expr(value, "phase", out))
+            final_cols.append(out["mad"])
+        final_cols.append(f"{col}_z")
+        zcols.append(f"{col}_z")
+    lf = lf.with_columns(window_exprs)
+    if mad_exprs:
+        lf = lf.with_columns(mad_exprs)
+
+    z_exprs = []
+    for col in BATCH_METRICS:
+        med = pl.col(f"{col}_roll_med")
+        centre = pl.coalesce(pl.col(f"{col}_dow_med"), med) if center == "dow" else med
+        scale = (MAD_SCALE * pl.col(f"{col}_roll_mad") if spread == "mad"
+                 else pl.col(f"{col}_roll_std"))
+        z_exprs.append(_zscore(pl.col(f"_v_{col}"), centre, scale).alias(f"{col}_z"))
+    lf = lf.with_columns(z_exprs)
+
+    lf = lf.select(
+        *base_cols, "date", "day_of_week", "cpu_per_secId", "cpu_per_call", *final_cols,
+        pl.any_horizontal([_flag(pl.col(z)) for z in zcols]).alias("batch_anomaly"),
+    )
+    return finish(lf)
+
+
+def detect_instrument_anomalies_pl(
+    frame,
+    center: str = ZSCORE_CENTER,
+    spread: str = ZSCORE_SPREAD,
+):
+    """
+    detect_instrument_anomalies as a lazy Polars query.
+
+    Parameters
+    ----------
+    frame : pl.LazyFrame, pl.DataFrame or pd.DataFrame
+        eodDate, phase, secId, num_calls, cpu_time.
+    center, spread : str
+        As in detect_instrument_anomalies.
+
+    Returns
+    -------
+    Same kind as `frame`
+        Same rows, order and columns as detect_instrument_anomalies.
+    """
+    if center not in ("rolling", "dow"):
+        raise ValueError(f"center must be 'rolling' or 'dow', got {center!r}")
+    if spread not in ("std", "mad"):
+        raise ValueError(f"spread must be 'std' or 'mad', got {spread!r}")
+
+    lf, finish = _lazy(frame)
+    schema = lf.collect_schema()
+    base_cols = [c for c in schema.names() if c not in ("date", "day_of_week")]
+    out = {"median": "roll_med_cpu", "std": "roll_std_cpu", "mad": "roll_mad_cpu"}
+    calls, cpu = pl.col("_calls"), pl.col("_cpu")
+    cross_key = ["date", "phase"]
+
+    lf = (
+        lf.with_row_index("_rowid")
+        .with_columns(date=_as_datetime("eodDate", schema["eodDate"]))
+        .with_columns(
+            day_of_week=pl.col("date").dt.strftime("%A"),
+            _weekday=pl.col("date").dt.weekday(),
+            _calls=_num("num_calls"),
+            _cpu=_num("cpu_time"),
+        )
+        # Rows with a missing (date, phase) key are dropped, as groupby does
+        .filter(pl.col("date").is_not_null() & pl.col("phase").is_not_null())
+        .with_columns(
+            cross_anomaly=(
+                (pl.len().over(cross_key) >= 2)
+                & (calls < calls.quantile(0.25, interpolation="linear").over(cross_key))
+                & (cpu > cpu.quantile(0.90, interpolation="linear").over(cross_key))
+            ).fill_null(False)
+        )
+        .sort(["secId", "date", "_rowid"], nulls_last=True)
+        .with_columns(_rolling_exprs(cpu, "secId", MIN_HISTORY_DAYS, out))
+    )
+    if spread == "mad":
+        lf = lf.with_columns(_mad_expr(cpu, "secId", out))
+
+    final_cols = [out["median"], out["std"]] + ([out["mad"]] if spread == "mad" else [])
+    centre = pl.col(out["median"])
+    if center == "dow":
+        lf = lf.with_columns(_dow_expr(cpu, "secId").alias("dow_cpu_roll_med"))
+        final_cols.append("dow_cpu_roll_med")
+        centre = pl.coalesce(pl.col("dow_cpu_roll_med"), centre)
+    scale = MAD_SCALE * pl.col(out["mad"]) if spread == "mad" else pl.col(out["std"])
+
+    lf = (
+        lf.with_columns(zscore_cpu=_zscore(cpu, centre, scale))
+        .with_columns(ts_anomaly=_flag(pl.col("zscore_cpu")))
+        .select(
+            *base_cols, "date", "day_of_week", "cross_anomaly", *final_cols,
+            "zscore_cpu", "ts_anomaly",
+            (pl.col("cross_anomaly") | pl.col("ts_anomaly")).alias("slow_trade"),
+        )
+    )
+    return finish(lf)
@@ -0,0 +1,318 @@
+# detector_sql.py
+"""
+DuckDB backend for the batch and instrument detectors.
+
+Same rules and output columns as detect_batch_anomalies /
+detect_instrument_anomalies, expressed as window queries so the data can
+stay in DuckDB tables (out of core, multi-threaded):
+
+  rolling median / std  quantile_cont / stddev_samp OVER
+                        (ROWS BETWEEN ROLLING_WINDOW - 1 PRECEDING AND CURRENT ROW),
+                        NULL unless count() over the window >= min_periods
+  rolling MAD           median of |x - window median| over list() of the window
+  weekday baseline      quantile_cont OVER (PARTITION BY key, weekday
+                        ROWS BETWEEN DOW_BASELINE_WEEKS PRECEDING AND 1 PRECEDING)
+  cross-sectional check quantile_cont(num_calls, 0.25) / (cpu_time, 0.90)
+                        OVER (PARTITION BY date, phase)
+
+Ties on date are broken by input row order, as the stable sorts of the
+pandas implementation do. Rows with a missing key follow pandas too: the
+batch query keeps missing-phase rows as one group ranked first, and the
+instrument query drops rows whose date or phase is missing (as groupby
+does). Missing dates sort last in both.
+
+Input order comes from a row-index column added to a DataFrame source,
+or from `rowid` for a DuckDB table. A view has no row identity, so its
+ties follow its scan order (row_number() OVER ()), which DuckDB keeps
+only with preserve_insertion_order (the default) and is not guaranteed
+for parallel scans; materialize a view into a table to pin the order.
+
+`source` is a table / view name or a DataFrame (registered for the
+query). With `into`, the result is written to that DuckDB table instead
+of being returned. duckdb is imported only when `con` is a path.
+"""
+
+import numpy as np
+import pandas as pd
+from .config import (
+    ROLLING_WINDOW,
+    ZSCORE_THRESHOLD,
+    MIN_HISTORY_DAYS,
+    MIN_BATCH_HISTORY,
+    ZSCORE_CENTER,
+    ZSCORE_SPREAD,
+    MAD_SCALE,
+    DOW_BASELINE_WEEKS,
+    MIN_DOW_HISTORY,
+)
+from .detector_batch import BATCH_METRICS
+
+
+def _connect(con):
+    if isinstance(con, str):
+        import duckdb
+        return duckdb.connect(con)
+    return con
+
+
+def _num(col):
+    """Column as DOUBLE with NaN turned into NULL (pandas skips both)."""
+    return f"nullif(CAST({col} AS DOUBLE), 'NaN'::DOUBLE)"
+
+
+def _flag(z):
+    """z > threshold; NULL / NaN never flags (DuckDB orders NaN above all numbers)."""
+    return f"coalesce({z} > {ZSCORE_THRESHOLD} AND NOT isnan({z}), false)"
+
+
+def _rolling_select(col, out, min_periods, spread):
+    """Masked rolling median / std (/ MAD) of `col` over WINDOW r."""
+    enough = f"count({col}) OVER r >= {min_periods}"
+    sel = [
+        f"CASE WHEN {enough} THEN quantile_cont({col}, 0.5) OVER r END AS {out['median']}",
+        f"CASE WHEN {enough} THEN stddev_samp({col}) OVER r END AS {out['std']}",
+    ]
+    if spread == "mad":
+        sel.append(f"CASE WHEN {enough} THEN list({col}) OVER r END AS _win_{col}")
+    return sel
+
+
+def _mad_select(col, out):
+    return (f"list_median(list_transform(_win_{col}, v -> abs(v - {out['median']}))) "
+            f"AS {out['mad']}")
+
+
+def _dow_select(col, out_col):
+    return (f"CASE WHEN count({col}) OVER d >= {MIN_DOW_HISTORY} "
+            f"THEN quantile_cont({col}, 0.5) OVER d END AS {out_col}")
+
+
+def _is_table(con, name):
+    return con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [name.split(".")[-1]]
+    ).fetchone()[0] > 0
+
+
+def _run(con, source, sql, into):
+    con = _connect(con)
+    name = source
+    if isinstance(source, pd.DataFrame):
+        # Input order travels with the rows (shallow copy, one extra column)
+        name, rowid = "_detector_source", "_input_row"
+        frame = source.copy(deep=False)
+        frame[rowid] = np.arange(len(frame))
+        con.register(name, frame)
+    else:
+        rowid = "rowid" if _is_table(con, source) else "row_number() OVER ()"
+    try:
+        query = sql.format(source=name, rowid=rowid)
+        if into:
+            con.execute(f"CREATE OR REPLACE TABLE {into} AS {query}")
+            return None
+        return con.execute(query).df()
+    finally:
+        if isinstance(source, pd.DataFrame):
+            con.unregister(name)
+
+
+def _source_columns(con, source):
+    if isinstance(source, pd.DataFrame):
+        return list(source.columns)
+    return [r[0] for r in _connect(con).execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+
+
+def detect_batch_anomalies_sql(
+    con,
+    source,
+    center: str = ZSCORE_CENTER,
+    spread: str = ZSCORE_SPREAD,
+    into: str = None,
+):
+    """
+    detect_batch_anomalies as one DuckDB query.
+
+    Parameters
+    ----------
+    con : duckdb connection or str
+    source : str or pd.DataFrame
+        Table / view with eodDate, phase, total_grid_calls,
+        cpu_time_seconds, cnt.
+    center, spread : str
+        As in detect_batch_anomalies.
+    into : str, optional
+        Write the result to this table and return None.
+
+    Returns
+    -------
+    pd.DataFrame or None
+        Same rows, order and columns as detect_batch_anomalies: rows
+        with a missing phase form one group ranked first, missing dates
+        sort last within their phase.
+    """
+    if center not in ("rolling", "dow"):
+        raise ValueError(f"center must be 'rolling' or 'dow', got {center!r}")
+    if spread not in ("std", "mad"):
+        raise ValueError(f"spread must be 'std' or 'mad', got {spread!r}")
+
+    base_cols = [c for c in _source_columns(con, source)
+                 if c not in ("date", "day_of_week", "cpu_per_secId", "cpu_per_call")]
+    outs = {col: {"median": f"{col}_roll_med", "std": f"{col}_roll_std",
+                  "mad": f"{col}_roll_mad"} for col in BATCH_METRICS}
+
+    window_sel, final_sel, zcols = [], [], []
+    for col in BATCH_METRICS:
+        out = outs[col]
+        window_sel += _rolling_select(f"_v_{col}", out, MIN_BATCH_HISTORY, spread)
+        if center == "dow":
+            window_sel.append(_dow_select(f"_v_{col}", f"{col}_dow_med"))
+    if center == "dow":
+        final_sel += [f'"{col}_dow_med"' for col in BATCH_METRICS]
+    for col in BATCH_METRICS:
+        out = outs[col]
+        centre = (f"coalesce({col}_dow_med, {out['median']})" if center == "dow"
+                  else out["median"])
+        scale = f"{MAD_SCALE} * {out['mad']}" if spread == "mad" else out["std"]
+        final_sel += [out["median"], out["std"]]
+        if spread == "mad":
+            final_sel.append(out["mad"])
+        final_sel.append(f"(_v_{col} - {centre}) / ({scale}) AS {col}_z")
+        zcols.append(f"{col}_z")
+
+    mad_sel = ", ".join(_mad_select(f"_v_{col}", outs[col]) for col in BATCH_METRICS) \
+        if spread == "mad" else ""
+    sql = f"""
+        WITH src AS (
+            SELECT *, {{rowid}} AS _rowid FROM {{source}}
+        ),
+        b AS (
+            SELECT {', '.join(f'"{c}"' for c in base_cols)}, _rowid,
+                   CAST(eodDate AS TIMESTAMP) AS date,
+                   dayname(CAST(eodDate AS TIMESTAMP)) AS day_of_week,
+                   cpu_time_seconds / nullif(cnt, 0) AS cpu_per_secId,
+                   cpu_time_seconds / nullif(total_grid_calls, 0) AS cpu_per_call,
+                   CASE WHEN phase IS NULL THEN -1
+                        ELSE min(_rowid) OVER (PARTITION BY phase) END AS _phase_rank
+            FROM src
+        ),
+        v AS (
+            SELECT *, {', '.join(f'{_num(c)} AS _v_{c}' for c in BATCH_METRICS)} FROM b
+        ),
+        w AS (
+            SELECT *, {', '.join(window_sel)}
+            FROM v
+            WINDOW r AS (PARTITION BY phase ORDER BY date, _rowid
+                         ROWS BETWEEN {ROLLING_WINDOW - 1} PRECEDING AND CURRENT ROW),
+                   d AS (PARTITION BY phase, dayofweek(date) ORDER BY date, _rowid
+                         ROWS BETWEEN {DOW_BASELINE_WEEKS} PRECEDING AND 1 PRECEDING)
+        ),
+        m AS (
+            SELECT *{', ' + mad_sel if mad_sel else ''} FROM w
+        ),
+        z AS (
+            SELECT {', '.join(f'"{c}"' for c in base_cols)},
+                   date, day_of_week, cpu_per_secId, cpu_per_call,
+                   {', '.join(final_sel)},
+                   _phase_rank, _rowid
+            FROM m
+        )
+        SELECT * EXCLUDE (_phase_rank, _rowid),
+               {' OR '.join(_flag(z) for z in zcols)} AS batch_anomaly
+        FROM z
+        ORDER BY _phase_rank, date, _rowid
+    """
+    return _run(con, source, sql, into)
+
+
+def detect_instrument_anomalies_sql(
+    con,
+    source,
+    center: str = ZSCORE_CENTER,
+    spread: str = ZSCORE_SPREAD,
+    into: str = None,
+):
+    """
+    detect_instrument_anomalies as one DuckDB query.
+
+    Parameters
+    ----------
+    con : duckdb connection or str
+    source : str or pd.DataFrame
+        Table / view with eodDate, phase, secId, num_calls, cpu_time.
+    center, spread : str
+        As in detect_instrument_anomalies.
+    into : str, optional
+        Write the result to this table and return None.
+
+    Returns
+    -------
+    pd.DataFrame or None
+        Same columns as detect_instrument_anomalies, sorted by (secId,
+        date); rows with a missing date or phase are dropped, as pandas
+        does.
+    """
+    if center not in ("rolling", "dow"):
+        raise ValueError(f"center must be 'rolling' or 'dow', got {center!r}")
+    if spread not in ("std", "mad"):
+        raise ValueError(f"spread must be 'std' or 'mad', got {spread!r}")
+
+    base_cols = [c for c in _source_columns(con, source) if c not in ("date", "day_of_week")]
+    out = {"median": "roll_med_cpu", "std": "roll_std_cpu", "mad": "roll_mad_cpu"}
+
+    window_sel = _rolling_select("_cpu", out, MIN_HISTORY_DAYS, spread)
+    if center == "dow":
+        window_sel.append(_dow_select("_cpu", "dow_cpu_roll_med"))
+    final_sel = [out["median"], out["std"]]
+    if spread == "mad":
+        final_sel.append(out["mad"])
+    if center == "dow":
+        final_sel.append("dow_cpu_roll_med")
+    centre = f"coalesce(dow_cpu_roll_med, {out['median']})" if center == "dow" else out["median"]
+    scale = f"{MAD_SCALE} * {out['mad']}" if spread == "mad" else out["std"]
+
+    sql = f"""
+        WITH src AS (
+            SELECT *, {{rowid}} AS _rowid FROM {{source}}
+        ),
+        b AS (
+            SELECT {', '.join(f'"{c}"' for c in base_cols)}, _rowid,
+                   CAST(eodDate AS TIMESTAMP) AS date,
+                   dayname(CAST(eodDate AS TIMESTAMP)) AS day_of_week,
+                   {_num('num_calls')} AS _calls, {_num('cpu_time')} AS _cpu
+            FROM src
+            -- rows with a missing (date, phase) key are dropped, as groupby does
+            WHERE eodDate IS NOT NULL AND phase IS NOT NULL
+        ),
+        c AS (
+            SELECT *,
+                   CASE WHEN count(*) OVER p < 2 THEN false
+                        ELSE coalesce(_calls < quantile_cont(_calls, 0.25) OVER p
+                                      AND _cpu > quantile_cont(_cpu, 0.90) OVER p, false)
+                   END AS cross_anomaly
+            FROM b
+            WINDOW p AS (PARTITION BY date, phase)
+        ),
+        w AS (
+            SELECT *, {', '.join(window_sel)}
+            FROM c
+            WINDOW r AS (PARTITION BY secId ORDER BY date, _rowid
+                         ROWS BETWEEN {ROLLING_WINDOW - 1} PRECEDING AND CURRENT ROW),
+                   d AS (PARTITION BY secId, dayofweek(date) ORDER BY date, _rowid
+                         ROWS BETWEEN {DOW_BASELINE_WEEKS} PRECEDING AND 1 PRECEDING)
+        ),
+        m AS (
+            SELECT *{', ' + _mad_select('_cpu', out) if spread == 'mad' else ''} FROM w
+        ),
+        z AS (
+            SELECT {', '.join(f'"{c}"' for c in base_cols)},
+                   date, day_of_week, cross_anomaly, {', '.join(final_sel)},
+                   (_cpu - {centre}) / ({scale}) AS zscore_cpu,
+                   _rowid
+            FROM m
+        )
+        SELECT * EXCLUDE (_rowid),
+               {_flag('zscore_cpu')} AS ts_anomaly,
+               cross_anomaly OR {_flag('zscore_cpu')} AS slow_trade
+        FROM z
+        ORDER BY secId, date, _rowid
+    """
+    return _run(con, source, sql, into)
@@ -1,9 +1,10 @@
 # loader_sybase.py
 # Sybase database loader using pyodbc.
 # Replace CONN_STR with your real DSN or connection string.
+# pyodbc is only imported when a connection is opened, so this module can
+# be imported on hosts without the ODBC driver.
 
 import pandas as pd
-import pyodbc
 
 # Example ODBC DSN connection string — update to your environment
 CONN_STR = "DSN=YOUR_SYBASE_DSN;UID=your_user;PWD=your_password"
@@ -12,7 +13,18 @@ CONN_STR = "DSN=YOUR_SYBASE_DSN;UID=your_user;PWD=your_password"
 def get_conn():
     """
     Returns a live pyodbc connection to Sybase.
+
+    Raises ImportError if pyodbc is not installed
+    (pip install slow_trade_detector[sybase]).
     """
+    try:
+        import pyodbc
+    except ImportError as e:
+        raise ImportError(
+            "pyodbc is required for Sybase loading: "
+            "pip install slow_trade_detector[sybase]"
+        ) from e
+
     return pyodbc.connect(CONN_STR)
 
 
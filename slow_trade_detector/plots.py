@@ -7,12 +7,30 @@ Includes:
  - CPU per Call plot
  - CPU vs Stress Type (categorical jitter)
  - Anomaly highlighting and annotations
+ - Large-data mode (rasterized / hexbin normals, top-K annotations)
 """
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from sklearn.linear_model import LinearRegression
+
+# matplotlib is imported inside each drawing function so that importing
+# this module (e.g. from a headless cron job) does not pay for pyplot.
+
+from .regression import fit_trendline
+from .config import (
+    PLOT_LARGE_THRESHOLD,
+    PLOT_MAX_ANNOTATIONS,
+    PLOT_HEXBIN_GRIDSIZE,
+)
+
+# Candidate columns used to rank anomalies for annotation, best first
+SCORE_COLUMNS = ["slow_score", "zscore_cpu"]
+
+# Label offsets (points) cycled by rank so neighbouring labels fan out
+_LABEL_OFFSETS = np.array([(5, 5), (5, -12), (-35, 5), (-35, -12)])
+
+# Hexbin colormaps matching the scatter colors used for normal points
+_HEXBIN_CMAPS = {"blue": "Blues", "orange": "Oranges"}
 
 
 # ───────────────────────────────────────────────────────────────
@@ -28,19 +46,118 @@ def _ensure_date(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+# ───────────────────────────────────────────────────────────────
+# Utility: large-data rendering
+# ───────────────────────────────────────────────────────────────
+
+def is_large(n: int, large=None) -> bool:
+    """Resolve the large-data switch (None = decide from point count)."""
+    if large is None:
+        return n >= PLOT_LARGE_THRESHOLD
+    return bool(large)
+
+
+def scatter_normal(x, y, large: bool, density: str = "raster", cmap=None, **kwargs):
+    """
+    Draw the bulk of (normal) points.
+
+    In large-data mode points are either rasterized into a single image
+    (density="raster") or binned into a hexbin density (density="hexbin"),
+    so the figure cost no longer grows with one vector marker per row.
+
+    Each hexbin series uses its own colormap (`cmap`, else the one matching
+    the scatter color `c`) and gets a hexagon proxy entry in the legend,
+    since hexbin collections carry no legend label of their own.
+    """
+    import matplotlib.pyplot as plt
+
+    if not large:
+        plt.scatter(x, y, **kwargs)
+        return
+
+    if density == "hexbin":
+        from matplotlib.lines import Line2D
+
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        ok = np.isfinite(x) & np.isfinite(y)
+        cmap = cmap or _HEXBIN_CMAPS.get(kwargs.get("c"), "Greys")
+        ax = plt.gca()
+        ax.hexbin(x[ok], y[ok], gridsize=PLOT_HEXBIN_GRIDSIZE,
+                  bins="log", mincnt=1, cmap=cmap, alpha=kwargs.get("alpha"))
+        if kwargs.get("label"):
+            # Legend proxy: an empty hexagon marker in the series' mid tone
+            color = plt.get_cmap(cmap)(0.7)
+            ax.add_line(Line2D([], [], marker="h", linestyle="", markersize=10,
+                               color=color, label=kwargs["label"]))
+        return
+
+    kwargs.setdefault("s", 4)
+    kwargs.setdefault("linewidths", 0)
+    plt.scatter(x, y, rasterized=True, **kwargs)
+
+
+def _anomaly_scores(df: pd.DataFrame, fallback: str) -> np.ndarray:
+    """Score used to rank anomalies (first available of SCORE_COLUMNS)."""
+    for col in SCORE_COLUMNS:
+        if col in df.columns:
+            return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+    return pd.to_numeric(df[fallback], errors="coerce").to_numpy(dtype=float)
+
+
+def annotate_top(x, y, labels, scores, max_labels=None):
+    """
+    Annotate anomalies, keeping only the top `max_labels` by score.
+
+    Ranking and label offsets are computed with NumPy in one go; only the
+    selected labels are drawn (max_labels=None draws all of them).
+    """
+    import matplotlib.pyplot as plt
+
+    x = np.asarray(x)
+    y = np.asarray(y)
+    labels = np.asarray(labels, dtype=object)
+    scores = np.nan_to_num(np.asarray(scores, dtype=float), nan=-np.inf)
+
+    order = np.argsort(-scores, kind="stable")
+    if max_labels is not None:
+        order = order[:max_labels]
+
+    offsets = _LABEL_OFFSETS[np.arange(len(order)) % len(_LABEL_OFFSETS)]
+
+    for i, (dx, dy) in zip(order, offsets):
+        plt.annotate(str(labels[i]), (x[i], y[i]),
+                     textcoords="offset points", xytext=(dx, dy))
+
+
 # ───────────────────────────────────────────────────────────────
 # 1. CPU vs Calls (main diagnostic scatter)
 # ───────────────────────────────────────────────────────────────
 
-def plot_cpu_vs_calls_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade"):
+def plot_cpu_vs_calls_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade",
+                               large=None, density: str = "raster",
+                               max_annotations=None):
     """
     Scatter: Number of Calls vs CPU Time
     - Regression line
     - ±2σ and ±3σ bands
     - Friday colored differently
     - Anomaly points highlighted
+
+    large : bool or None
+        Large-data mode; None switches on at PLOT_LARGE_THRESHOLD points.
+    density : {"raster", "hexbin"}
+        How normal points are drawn in large-data mode.
+    max_annotations : int or None
+        Label only the top-K anomalies by score. Defaults to all labels,
+        or PLOT_MAX_ANNOTATIONS in large-data mode.
     """
+    import matplotlib.pyplot as plt
+
     df = _ensure_date(df)
+    large = is_large(len(df), large)
+    if large and max_annotations is None:
+        max_annotations = PLOT_MAX_ANNOTATIONS
 
     # Friday vs others
     friday = df[df["day_of_week"] == "Friday"]
@@ -50,13 +167,13 @@ def plot_cpu_vs_calls_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade"
 
     # Plot normal days
     if not other.empty:
-        plt.scatter(other["num_calls"], other["cpu_time"],
-                    c="blue", alpha=0.6, label="Mon–Thu")
+        scatter_normal(other["num_calls"], other["cpu_time"], large, density,
+                       cmap="Blues", c="blue", alpha=0.6, label="Mon–Thu")
 
     # Plot Fridays
     if not friday.empty:
-        plt.scatter(friday["num_calls"], friday["cpu_time"],
-                    c="orange", alpha=0.7, label="Friday")
+        scatter_normal(friday["num_calls"], friday["cpu_time"], large, density,
+                       cmap="Oranges", c="orange", alpha=0.7, label="Friday")
 
     # Plot anomalies
     anomalies = df[df.get(anomaly_col, False) == True]
@@ -65,27 +182,21 @@ def plot_cpu_vs_calls_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade"
                     c="red", s=90, edgecolors="black", label="Anomaly")
 
         # Labels
-        for _, row in anomalies.iterrows():
-            label = row.get("secId", row.get("trade_id", ""))
-            plt.annotate(str(label),
-                         (row["num_calls"], row["cpu_time"]),
-                         textcoords="offset points", xytext=(5, 5))
+        label_col = "secId" if "secId" in anomalies.columns else "trade_id"
+        labels = anomalies.get(label_col, pd.Series("", index=anomalies.index))
+        annotate_top(anomalies["num_calls"], anomalies["cpu_time"], labels,
+                     _anomaly_scores(anomalies, "cpu_time"), max_annotations)
 
     # ───────────────────────────────────────────────────────────────
     # Regression + sigma bands
     # ───────────────────────────────────────────────────────────────
     good = df.dropna(subset=["num_calls", "cpu_time"])
-    if len(good) > 1:
-        X = good["num_calls"].values.reshape(-1, 1)
-        y = good["cpu_time"].values.reshape(-1, 1)
-
-        reg = LinearRegression().fit(X, y)
-        preds = reg.predict(X).flatten()
-        sigma = (good["cpu_time"] - preds).std()
-
-        order = np.argsort(good["num_calls"].values)
-        xs = good["num_calls"].values[order]
-        ys = preds[order]
+    slope, intercept, sigma = fit_trendline(good["num_calls"], good["cpu_time"])
+    if np.isfinite(slope):
+        # The fit is a straight line with constant-width bands, so the
+        # two x extremes are enough to draw it regardless of slice size
+        xs = np.array([good["num_calls"].min(), good["num_calls"].max()], dtype=float)
+        ys = slope * xs + intercept
 
         # Trendline
         plt.plot(xs, ys, color="black", linewidth=2, label="Trendline")
@@ -109,14 +220,23 @@ def plot_cpu_vs_calls_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade"
 # 2. CPU per Call
 # ───────────────────────────────────────────────────────────────
 
-def plot_cpu_per_call_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade"):
+def plot_cpu_per_call_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade",
+                               large=None, density: str = "raster",
+                               max_annotations=None):
     """
     Scatter: CPU per Call vs Number of Calls
     - Highlights anomalies
     - Useful when calls have high variance
+
+    See plot_cpu_vs_calls_enhanced for large / density / max_annotations.
     """
+    import matplotlib.pyplot as plt
+
     df = df.copy()
     df["cpu_per_call"] = df["cpu_time"] / df["num_calls"].replace(0, np.nan)
+    large = is_large(len(df), large)
+    if large and max_annotations is None:
+        max_annotations = PLOT_MAX_ANNOTATIONS
 
     plt.figure(figsize=(12, 8))
 
@@ -124,18 +244,16 @@ def plot_cpu_per_call_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade"
     anomalies = df[df.get(anomaly_col, False) == True]
 
     if not normal.empty:
-        plt.scatter(normal["num_calls"], normal["cpu_per_call"],
-                    c="blue", alpha=0.6, label="Normal")
+        scatter_normal(normal["num_calls"], normal["cpu_per_call"], large, density,
+                       c="blue", alpha=0.6, label="Normal")
 
     if not anomalies.empty:
         plt.scatter(anomalies["num_calls"], anomalies["cpu_per_call"],
                     c="red", s=90, edgecolors="black", label="Anomaly")
 
-        for _, row in anomalies.iterrows():
-            label = row.get("secId", "")
-            plt.annotate(str(label),
-                         (row["num_calls"], row["cpu_per_call"]),
-                         textcoords="offset points", xytext=(5, 5))
+        labels = anomalies.get("secId", pd.Series("", index=anomalies.index))
+        annotate_top(anomalies["num_calls"], anomalies["cpu_per_call"], labels,
+                     _anomaly_scores(anomalies, "cpu_per_call"), max_annotations)
 
     plt.xlabel("Number of Calls")
     plt.ylabel("CPU per Call (sec)")
@@ -150,13 +268,22 @@ def plot_cpu_per_call_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade"
 # 3. CPU vs Stress Type (categorical jitter plot)
 # ───────────────────────────────────────────────────────────────
 
-def plot_cpu_vs_stress_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade"):
+def plot_cpu_vs_stress_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade",
+                                large=None, density: str = "raster",
+                                max_annotations=None):
     """
     Scatter: Stress Type (phase) vs CPU Time
     - Jittered x-axis for better visibility
     - Highlights anomalies
+
+    See plot_cpu_vs_calls_enhanced for large / density / max_annotations.
     """
+    import matplotlib.pyplot as plt
+
     df = df.copy()
+    large = is_large(len(df), large)
+    if large and max_annotations is None:
+        max_annotations = PLOT_MAX_ANNOTATIONS
 
     # Convert phase to categorical codes
     df["phase_cat"] = df["phase"].astype("category")
@@ -173,8 +300,8 @@ def plot_cpu_vs_stress_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade
 
     # Normal points
     if not normal.empty:
-        plt.scatter(
-            xvals[normal.index], normal["cpu_time"],
+        scatter_normal(
+            xvals[normal.index], normal["cpu_time"], large, density,
             c="blue", alpha=0.6, label="Normal"
         )
 
@@ -185,13 +312,11 @@ def plot_cpu_vs_stress_enhanced(df: pd.DataFrame, anomaly_col: str = "slow_trade
             c="red", s=90, edgecolors="black", label="Anomaly"
         )
 
-        for idx, row in anomalies.iterrows():
-            label = row.get("secId", "")
-            plt.annotate(
-                str(label),
-                (xvals[idx], row["cpu_time"]),
-                textcoords="offset points", xytext=(5, 5)
-            )
+        labels = anomalies.get("secId", pd.Series("", index=anomalies.index))
+        annotate_top(
+            xvals[anomalies.index], anomalies["cpu_time"], labels,
+            _anomaly_scores(anomalies, "cpu_time"), max_annotations
+        )
 
     plt.xticks(
         ticks=range(len(df["phase_cat"].cat.categories)),
@@ -5,13 +5,25 @@ Batch-level visualizations.
 Provides:
  - CPU Time vs Date (scatter)
  - Highlights batch anomalies
+ - Large-data mode (rasterized normals, top-K annotations)
 """
 
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 
+from .config import PLOT_MAX_ANNOTATIONS
+from .plots import is_large, scatter_normal, annotate_top
 
-def plot_batch_cpu(df: pd.DataFrame):
+
+def _batch_scores(df: pd.DataFrame) -> np.ndarray:
+    """Rank batch anomalies by their largest z-score (CPU time as fallback)."""
+    zcols = [c for c in df.columns if c.endswith("_z")]
+    if zcols:
+        return df[zcols].apply(pd.to_numeric, errors="coerce").max(axis=1).to_numpy(dtype=float)
+    return pd.to_numeric(df["cpu_time_seconds"], errors="coerce").to_numpy(dtype=float)
+
+
+def plot_batch_cpu(df: pd.DataFrame, large=None, max_annotations=None):
     """
     Scatter plot of total CPU time over dates, highlighting anomalies.
 
@@ -23,7 +35,14 @@ def plot_batch_cpu(df: pd.DataFrame):
     Parameters
     ----------
     df : pd.DataFrame
+    large : bool or None
+        Large-data mode (rasterized normal points, capped annotations);
+        None switches on at PLOT_LARGE_THRESHOLD rows.
+    max_annotations : int or None
+        Label only the top-K anomalies by z-score. Defaults to all labels,
+        or PLOT_MAX_ANNOTATIONS in large-data mode.
     """
+    import matplotlib.pyplot as plt
 
     df = df.copy()
 
@@ -31,16 +50,21 @@ def plot_batch_cpu(df: pd.DataFrame):
     if "date" not in df.columns and "eodDate" in df.columns:
         df["date"] = pd.to_datetime(df["eodDate"])
 
+    large = is_large(len(df), large)
+    if large and max_annotations is None:
+        max_annotations = PLOT_MAX_ANNOTATIONS
+
     normal = df[df["batch_anomaly"] == False]
     anomalies = df[df["batch_anomaly"] == True]
 
     plt.figure(figsize=(14, 6))
 
-    # Normal points
+    # Normal points (dates on x, so always scatter rather than hexbin)
     if not normal.empty:
-        plt.scatter(
+        scatter_normal(
             normal["date"],
             normal["cpu_time_seconds"],
+            large,
             c="blue",
             alpha=0.6,
             label="Normal",
@@ -57,14 +81,14 @@ def plot_batch_cpu(df: pd.DataFrame):
             label="Batch Anomaly",
         )
 
-        # Annotate each point with the phase
-        for _, row in anomalies.iterrows():
-            plt.annotate(
-                row.get("phase", ""),
-                (row["date"], row["cpu_time_seconds"]),
-                textcoords="offset points",
-                xytext=(5, 5),
-            )
+        # Annotate the top-ranked points with their phase
+        annotate_top(
+            anomalies["date"],
+            anomalies["cpu_time_seconds"],
+            anomalies.get("phase", pd.Series("", index=anomalies.index)),
+            _batch_scores(anomalies),
+            max_annotations,
+        )
 
     plt.xlabel("EOD Date")
     plt.ylabel("Total CPU Time (sec)")
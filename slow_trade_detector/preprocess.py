@@ -1,8 +1,14 @@
 # preprocess.py
 # Helper utilities for data preparation.
 
+from typing import Dict, List
+
+import numpy as np
 import pandas as pd
 
+from .config import DOW_BASELINE_WEEKS, MIN_DOW_HISTORY
+from .rolling import rolling_stats
+
 
 def add_weekly_baseline_batch(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -29,3 +35,109 @@ def add_weekly_baseline_batch(df: pd.DataFrame) -> pd.DataFrame:
     )
 
     return df.merge(weekly, on=["phase", "day_of_week"], how="left")
+
+
+def add_rolling_dow_baseline(
+    df: pd.DataFrame,
+    keys: List[str],
+    columns: Dict[str, str],
+    weeks: int = DOW_BASELINE_WEEKS,
+    min_periods: int = MIN_DOW_HISTORY,
+) -> pd.DataFrame:
+    """
+    Median of the previous `weeks` values on the same weekday within
+    each `keys` group, excluding the current row (no look-ahead).
+
+    One stable sort by (group, weekday, date) is shared by all columns,
+    each of which goes through the sliding-window kernel once; results
+    are scattered back to the original row order.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Must contain `keys`, eodDate (or date) and the value columns.
+    keys : list[str]
+        Grouping columns, e.g. ["phase"] or ["secId"].
+    columns : dict[str, str]
+        Value column -> output column.
+
+    Returns
+    -------
+    pd.DataFrame
+        Copy of df with the output columns added.
+    """
+    df = df.copy()
+    dates = pd.to_datetime(df["date"] if "date" in df.columns else df["eodDate"])
+
+    codes = (
+        df[keys]
+        .assign(_dow=dates.dt.dayofweek.to_numpy())
+        .groupby(keys + ["_dow"], sort=False, dropna=False)
+        .ngroup()
+        .to_numpy()
+    )
+    order = np.lexsort((dates.to_numpy(), codes))
+    sorted_codes = codes[order]
+
+    for value_col, out_col in columns.items():
+        values = pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype=float)
+        stats = rolling_stats(
+            values[order], sorted_codes, weeks, min_periods, stats=("median",), lag=1
+        )
+        baseline = np.empty(len(df))
+        baseline[order] = stats["median"]
+        df[out_col] = baseline
+
+    return df
+
+
+def add_rolling_dow_baseline_batch(
+    df: pd.DataFrame,
+    value_col: str = "cpu_time_seconds",
+    out_col: str = "dow_cpu_roll_med",
+    weeks: int = DOW_BASELINE_WEEKS,
+    min_periods: int = MIN_DOW_HISTORY,
+) -> pd.DataFrame:
+    """
+    Rolling same-weekday baseline per (phase × day_of_week).
+
+    Unlike add_weekly_baseline_batch this only uses the last `weeks`
+    same weekdays *before* each row, so it never sees future data and
+    does not need the full history to be meaningful.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Must contain: phase, eodDate (or date), value_col.
+
+    Returns
+    -------
+    pd.DataFrame
+        Copy of df with `out_col` added.
+    """
+    return add_rolling_dow_baseline(df, ["phase"], {value_col: out_col}, weeks, min_periods)
+
+
+def add_rolling_dow_baseline_instrument(
+    df: pd.DataFrame,
+    value_col: str = "cpu_time",
+    out_col: str = "dow_cpu_roll_med",
+    weeks: int = DOW_BASELINE_WEEKS,
+    min_periods: int = MIN_DOW_HISTORY,
+) -> pd.DataFrame:
+    """
+    Rolling same-weekday baseline per (secId × day_of_week).
+
+    Instrument-level equivalent of add_rolling_dow_baseline_batch.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Must contain: secId, eodDate (or date), value_col.
+
+    Returns
+    -------
+    pd.DataFrame
+        Copy of df with `out_col` added.
+    """
+    return add_rolling_dow_baseline(df, ["secId"], {value_col: out_col}, weeks, min_periods)
@@ -0,0 +1,79 @@
+# regression.py
+"""
+Closed-form one-variable least squares.
+
+Used for the CPU vs Calls trendline / sigma bands in plots.py and
+available to reports and detectors as a regression-residual rule:
+
+    cpu_time ≈ slope * num_calls + intercept
+    resid_z  = (cpu_time - fitted) / sigma
+
+Plain NumPy, so callers do not pay the scikit-learn import.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+from .config import ZSCORE_THRESHOLD
+
+
+def fit_trendline(x, y) -> Tuple[float, float, float]:
+    """
+    Fit y = slope * x + intercept by ordinary least squares.
+
+    Non-finite pairs are ignored. sigma is the sample std (ddof=1) of
+    the residuals, matching the sigma bands drawn by the plots.
+
+    Parameters
+    ----------
+    x, y : array-like
+
+    Returns
+    -------
+    slope, intercept, sigma : float
+        All NaN when fewer than two usable points exist.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    ok = np.isfinite(x) & np.isfinite(y)
+    x, y = x[ok], y[ok]
+
+    if len(x) < 2:
+        return np.nan, np.nan, np.nan
+
+    x_mean = x.mean()
+    y_mean = y.mean()
+    dx = x - x_mean
+    sxx = np.dot(dx, dx)
+
+    # Degenerate x (all identical): flat line through the mean
+    slope = np.dot(dx, y - y_mean) / sxx if sxx > 0 else 0.0
+    intercept = y_mean - slope * x_mean
+
+    resid = y - (slope * x + intercept)
+    sigma = resid.std(ddof=1)
+
+    return float(slope), float(intercept), float(sigma)
+
+
+def residual_zscores(x, y) -> np.ndarray:
+    """
+    Standardized residuals of y against its own trendline on x.
+
+    Rows with non-finite x or y get NaN.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    slope, intercept, sigma = fit_trendline(x, y)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (y - (slope * x + intercept)) / sigma
+
+
+def residual_anomalies(x, y, threshold: float = ZSCORE_THRESHOLD) -> np.ndarray:
+    """
+    Regression-residual anomaly rule: y sits more than `threshold`
+    sigmas above the trendline. NaN residuals are never anomalous.
+    """
+    return np.nan_to_num(residual_zscores(x, y), nan=-np.inf) > threshold
@@ -2,9 +2,9 @@
 """
 HTML report generator for batch and instrument anomalies.
 Uses Jinja2 templating with enhanced styling and visualizations.
+Jinja2 is imported on first render, not at module import.
 """
 
-from jinja2 import Template
 import pandas as pd
 
 HTML_TEMPLATE = """
@@ -273,6 +273,7 @@ def render_html_report(batch_df=None, inst_df=None) -> str:
     str : HTML content
     """
     from datetime import datetime
+    from jinja2 import Template
     
     # Process batch data
     batch_table = ""
@@ -0,0 +1,204 @@
+# rolling.py
+"""
+Grouped sliding-window statistics over sorted NumPy arrays.
+
+Rows must be sorted so that each group is contiguous and time-ordered
+within the group. For every row the kernel gathers the last `window`
+values of its own group into one (n × window) matrix in a single pass;
+all statistics (count, median, std, ...) are then reductions of that
+same matrix, so adding a statistic never adds another rolling pass.
+
+Semantics match pandas `rolling(window, min_periods)` applied per group:
+NaNs are skipped, and rows with fewer than `min_periods` valid values
+get NaN.
+
+When numba is installed (and config.USE_NUMBA is set) rolling_stats and
+group_quantiles run the compiled kernels in rolling_numba instead, which
+walk each group's windows in place and spread groups over threads.
+"""
+
+import warnings
+from typing import Dict, Iterable, Sequence
+
+import numpy as np
+
+from . import config
+
+_KNOWN_STATS = ("median", "std", "mad")
+
+# rolling_numba module once imported, False if numba is not installed
+_numba = None
+
+
+def _numba_kernels():
+    """Compiled kernels, or None to use the NumPy implementation."""
+    global _numba
+    if not config.USE_NUMBA:
+        return None
+    if _numba is None:
+        try:
+            from . import rolling_numba
+            _numba = rolling_numba
+        except ImportError:
+            _numba = False
+    return _numba or None
+
+
+def group_starts(codes: np.ndarray) -> np.ndarray:
+    """
+    For sorted group codes, return the index of the first row of each
+    row's group (same length as `codes`).
+    """
+    codes = np.asarray(codes)
+    n = len(codes)
+    idx = np.arange(n)
+    if n == 0:
+        return idx
+    first = np.empty(n, dtype=bool)
+    first[0] = True
+    first[1:] = codes[1:] != codes[:-1]
+    return np.maximum.accumulate(np.where(first, idx, 0))
+
+
+def group_offsets(codes: np.ndarray) -> np.ndarray:
+    """
+    For sorted group codes, return the boundaries of the contiguous
+    groups: group g is rows offsets[g]:offsets[g + 1].
+    """
+    codes = np.asarray(codes)
+    n = len(codes)
+    if n == 0:
+        return np.zeros(1, dtype=np.int64)
+    change = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    return np.concatenate(([0], change, [n])).astype(np.int64)
+
+
+def window_matrix(values, codes, window: int, lag: int = 0) -> np.ndarray:
+    """
+    Build the (n × window) matrix of trailing values per group.
+
+    Column k holds the value `lag + k` rows back within the same group
+    (NaN when that row belongs to another group). lag=0 includes the
+    current row, lag=1 looks at history only.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    starts = group_starts(codes)
+    idx = np.arange(n)
+
+    out = np.full((n, window), np.nan)
+    for k in range(window):
+        src = idx - lag - k
+        ok = src >= starts
+        out[ok, k] = values[src[ok]]
+    return out
+
+
+def rolling_stats(
+    values,
+    codes,
+    window: int,
+    min_periods: int,
+    stats: Iterable[str] = ("median", "std"),
+    lag: int = 0,
+) -> Dict[str, np.ndarray]:
+    """
+    Grouped rolling statistics from one window matrix.
+
+    Parameters
+    ----------
+    values : array-like
+        Values sorted by (group, time).
+    codes : array-like
+        Group code per row, same order as values.
+    window, min_periods : int
+        As in pandas rolling().
+    stats : iterable of {"median", "std", "mad"}
+        "mad" is the median absolute deviation around the window median
+        (unscaled), taken from the same window matrix.
+    lag : int
+        Rows to skip before the window starts (1 = exclude current row).
+
+    Returns
+    -------
+    dict of stat name -> np.ndarray (aligned with `values`)
+    """
+    stats = tuple(stats)
+    for stat in stats:
+        if stat not in _KNOWN_STATS:
+            raise ValueError(f"Unknown rolling statistic: {stat!r}")
+
+    kernels = _numba_kernels()
+    if kernels is not None:
+        return kernels.rolling_stats(
+            values, group_offsets(codes), window, min_periods, stats, lag=lag
+        )
+
+    w = window_matrix(values, codes, window, lag=lag)
+    count = np.sum(~np.isnan(w), axis=1)
+    enough = count >= min_periods
+
+    out = {}
+    with warnings.catch_warnings():
+        # All-NaN / single-value rows are masked below anyway
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+
+        med = np.nanmedian(w, axis=1) if w.shape[1] else np.full(len(w), np.nan)
+        for stat in stats:
+            if stat == "median":
+                res = med
+            elif stat == "std":
+                res = np.nanstd(w, axis=1, ddof=1)
+            else:
+                res = np.nanmedian(np.abs(w - med[:, None]), axis=1)
+            out[stat] = np.where(enough, res, np.nan)
+
+    return out
+
+
+def group_quantiles(values, codes, qs: Sequence[float]) -> np.ndarray:
+    """
+    Per-group quantiles (linear interpolation, NaNs skipped), as
+    pandas groupby().quantile().
+
+    Parameters
+    ----------
+    values : array-like
+        Values with each group contiguous (order within a group is free).
+    codes : array-like
+        Group code per row, same order as values.
+    qs : sequence of float
+        Quantiles in [0, 1].
+
+    Returns
+    -------
+    np.ndarray
+        (n_groups × len(qs)), groups in order of appearance; NaN for
+        groups without a valid value.
+    """
+    values = np.asarray(values, dtype=float)
+    offsets = group_offsets(codes)
+
+    kernels = _numba_kernels()
+    if kernels is not None:
+        return kernels.group_quantiles(values, offsets, qs)
+
+    starts = offsets[:-1]
+    out = np.full((len(starts), len(qs)), np.nan)
+    if len(starts) == 0:
+        return out
+
+    # Sort within groups; NaNs go to the end of each group
+    seg = np.repeat(np.arange(len(starts)), np.diff(offsets))
+    sorted_vals = values[np.lexsort((values, seg))]
+    valid = np.add.reduceat((~np.isnan(values)).astype(np.int64), starts)
+    has = valid > 0
+
+    for k, q in enumerate(qs):
+        pos = q * (valid[has] - 1)
+        below = np.floor(pos).astype(np.int64)
+        above = np.minimum(below + 1, valid[has] - 1)
+        lo = sorted_vals[starts[has] + below]
+        hi = sorted_vals[starts[has] + above]
+        out[has, k] = lo + (hi - lo) * (pos - below)
+    return out
@@ -0,0 +1,124 @@
+# rolling_numba.py
+"""
+Numba-compiled kernels behind rolling.py.
+
+Same inputs and semantics as the NumPy implementations (values sorted
+so that each group is a contiguous block), but each row's window is
+gathered into a small per-group buffer instead of an (n × window)
+matrix, and groups are processed in parallel with prange.
+
+Functions are compiled with cache=True, so the JIT cost is paid once
+per machine and later processes load the machine code from
+__pycache__ (or NUMBA_CACHE_DIR).
+
+Importing this module imports numba; rolling.py only does that when
+numba is installed and config.USE_NUMBA is set.
+"""
+
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True)
+def _sorted_median(buf, m):
+    """Median of buf[:m], which must already be sorted."""
+    h = m // 2
+    if m % 2:
+        return buf[h]
+    return 0.5 * (buf[h - 1] + buf[h])
+
+
+@njit(cache=True)
+def _insert_sorted(buf, m, v):
+    """Insert v into sorted buf[:m] (insertion sort; windows are short)."""
+    k = m
+    while k > 0 and buf[k - 1] > v:
+        buf[k] = buf[k - 1]
+        k -= 1
+    buf[k] = v
+
+
+@njit(parallel=True, cache=True)
+def _rolling_kernel(values, offsets, window, min_periods, lag, want_std, want_mad,
+                    med, std, mad):
+    for g in prange(len(offsets) - 1):
+        lo = offsets[g]
+        hi = offsets[g + 1]
+        buf = np.empty(window)
+        dev = np.empty(window)
+        for i in range(lo, hi):
+            end = i - lag
+            start = max(lo, end - window + 1)
+            m = 0
+            for j in range(start, end + 1):
+                v = values[j]
+                if not np.isnan(v):
+                    _insert_sorted(buf, m, v)
+                    m += 1
+            if m == 0 or m < min_periods:
+                continue
+
+            centre = _sorted_median(buf, m)
+            med[i] = centre
+
+            if want_std and m > 1:
+                mean = 0.0
+                for k in range(m):
+                    mean += buf[k]
+                mean /= m
+                ss = 0.0
+                for k in range(m):
+                    ss += (buf[k] - mean) ** 2
+                std[i] = np.sqrt(ss / (m - 1))
+
+            if want_mad:
+                for k in range(m):
+                    _insert_sorted(dev, k, abs(buf[k] - centre))
+                mad[i] = _sorted_median(dev, m)
+
+
+@njit(parallel=True, cache=True)
+def _quantile_kernel(values, offsets, qs, out):
+    for g in prange(len(offsets) - 1):
+        lo = offsets[g]
+        hi = offsets[g + 1]
+        buf = np.empty(hi - lo)
+        m = 0
+        for j in range(lo, hi):
+            v = values[j]
+            if not np.isnan(v):
+                buf[m] = v
+                m += 1
+        if m == 0:
+            continue
+        buf[:m].sort()
+        for k in range(len(qs)):
+            # Linear interpolation, as pandas / numpy quantile
+            pos = qs[k] * (m - 1)
+            below = int(np.floor(pos))
+            above = min(below + 1, m - 1)
+            out[g, k] = buf[below] + (buf[above] - buf[below]) * (pos - below)
+
+
+def rolling_stats(values, offsets, window, min_periods, stats, lag=0):
+    """Compiled rolling.rolling_stats; `offsets` are the group boundaries."""
+    n = len(values)
+    med = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    mad = np.full(n, np.nan)
+    _rolling_kernel(
+        np.ascontiguousarray(values, dtype=np.float64), offsets,
+        window, min_periods, lag, "std" in stats, "mad" in stats, med, std, mad,
+    )
+    found = {"median": med, "std": std, "mad": mad}
+    return {stat: found[stat] for stat in stats}
+
+
+def group_quantiles(values, offsets, qs):
+    """Compiled rolling.group_quantiles; returns (n_groups × len(qs))."""
+    out = np.full((len(offsets) - 1, len(qs)), np.nan)
+    _quantile_kernel(
+        np.ascontiguousarray(values, dtype=np.float64), offsets,
+        np.asarray(qs, dtype=np.float64), out,
+    )
+    return out
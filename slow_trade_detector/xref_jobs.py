@@ -0,0 +1,183 @@
+# xref_jobs.py
+"""
+Cross-reference batch anomalies with Autosys job runs in DuckDB.
+
+Phases map to the Autosys jobs that compute them through the
+`phase_job_map` table (phase, job), loaded from a CSV. For each flagged
+(eodDate, phase) the run of every mapped job for that EOD is found with
+an ASOF join on start_time, and compared with the median of the job's
+previous ROLLING_WINDOW runs. Critical-path position comes from the
+`job_impact` table (see job_impact.py) when it exists. Only the flagged
+batches go into DuckDB and only one row per (batch, job) comes back.
+
+duckdb is imported only when a database path (not a connection) is given;
+a connection opened from a path is closed before returning.
+"""
+
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from .config import (
+    ROLLING_WINDOW,
+    EOD_RUN_CUTOFF_HOURS,
+)
+
+# Slack at or below this is on the critical path (slack is a difference
+# of summed float durations, so an exact 0 can come out as +-1e-9)
+CRITICAL_SLACK_TOLERANCE = 1e-6
+
+PHASE_JOB_MAP_DDL = """
+    CREATE TABLE IF NOT EXISTS phase_job_map (
+      phase TEXT NOT NULL,
+      job TEXT NOT NULL,
+      PRIMARY KEY (phase, job)
+    )"""
+
+
+@contextmanager
+def _connect(con):
+    if isinstance(con, str):
+        import duckdb
+        con = duckdb.connect(con)
+        try:
+            yield con
+        finally:
+            con.close()
+    else:
+        yield con
+
+
+def load_phase_job_map(con, path: str) -> int:
+    """
+    Replace phase_job_map with the (phase, job) rows of a CSV file.
+
+    Returns
+    -------
+    int
+        Number of mappings stored.
+    """
+    mapping = pd.read_csv(path, dtype=str)[["phase", "job"]].dropna().drop_duplicates()
+    with _connect(con) as con:
+        con.execute(PHASE_JOB_MAP_DDL)
+        con.register("phase_job_map_df", mapping)
+        con.execute("DELETE FROM phase_job_map")
+        con.execute("INSERT INTO phase_job_map SELECT phase, job FROM phase_job_map_df")
+        con.unregister("phase_job_map_df")
+    return len(mapping)
+
+
+def _has_table(con, name):
+    return con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [name]
+    ).fetchone()[0] > 0
+
+
+def explain_slow_eods(
+    con,
+    batch_result: pd.DataFrame,
+    only_flagged: bool = True,
+    cutoff_hours: int = EOD_RUN_CUTOFF_HOURS,
+    window: int = ROLLING_WINDOW,
+) -> pd.DataFrame:
+    """
+    One row per (flagged batch, mapped job) explaining a slow EOD.
+
+    Parameters
+    ----------
+    con : duckdb connection or str
+        Database holding job_runs and phase_job_map.
+    batch_result : pd.DataFrame
+        Output of run_batch_stage / detect_batch_anomalies.
+    only_flagged : bool
+        Restrict to rows with batch_anomaly (default) or explain all rows.
+    cutoff_hours : int
+        A run belongs to eodDate if it started before eodDate + cutoff_hours
+        and after the previous EOD's cutoff. The previous EOD is the
+        previous eodDate in batch_result (the previous business day for
+        the first one), so runs over weekends and holidays still match.
+    window : int
+        Previous runs of the job forming its baseline median.
+
+    Returns
+    -------
+    pd.DataFrame
+        eodDate, phase, batch_z, job, start_time, end_time,
+        duration_seconds, baseline_seconds, delta_seconds, delta_pct,
+        min_slack_seconds, sla_job, on_critical_path (min slack <=
+        CRITICAL_SLACK_TOLERANCE), sorted by eodDate,
+        phase and delta_seconds (largest first). Jobs with no run for
+        that EOD keep NULL run columns.
+    """
+    rows = batch_result[batch_result["batch_anomaly"]] if only_flagged else batch_result
+    zcols = [c for c in batch_result.columns if c.endswith("_z")]
+    eod = pd.to_datetime(rows["eodDate"]).dt.normalize()
+    days = np.sort(pd.to_datetime(batch_result["eodDate"]).dt.normalize().dropna().unique())
+    prev_eod = (eod - pd.offsets.BDay(1)).to_numpy()
+    if len(days):
+        pos = np.searchsorted(days, eod.to_numpy()) - 1
+        prev_eod = np.where(pos >= 0, days[np.maximum(pos, 0)], prev_eod)
+    batches = pd.DataFrame({
+        "eodDate": eod,
+        "prev_eod": prev_eod,
+        "phase": rows["phase"].astype(str),
+        "batch_z": rows[zcols].max(axis=1) if zcols else float("nan"),
+    })
+
+    with _connect(con) as con:
+        con.execute(PHASE_JOB_MAP_DDL)
+        impact = """
+            LEFT JOIN (
+                SELECT job, slack_seconds AS min_slack_seconds, sla_job
+                FROM job_impact
+            ) i ON i.job = x.job
+        """ if _has_table(con, "job_impact") else """
+            LEFT JOIN (SELECT NULL::TEXT AS job, NULL::DOUBLE AS min_slack_seconds,
+                              NULL::TEXT AS sla_job) i ON i.job = x.job
+        """
+
+        con.register("flagged_batches", batches)
+        try:
+            return con.execute(f"""
+                WITH mapped AS (
+                    SELECT f.eodDate, f.prev_eod, f.phase, f.batch_z, m.job,
+                           f.eodDate + to_hours(?::INTEGER) AS cutoff
+                    FROM flagged_batches f
+                    JOIN phase_job_map m ON m.phase = f.phase
+                ),
+                runs AS (
+                    SELECT r.job, r.start_time, r.end_time, r.duration_seconds,
+                           median(r.duration_seconds) OVER (
+                               PARTITION BY r.job ORDER BY r.start_time
+                               ROWS BETWEEN ? PRECEDING AND 1 PRECEDING) AS baseline_seconds
+                    FROM job_runs r
+                    WHERE r.job IN (SELECT DISTINCT job FROM mapped)
+                ),
+                matched AS (
+                    SELECT mp.eodDate, mp.prev_eod, mp.phase, mp.batch_z, mp.job,
+                           r.start_time, r.end_time, r.duration_seconds, r.baseline_seconds
+                    FROM mapped mp
+                    ASOF LEFT JOIN runs r
+                      ON r.job = mp.job AND mp.cutoff > r.start_time
+                )
+                SELECT x.eodDate, x.phase, x.batch_z, x.job,
+                       -- the as-of run must not belong to the previous EOD
+                       CASE WHEN ok THEN x.start_time END AS start_time,
+                       CASE WHEN ok THEN x.end_time END AS end_time,
+                       CASE WHEN ok THEN x.duration_seconds END AS duration_seconds,
+                       CASE WHEN ok THEN x.baseline_seconds END AS baseline_seconds,
+                       CASE WHEN ok THEN x.duration_seconds - x.baseline_seconds END AS delta_seconds,
+                       CASE WHEN ok THEN (x.duration_seconds - x.baseline_seconds)
+                                         / nullif(x.baseline_seconds, 0) END AS delta_pct,
+                       i.min_slack_seconds, i.sla_job,
+                       i.min_slack_seconds IS NOT NULL
+                           AND i.min_slack_seconds <= ? AS on_critical_path
+                FROM (
+                    SELECT *, start_time > prev_eod + to_hours(?::INTEGER) AS ok
+                    FROM matched
+                ) x
+                {impact}
+                ORDER BY x.eodDate, x.phase, delta_seconds DESC NULLS LAST, x.job
+            """, [cutoff_hours, window, CRITICAL_SLACK_TOLERANCE, cutoff_hours]).df()
+        finally:
+            con.unregister("flagged_batches")